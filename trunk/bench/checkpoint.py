@@ -0,0 +1,63 @@
+"""
+Checkpoint benchmark: builds a population with addAgent, saves it, restores it, then saves incremental checkpoints after changing a few agents.
+Usage: python checkpoint.py [agents=100000] [changed=0.01] [path=bench.ckp]
+"""
+from pysma import Kernel, Agent, Message
+from pysma import checkpoint
+import sys, os, time
+
+class Walker(Agent):
+    """ Agent with a little state, in a few roles. """
+    def __init__(self, index):
+        Agent.__init__(self)
+        self.position = (index % 100, index / 100)
+        self.energy = 100
+        
+    def born(self):
+        self.requestRole("walker", "world")
+        if self.position[0] % 10 == 0:
+            self.requestRole("leader", "world")
+            
+def main(agents=100000, changed=0.01, path="bench.ckp"):
+    start = time.time()
+    kernel = Kernel()
+    for i in xrange(agents):
+        kernel.addAgent(Walker(i))
+    built = time.time() - start
+    ids = kernel.getAgentsWith()
+    for id in ids[:agents / 10]:
+        kernel.getAgent(id).receiveMessage(Message("hello"))
+    checkpointer = checkpoint.Checkpointer(path)
+    start = time.time()
+    size = checkpointer.save(kernel)
+    saved = time.time() - start
+    step = max(int(1 / changed), 1)
+    for id in ids[::step]:
+        agent = kernel.getAgent(id)
+        agent.energy = 50
+        agent.touch()
+    start = time.time()
+    increment = checkpointer.save(kernel)
+    incremental = time.time() - start
+    kernel.stopKernel()
+    start = time.time()
+    kernel = checkpoint.load(path)
+    loaded = time.time() - start
+    restored = kernel.getAgentNb()
+    kernel.stopKernel()
+    os.remove(path)
+    print "%24s %10s %12s" %("operation", "seconds", "bytes")
+    print "%24s %10.3f %12s" %("addAgent x %d" %agents, built, "")
+    print "%24s %10.3f %12d" %("full save", saved, size)
+    print "%24s %10.3f %12d" %("incremental save", incremental, increment)
+    print "%24s %10.3f %12s" %("load (%d agents)" %restored, loaded, "")
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="agents": kwargs["agents"] = int(val)
+            if cle=="changed": kwargs["changed"] = float(val)
+            if cle=="path": kwargs["path"] = val
+    main(**kwargs)
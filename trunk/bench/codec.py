@@ -0,0 +1,113 @@
+"""
+Message serialization benchmark: encodes and decodes messages with the pysma codec and with pickle, one by one and in batches, then sends batches of messages back and forth through a transport to a proxy agent, and to a proxy action agent.
+Usage: python codec.py [messages=20000] [batch=100]
+"""
+from pysma import Kernel, Agent, ActionAgent, Message, ActionMessage
+from pysma import codec
+from pysma.transport import ProxyAgent
+import sys, time
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+def samples():
+    """ Builds one message of each kind.
+    @return: Couples which contain a label and a message.
+    @rtype: C{list<(str, L{Message})>}
+    """
+    text = Message("3")
+    text.sender, text.receiver = 12, 7
+    action = ActionMessage("move", (12, 3), {"speed": 1.5})
+    action.sender, action.receiver = 12, (None, "mover")
+    nested = Message({"position": (10, 20), "path": [(1, 2), (2, 2), (3, 2)], "name": "predator"})
+    nested.sender, nested.receiver = 12, 7
+    return [("Message(str)", text), ("ActionMessage", action), ("Message(dict)", nested)]
+
+def roundTrip(dumps, loads, values, count):
+    """ Encodes and decodes values.
+    @return: The number of values per second.
+    @rtype: C{float}
+    """
+    start = time.time()
+    for i in xrange(count):
+        loads(dumps(values))
+    return count / (time.time() - start)
+
+class Echo(Agent):
+    """ Agent which sends back the messages it receives. """
+    def live(self):
+        for message in self.drainMessages():
+            self.sendMessage(message, message.sender)
+
+class ActionEcho(ActionAgent):
+    """ Action agent which sends back the "echo" actions it receives. """
+    def msgecho(self, value):
+        self.sendMessage(ActionMessage("echo", (value,)), self.currentMessage.sender)
+
+class Sender(Agent):
+    """ Agent which sends batches of messages to the echo agent. """
+    def __init__(self, echo, batch, actions=False):
+        Agent.__init__(self)
+        self.echo = echo
+        self.batch = batch
+        self.actions = actions
+
+    def live(self):
+        received = len(self.drainMessages())
+        for i in xrange(self.batch):
+            if self.actions:
+                self.sendMessage(ActionMessage("echo", (i,)), self.echo)
+            else:
+                self.sendMessage(Message(i), self.echo)
+        return received
+
+def proxyRate(echo, batch, rounds, actions=False):
+    """ Sends batches of messages back and forth between a sender and an echo agent run by a proxy.
+    @return: The number of messages sent per second.
+    @rtype: C{float}
+    @raise ValueError: if the echo agent has not sent back every message.
+    """
+    kernel = Kernel()
+    proxy = ProxyAgent(echo)
+    kernel.addAgent(proxy)
+    sender = Sender(proxy.id, batch, actions)
+    kernel.addAgent(sender)
+    received = 0
+    start = time.time()
+    for i in xrange(rounds):
+        received = received + sender.live()
+        proxy.live()
+    duration = time.time() - start
+    received = received + sender.live()
+    kernel.stopKernel()
+    if received != rounds * batch:
+        raise ValueError("%d messages sent back instead of %d" %(received, rounds * batch))
+    return rounds * batch / duration
+
+def main(messages=20000, batch=100):
+    pickling = (lambda value: pickle.dumps(value, 2), pickle.loads)
+    print "%16s %8s %8s %14s %14s" %("message", "codec B", "pickle B", "codec msg/s", "pickle msg/s")
+    for label, message in samples():
+        codecRate = roundTrip(codec.dumps, codec.loads, message, messages)
+        pickleRate = roundTrip(pickling[0], pickling[1], message, messages)
+        print "%16s %8d %8d %14.0f %14.0f" %(label, len(codec.dumps(message)), len(pickling[0](message)), codecRate, pickleRate)
+    for label, message in samples():
+        # Distinct copies, so pickle cannot share them through its memo
+        values = [pickle.loads(pickle.dumps(message, 2)) for i in xrange(batch)]
+        codecRate = roundTrip(codec.dumps, codec.loads, values, messages // batch) * batch
+        pickleRate = roundTrip(pickling[0], pickling[1], values, messages // batch) * batch
+        print "%16s %8d %8d %14.0f %14.0f" %("%s x %d" %(label, batch), len(codec.dumps(values)), len(pickling[0](values)), codecRate, pickleRate)
+    rounds = messages // batch
+    print "proxy round trips: %d batches of %d messages: %.0f messages/s" %(rounds, batch, proxyRate(Echo(), batch, rounds))
+    print "proxy action round trips: %d batches of %d actions: %.0f actions/s" %(rounds, batch, proxyRate(ActionEcho(), batch, rounds, True))
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="messages": kwargs["messages"] = int(val)
+            if cle=="batch": kwargs["batch"] = int(val)
+    main(**kwargs)
@@ -0,0 +1,59 @@
+"""
+Action dispatch benchmark: processes action messages with the cached dispatch tables of C{ActionAgent}, compared to the former name-based lookup.
+Usage: python dispatch.py [dispatches=1000000]
+"""
+from pysma import Kernel, ActionAgent, ActionMessage
+import sys, time
+
+class Counter(ActionAgent):
+    def __init__(self):
+        ActionAgent.__init__(self)
+        self.count = 0
+    def msgincrement(self, step):
+        self.count += step
+
+class LegacyCounter(Counter):
+    """ Dispatches with the former implementation: handler name formatting and lookup for each message. """
+    def processActionMessage(self, msg):
+        if msg == None:
+            return
+        if isinstance(msg, ActionMessage):
+            action = self.pattern %(msg.action.replace(' ', '_'))
+            if hasattr(self, action):
+                fct = getattr(self, action)
+                if callable(fct):
+                    self.currentMessage = msg
+                    try:
+                        fct(*msg.arg, **msg.kw)
+                        self.currentMessage = None
+                    except:
+                        self.currentMessage = None
+                        raise
+                    return
+
+def run(agent, dispatches):
+    """ Processes messages with an agent.
+    @return: The number of dispatches per second.
+    @rtype: C{float}
+    """
+    Kernel().addAgent(agent)
+    messages = [ActionMessage("increment", (1,)) for i in range(1000)]
+    process = agent.processActionMessage
+    start = time.time()
+    for i in xrange(dispatches // len(messages)):
+        for msg in messages:
+            process(msg)
+    return dispatches / (time.time() - start)
+
+def main(dispatches=1000000):
+    print "%-22s %16s" %("dispatch", "dispatches/s")
+    print "%-22s %16.0f" %("name lookup (former)", run(LegacyCounter(), dispatches))
+    print "%-22s %16.0f" %("dispatch table", run(Counter(), dispatches))
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="dispatches": kwargs["dispatches"] = int(val)
+    main(**kwargs)
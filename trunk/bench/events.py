@@ -0,0 +1,72 @@
+"""
+Sparse activity benchmark: agents acting at random intervals, run by a step scheduler polling every agent at each tick, then by an event scheduler jumping from an activation to the next one.
+Usage: python events.py [agents=10000] [horizon=200] [interval=100]
+"""
+from pysma import Kernel, Agent, StepScheduler, EventScheduler
+import sys, time, random
+
+class PollingAgent(Agent):
+    """ Agent which acts at random intervals, and checks at each tick if it is time to act. """
+    def __init__(self, rnd, interval):
+        Agent.__init__(self)
+        self.rnd = rnd
+        self.interval = interval
+        self.next = rnd.expovariate(1.0 / interval)
+        self.tick = 0
+        self.acts = 0
+        
+    def live(self):
+        self.tick = self.tick + 1
+        if self.tick < self.next:
+            return
+        self.acts = self.acts + 1
+        self.next = self.next + self.rnd.expovariate(1.0 / self.interval)
+        
+class EventAgent(PollingAgent):
+    """ Agent which acts at random intervals, and tells the scheduler when it will act next. Its first activation, at time 0, only draws the delay of its first action. """
+    def live(self):
+        if self.tick:
+            self.acts = self.acts + 1
+        self.tick = 1
+        return self.rnd.expovariate(1.0 / self.interval)
+        
+def run(agentClass, agents, horizon, interval):
+    """ Runs the agents until the horizon with the scheduler suiting their class.
+    @return: The duration of the run and the number of actions done.
+    @rtype: C{(float, int)}
+    """
+    kernel = Kernel()
+    rnd = random.Random(agents)
+    population = [agentClass(rnd, interval) for i in xrange(agents)]
+    for agent in population:
+        kernel.addAgent(agent)
+    start = time.time()
+    if agentClass is EventAgent:
+        scheduler = EventScheduler()
+        kernel.addAgent(scheduler)
+        scheduler.run(until=horizon)
+    else:
+        scheduler = StepScheduler()
+        kernel.addAgent(scheduler)
+        scheduler.run(horizon)
+    elapsed = time.time() - start
+    acts = sum([agent.acts for agent in population])
+    kernel.stopKernel()
+    return elapsed, acts
+
+def main(agents=10000, horizon=200, interval=100):
+    print "%10s %10s %10s %10s" %("scheduler", "seconds", "actions", "speedup")
+    polling, acts = run(PollingAgent, agents, horizon, interval)
+    print "%10s %10.3f %10d %10s" %("step", polling, acts, "")
+    events, acts = run(EventAgent, agents, horizon, interval)
+    print "%10s %10.3f %10d %9.1fx" %("event", events, acts, polling / events)
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="agents": kwargs["agents"] = int(val)
+            if cle=="horizon": kwargs["horizon"] = int(val)
+            if cle=="interval": kwargs["interval"] = float(val)
+    main(**kwargs)
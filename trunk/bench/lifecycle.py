@@ -0,0 +1,53 @@
+"""
+Agent lifecycle benchmark: launches and kills a population one agent at a time, then in bulk, then shuts a kernel down.
+Usage: python lifecycle.py [agents=100000] [roles=3]
+"""
+from pysma import Kernel, Agent
+import sys, time
+
+class Member(Agent):
+    """ Agent which requests a few roles when launched. """
+    roles = 3
+    
+    def born(self):
+        for i in range(self.roles):
+            self.requestRole("role%d" %i, "bench")
+            
+def timed(fct, *arg):
+    """ Calls a function.
+    @return: The duration of the call (in seconds).
+    @rtype: C{float}
+    """
+    start = time.time()
+    fct(*arg)
+    return time.time() - start
+
+def main(agents=100000, roles=3):
+    Member.roles = roles
+    print "%28s %10s" %("operation", "seconds")
+    kernel = Kernel()
+    population = [Member() for i in xrange(agents)]
+    def addOneByOne():
+        for agent in population:
+            kernel.addAgent(agent)
+    print "%28s %10.3f" %("addAgent x %d" %agents, timed(addOneByOne))
+    ids = kernel.getAgentsWith()
+    def removeOneByOne():
+        for id in ids:
+            kernel.removeAgent(id)
+    print "%28s %10.3f" %("removeAgent x %d" %agents, timed(removeOneByOne))
+    population = [Member() for i in xrange(agents)]
+    print "%28s %10.3f" %("addAgents", timed(kernel.addAgents, population))
+    ids = kernel.getAgentsWith()
+    print "%28s %10.3f" %("removeAgents", timed(kernel.removeAgents, ids))
+    kernel.addAgents([Member() for i in xrange(agents)])
+    print "%28s %10.3f" %("stopKernel", timed(kernel.stopKernel))
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="agents": kwargs["agents"] = int(val)
+            if cle=="roles": kwargs["roles"] = int(val)
+    main(**kwargs)
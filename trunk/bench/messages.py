@@ -0,0 +1,79 @@
+"""
+Message benchmark: memory per message and messages per second, for the slotted message classes, with and without a message pool, compared to the former dictionnary-based classes.
+Usage: python messages.py [messages=200000]
+"""
+from pysma import Kernel, Agent, ActionMessage, MessagePool
+import sys, time
+
+class LegacyMessage(object):
+    """ Former implementation of C{Message}: dictionnary-based, content behind a property. """
+    def __init__(self, content):
+        self.sender = None
+        self.receiver = None
+        self.__content = content
+    def __getContent(self):
+        return self.__content
+    content = property(__getContent)
+
+class LegacyActionMessage(LegacyMessage):
+    """ Former implementation of C{ActionMessage}: fields stored in the content tuple. """
+    def __init__(self, action, arg, kw={}):
+        LegacyMessage.__init__(self, (action, arg, kw))
+    def __getAction(self):
+        return self.content[0]
+    action = property(__getAction)
+    def __getArguments(self):
+        return self.content[1]
+    arg = property(__getArguments)
+    def __getKeywords(self):
+        return self.content[2]
+    kw = property(__getKeywords)
+
+def size(msg):
+    """ Gets the memory used by a message, without its arguments.
+    @rtype: C{int}
+    """
+    total = sys.getsizeof(msg)
+    if hasattr(msg, "__dict__"):
+        total += sys.getsizeof(msg.__dict__)
+    if isinstance(msg, LegacyActionMessage):
+        total += sys.getsizeof(msg.content)
+    return total
+
+def throughput(factory, messages, recycle=False):
+    """ Builds messages, sends them to an agent, which reads their fields.
+    @param recycle: If C{True}, the messages are released once read.
+    @return: The number of messages per second.
+    @rtype: C{float}
+    """
+    kernel = Kernel()
+    receiver = Agent()
+    kernel.addAgent(receiver)
+    id = kernel.getAgentId(receiver)
+    start = time.time()
+    for i in xrange(messages // 100):
+        for j in xrange(100):
+            msg = factory("ping", (j,))
+            msg.receiver = id
+            kernel.sendMessage(msg)
+        for msg in receiver.drainMessages():
+            msg.action, msg.arg, msg.kw
+            if recycle:
+                msg.release()
+    return messages / (time.time() - start)
+
+def main(messages=200000):
+    args = ("ping", (1,))
+    pool = MessagePool(ActionMessage)
+    print "%-22s %12s %14s" %("class", "bytes/msg", "messages/s")
+    print "%-22s %12d %14.0f" %("legacy ActionMessage", size(LegacyActionMessage(*args)), throughput(LegacyActionMessage, messages))
+    print "%-22s %12d %14.0f" %("ActionMessage", size(ActionMessage(*args)), throughput(ActionMessage, messages))
+    print "%-22s %12d %14.0f" %("pooled ActionMessage", size(pool.acquire(*args)), throughput(pool.acquire, messages, True))
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="messages": kwargs["messages"] = int(val)
+    main(**kwargs)
@@ -0,0 +1,110 @@
+"""
+Population benchmark: memory per agent and activation rate for a large population of walkers, implemented as C{Agent}, as C{LightAgent}, and as the agents of a columnar C{Population}. Each walker moves and sends a message to its neighbour at each tick. Each implementation is measured in its own process.
+Usage: python population.py [agents=1000000] [ticks=3]
+"""
+from pysma import Kernel, Agent, LightAgent, Population, PopulationAgent, Column, Message, StepScheduler
+import sys, os, time, gc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class Walker(Agent):
+    """ Dictionnary-based walker. """
+    def __init__(self):
+        Agent.__init__(self)
+        self.x = 0
+
+    def live(self):
+        self.drainMessages()
+        self.x = self.x + 1
+        self.sendMessage(Message(self.x), self.id + 1)
+
+class LightWalker(LightAgent):
+    """ Slotted walker. """
+    __slots__ = ("x",)
+
+    def __init__(self):
+        LightAgent.__init__(self)
+        self.x = 0
+
+    def live(self):
+        self.drainMessages()
+        self.x = self.x + 1
+        self.sendMessage(Message(self.x), self.id + 1)
+
+class ColumnWalker(PopulationAgent):
+    """ Walker of a population. """
+    __slots__ = ()
+    x = Column("x", "i")
+
+    def live(self):
+        self.drainMessages()
+        self.x = self.x + 1
+        self.sendMessage(Message(self.x), self.id + 1)
+
+def memory():
+    """ Gets the memory used by the process, in bytes (the peak, if the current one cannot be read). """
+    try:
+        return int(open("/proc/self/statm").read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (IOError, OSError, ValueError, AttributeError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def measure(kind, agents, ticks):
+    """ Launches and activates a population.
+    @return: The memory per agent in bytes, and the number of activations per second.
+    @rtype: C{(float, float)}
+    """
+    gc.collect()
+    before = memory()
+    kernel = Kernel()
+    if kind == "Population":
+        population = Population(ColumnWalker)
+        kernel.addAgent(population)
+        population.launch(agents)
+    elif kind == "LightAgent":
+        kernel.addAgents([LightWalker() for i in xrange(agents)])
+    else:
+        kernel.addAgents([Walker() for i in xrange(agents)])
+    scheduler = StepScheduler()
+    kernel.addAgent(scheduler)
+    # The first tick creates the view of the common role
+    scheduler.run(1)
+    size = (memory() - before) / float(agents)
+    start = time.time()
+    scheduler.run(ticks)
+    rate = agents * ticks / (time.time() - start)
+    kernel.stopKernel()
+    return size, rate
+
+def measureApart(kind, agents, ticks):
+    """ Runs C{L{measure}} in a child process, so the memory freed by the previous measures does not count. """
+    if not hasattr(os, "fork"):
+        return measure(kind, agents, ticks)
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        os.write(write, "%r" %(measure(kind, agents, ticks),))
+        os._exit(0)
+    os.close(write)
+    result = os.read(read, 1024)
+    os.close(read)
+    os.waitpid(pid, 0)
+    return eval(result)
+
+def main(agents=1000000, ticks=3):
+    print "%12s %12s %12s %16s" %("agents", "bytes/agent", "total MB", "activations/s")
+    for kind in ("Agent", "LightAgent", "Population"):
+        size, rate = measureApart(kind, agents, ticks)
+        print "%12s %12.0f %12.0f %16.0f" %(kind, size, size * agents / 1048576, rate)
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="agents": kwargs["agents"] = int(val)
+            if cle=="ticks": kwargs["ticks"] = int(val)
+    main(**kwargs)
@@ -0,0 +1,115 @@
+"""
+Trace benchmark: runs a seeded workload of agents which send messages, broadcast and change roles at each tick, without and with a tracer, then replays the trace in a fresh kernel and checks that every agent receives the same number of messages. An existing trace (e.g. recorded by hunt/game.py) can be replayed instead, and the replay can be profiled.
+Usage: python replay.py [agents=1000] [ticks=100] [seed=0] [path=replay.trc] [trace=game.trc] [profile=1]
+"""
+from pysma import Kernel, Agent, Message, StepScheduler
+from pysma.trace import Tracer, Replayer, KINDS
+import sys, os, time, random
+
+try:
+    import cProfile as profile
+except ImportError:
+    import profile
+
+ROLES = ["role%d" %i for i in range(4)]
+
+class Chatter(Agent):
+    """ Agent which sends a message to a random agent at each activation, sometimes broadcasts and changes its role. """
+    def __init__(self, rnd, population):
+        Agent.__init__(self)
+        self.rnd = rnd
+        self.population = population
+        self.role = None
+        self.received = 0
+
+    def receiveMessage(self, message):
+        self.received = self.received + 1
+
+    def live(self):
+        rnd = self.rnd
+        self.sendMessage(Message(rnd.random()), rnd.choice(self.population))
+        op = rnd.random()
+        if op < 0.05:
+            self.sendBroadcastMessage(Message("hello"), rnd.choice(ROLES))
+        elif op < 0.10:
+            if self.role != None:
+                self.leaveRole(self.role)
+            self.role = rnd.choice(ROLES)
+            self.requestRole(self.role)
+
+def record(agents, ticks, seed, path=None):
+    """ Runs the workload, traced if a path is given.
+    @return: The duration of the run, the number of messages received by each agent in launching order, and the tracer.
+    @rtype: C{(float, list<int>, L{Tracer})}
+    """
+    kernel = Kernel()
+    tracer = None
+    if path != None:
+        tracer = Tracer(path)
+        kernel.tracer = tracer
+    scheduler = StepScheduler()
+    kernel.addAgent(scheduler)
+    rnd = random.Random(seed)
+    population = []
+    chatters = [Chatter(rnd, population) for i in xrange(agents)]
+    population.extend(kernel.addAgents(chatters))
+    start = time.time()
+    scheduler.run(ticks)
+    duration = time.time() - start
+    if tracer != None:
+        tracer.close()
+    kernel.stopKernel()
+    return duration, [chatter.received for chatter in chatters], tracer
+
+def replay(path, profiling=False):
+    """ Replays a trace in a fresh kernel, which is left running.
+    @return: The duration of the replay and the replayer.
+    @rtype: C{(float, L{Replayer})}
+    """
+    replayer = Replayer(path)
+    start = time.time()
+    if profiling:
+        profile.runctx("replayer.run()", globals(), {"replayer": replayer}, sort="cumulative")
+    else:
+        replayer.run()
+    duration = time.time() - start
+    return duration, replayer
+
+def received(replayer):
+    """ Gets the number of messages received by each replayed chatter, in launching order.
+    @rtype: C{list<int>}
+    """
+    ids = [replayer.ids[traced] for traced in sorted(replayer.ids.keys())]
+    agents = [replayer.kernel.getAgent(id) for id in ids]
+    return [agent.received for agent in agents if agent != None and agent.className.endswith(".Chatter")]
+
+def main(agents=1000, ticks=100, seed=0, path="replay.trc", trace=None, profiling=False):
+    recorded = trace == None
+    if recorded:
+        plain, expected, tracer = record(agents, ticks, seed)
+        traced, counts, tracer = record(agents, ticks, seed, path)
+        print "%d agents, %d ticks: %.2f s untraced, %.2f s traced (+%.0f%%), %d records, %d bytes" %(agents, ticks, plain, traced, (traced / plain - 1) * 100, tracer.records, os.path.getsize(path))
+        if counts != expected:
+            print "the traced run differs from the untraced one"
+        trace = path
+    duration, replayer = replay(trace, profiling)
+    total = sum(replayer.counts.values())
+    print "replay: %d records in %.2f s: %.0f records/s" %(total, duration, total / duration)
+    for kind in sorted(KINDS.keys()):
+        print "%10s %10d" %(KINDS[kind], replayer.counts[kind])
+    if recorded and received(replayer) != expected:
+        print "the replay differs from the recorded run"
+    replayer.kernel.stopKernel()
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="agents": kwargs["agents"] = int(val)
+            if cle=="ticks": kwargs["ticks"] = int(val)
+            if cle=="seed": kwargs["seed"] = int(val)
+            if cle=="path": kwargs["path"] = val
+            if cle=="trace": kwargs["trace"] = val
+            if cle=="profile": kwargs["profiling"] = bool(int(val))
+    main(**kwargs)
@@ -0,0 +1,47 @@
+"""
+Role churn micro-benchmark: agents request and leave roles at random in kernels of growing populations.
+Usage: python roles.py [operations=100000] [populations=1000,10000,100000] [roles=10]
+"""
+from pysma import Kernel, Agent
+import sys, time, random
+
+def run(population, operations, roles):
+    """ Runs role requests and leaves on a kernel of a given population.
+    @return: The number of role operations per second.
+    @rtype: C{float}
+    """
+    kernel = Kernel()
+    for i in xrange(population):
+        kernel.addAgent(Agent())
+    ids = kernel.getAgentsWith()
+    names = ["role%d" %i for i in range(roles)]
+    rnd = random.Random(population)
+    held = []
+    start = time.time()
+    for i in xrange(operations):
+        if held and rnd.random() < 0.5:
+            id, role = held.pop(rnd.randrange(len(held)))
+            kernel.leaveRole(id, role)
+        else:
+            id, role = rnd.choice(ids), rnd.choice(names)
+            if role not in kernel.getRolesOf(id):
+                kernel.requestRole(id, role)
+                held.append((id, role))
+    elapsed = time.time() - start
+    kernel.stopKernel()
+    return operations / elapsed
+
+def main(operations=100000, populations=(1000, 10000, 100000), roles=10):
+    print "%10s %16s" %("agents", "role ops/s")
+    for population in populations:
+        print "%10d %16.0f" %(population, run(population, operations, roles))
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="operations": kwargs["operations"] = int(val)
+            if cle=="populations": kwargs["populations"] = map(int, val.split(","))
+            if cle=="roles": kwargs["roles"] = int(val)
+    main(**kwargs)
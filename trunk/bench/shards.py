@@ -0,0 +1,55 @@
+"""
+Sharded kernel benchmark: busy agents exchanging messages at random, run by sharded kernels of a growing number of shards.
+Usage: python shards.py [agents=20000] [ticks=50] [shards=1,2,4] [work=200]
+"""
+from pysma import Agent, Message, ShardedKernel
+import sys, time, random
+
+class BusyAgent(Agent):
+    """ Agent which computes a little, then sends a message to a random agent at each activation. """
+    def __init__(self, population, work):
+        Agent.__init__(self)
+        self.population = population
+        self.work = work
+        self.received = 0
+        
+    def live(self):
+        while self.getNextMessage() != None:
+            self.received = self.received + 1
+        total = 0
+        for i in xrange(self.work):
+            total = total + i * i
+        self.sendMessage(Message(total), random.randrange(self.population))
+        
+def run(agents, ticks, shards, work):
+    """ Runs busy agents on a sharded kernel.
+    @return: The number of ticks per second, and the number of messages routed between the shards per tick.
+    @rtype: C{(float, float)}
+    """
+    kernel = ShardedKernel(shards)
+    for i in xrange(agents):
+        kernel.addAgent(BusyAgent(agents, work))
+    start = time.time()
+    routed = 0
+    for i in xrange(ticks):
+        routed = routed + kernel.tick()
+    elapsed = time.time() - start
+    kernel.stopKernel()
+    return ticks / elapsed, float(routed) / ticks
+
+def main(agents=20000, ticks=50, shards=(1, 2, 4), work=200):
+    print "%8s %10s %14s" %("shards", "ticks/s", "routed/tick")
+    for count in shards:
+        rate, routed = run(agents, ticks, count, work)
+        print "%8d %10.2f %14.0f" %(count, rate, routed)
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="agents": kwargs["agents"] = int(val)
+            if cle=="ticks": kwargs["ticks"] = int(val)
+            if cle=="shards": kwargs["shards"] = map(int, val.split(","))
+            if cle=="work": kwargs["work"] = int(val)
+    main(**kwargs)
@@ -0,0 +1,102 @@
+"""
+Stress test of the kernel used from several threads at once: each thread launches and kills agents, changes their roles, sends messages and broadcasts. Reports the throughput, then checks that the agent collection, the roles and the message boxes are consistent.
+Usage: python stress.py [threads=4] [operations=5000]
+"""
+from pysma import Kernel, Agent, Message
+import sys, threading, time, random
+
+ROLES = ["role%d" %i for i in range(4)]
+
+def hammer(kernel, seed, operations, own, errors):
+    """ Runs random operations on the kernel. Only the agents launched by this thread are killed or change roles.
+    @param own: Collects the IDs of the agents launched and still living.
+    @param errors: Collects the unexpected errors.
+    """
+    rnd = random.Random(seed)
+    try:
+        for i in xrange(operations):
+            op = rnd.random()
+            if op < 0.15 or not own:
+                agent = Agent()
+                kernel.addAgent(agent)
+                own.append(kernel.getAgentId(agent))
+            elif op < 0.25:
+                kernel.removeAgent(own.pop(rnd.randrange(len(own))))
+            elif op < 0.40:
+                id = rnd.choice(own)
+                role = rnd.choice(ROLES)
+                if role not in kernel.getRolesOf(id):
+                    kernel.requestRole(id, role)
+            elif op < 0.50:
+                id = rnd.choice(own)
+                roles = [role for role in kernel.getRolesOf(id) if role != None]
+                if roles:
+                    kernel.leaveRole(id, rnd.choice(roles))
+            elif op < 0.85:
+                msg = Message(i)
+                msg.receiver = rnd.randrange(i + 1)
+                kernel.sendMessage(msg)
+            else:
+                msg = Message(i)
+                msg.receiver = (None, rnd.choice(ROLES))
+                kernel.sendBroadcastMessage(msg)
+    except:
+        errors.append(sys.exc_info())
+
+def check(kernel, living):
+    """ Checks the consistency of the kernel.
+    @return: The problems found.
+    @rtype: C{list<str>}
+    """
+    problems = []
+    if kernel.getAgentNb() != len(living):
+        problems.append("%d agents in the kernel, %d expected" %(kernel.getAgentNb(), len(living)))
+    if len(kernel.getAgentsWith()) != len(living):
+        problems.append("%d agents in the common role, %d expected" %(len(kernel.getAgentsWith()), len(living)))
+    for role in ROLES:
+        for id in kernel.getAgentsWith(role):
+            if id not in living:
+                problems.append("Dead agent #%d in %s" %(id, role))
+            elif role not in kernel.getRolesOf(id):
+                problems.append("Agent #%d in %s, but not according to its roles" %(id, role))
+    for id in living:
+        agent = kernel.getAgent(id)
+        if agent == None:
+            problems.append("Living agent #%d not found" %id)
+        elif agent.messageBox.received != agent.messageBox.depth:
+            problems.append("Agent #%d lost messages" %id)
+    return problems
+
+def main(threads=4, operations=5000):
+    kernel = Kernel()
+    owns = [[] for i in range(threads)]
+    errors = []
+    workers = [threading.Thread(target=hammer, args=(kernel, i, operations, owns[i], errors)) for i in range(threads)]
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - start
+    print "%d threads, %d operations in %.2f s: %.0f operations/s" %(threads, threads * operations, elapsed, threads * operations / elapsed)
+    living = {}
+    for own in owns:
+        for id in own:
+            living[id] = None
+    problems = check(kernel, living)
+    for error in errors:
+        problems.append("%s: %s" %(error[0].__name__, error[1]))
+    for problem in problems:
+        print problem
+    if problems:
+        sys.exit(1)
+    print "Kernel consistent, %d agents living" %len(living)
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="threads": kwargs["threads"] = int(val)
+            if cle=="operations": kwargs["operations"] = int(val)
+    main(**kwargs)
@@ -5,5 +5,4 @@ Package of the game of the prey and the predator using PySMA.
 """
 
 # Initialisation of the package Hunt
-import game
-game.main()
\ No newline at end of file
+# The game is started by running game.py
\ No newline at end of file
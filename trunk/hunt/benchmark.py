@@ -0,0 +1,42 @@
+"""
+Benchmark of the prey/predator game: scheduling steps per second as the grid and the number of predators grow.
+
+The board display is disabled, only the agents and the mesh moves are measured.
+Usage: python benchmark.py [steps=200] [sizes=21x10,100x100,300x300] [predators=8,64,512]
+"""
+from pysma import StepScheduler
+from renderer import Renderer
+from game import createGame
+import sys, time
+
+def run(width, height, predators, steps):
+    """ Runs C{steps} scheduling steps, starting a new game each time the prey is catched.
+    @return: The number of steps per second.
+    @rtype: C{float}
+    """
+    elapsed = 0.0
+    done = 0
+    while done < steps:
+        scheduler = StepScheduler()
+        createGame(width, height, predators, scheduler, Renderer())
+        start = time.time()
+        done += scheduler.run(steps - done)
+        elapsed += time.time() - start
+    return steps / elapsed
+
+def main(steps=200, sizes=((21,10), (100,100), (300,300)), predators=(8, 64, 512)):
+    print "%-10s %10s %14s" %("grid", "predators", "steps/s")
+    for width, height in sizes:
+        for nb in predators:
+            if nb + 1 < width * height:
+                print "%-10s %10d %14.1f" %("%dx%d" %(width, height), nb, run(width, height, nb, steps))
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="steps": kwargs["steps"] = int(val)
+            if cle=="sizes": kwargs["sizes"] = [tuple(map(int, s.split("x"))) for s in val.split(",")]
+            if cle=="predators": kwargs["predators"] = map(int, val.split(","))
+    main(**kwargs)
@@ -1,19 +1,27 @@
 """
 Game of the prey and the predator using PySMA.
+
+Usage: python game.py [width=21] [height=10] [predators=8] [render=text|diff|none] [seed=N] [trace=game.trc]
+
+A game played with a seed and traced can be replayed offline with bench/replay.py.
 """
 from pysma import Kernel, DummyScheduler
+from pysma.trace import Tracer
 from mesh import Mesh
+from renderer import Renderer, TextRenderer, DiffRenderer
 from prey import Prey
 from predator import Predator
-import sys, time
+import sys, time, random
 
-def main(WIDTH=21, HEIGHT=10, PREDATORS=8):
+RENDERERS = {"text": TextRenderer, "diff": DiffRenderer, "none": Renderer}
+
+def createGame(WIDTH, HEIGHT, PREDATORS, SCHEDULER, RENDERER=None, TRACER=None):
     mygame = Kernel()
+    mygame.tracer = TRACER
     
-    myscheduler = DummyScheduler()
-    mygame.addAgent(myscheduler, "Scheduler")
+    mygame.addAgent(SCHEDULER, "Scheduler")
     
-    mymesh = Mesh(WIDTH, HEIGHT)
+    mymesh = Mesh(WIDTH, HEIGHT, RENDERER)
     mygame.addAgent(mymesh, "Mesh")
     
     anAgent = Prey()
@@ -24,16 +32,28 @@ def main(WIDTH=21, HEIGHT=10, PREDATORS=8):
         anAgent = Predator()
         mygame.addAgent(anAgent, "Predator%s"%i)
         mymesh.addAgent(mygame.getAgentId(anAgent))
-        
+    return mygame
+
+def main(WIDTH=21, HEIGHT=10, PREDATORS=8, RENDERER=None, SEED=None, TRACE=None):
+    random.seed(SEED)
+    tracer = None
+    if TRACE != None:
+        tracer = Tracer(TRACE)
+    createGame(WIDTH, HEIGHT, PREDATORS, DummyScheduler(), RENDERER, tracer)
     while (Kernel.instance != None):
         time.sleep(3)
+    if tracer != None:
+        tracer.close()
 
 if __name__ == "__main__":
-    w, h, p = (21,10,8)
+    w, h, p, r, s, t = (21,10,8,None,None,None)
     for arg in sys.argv:
         if arg.count("=") == 1:
             cle, val = arg.split("=")
             if cle=="width": w=int(val)
             if cle=="height": h=int(val)
             if cle=="predators": p=int(val)
-    main(w, h, p)
\ No newline at end of file
+            if cle=="render": r=RENDERERS[val]()
+            if cle=="seed": s=int(val)
+            if cle=="trace": t=val
+    main(w, h, p, r, s, t)
\ No newline at end of file
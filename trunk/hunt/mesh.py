@@ -2,67 +2,110 @@
 World mesh agent for the prey/predator game.
 """
 from pysma import Agent, Message
+from renderer import TextRenderer
+from array import array
 import random
 
-random.seed()
+EMPTY = -1
 
 class Mesh(Agent):
-    def __init__(self, width, height):
+    offsets = ((0, -1), (1, 0), (0, 1), (-1, 0))
+    
+    def __init__(self, width, height, renderer=None):
         Agent.__init__(self)
+        if renderer == None:
+            renderer = TextRenderer()
+        self.renderer = renderer
+        self.__text = None
         self.__width = width
         self.__height = height
-        self.__world = [[None] * height for i in range(width)]
+        # Cell (x, y) is stored at index x*height+y, EMPTY when free
+        self.__world = array('l', [EMPTY]) * (width * height)
+        # Agent ID -> cell index
+        self.__positions = {}
         
     def addAgent(self, agentId):
-        case = -1
-        while case != None:
+        cell = None
+        while cell == None or self.__world[cell] != EMPTY:
             x = int(random.random() * self.__width)
             y = int(random.random() * self.__height)
-            case = self.__world[x][y]
-        self.__world[x][y] = agentId
+            cell = x * self.__height + y
+        self.__world[cell] = agentId
+        self.__positions[agentId] = cell
+        
+    def getWidth(self):
+        return self.__width
+    width = property(getWidth)
+    
+    def getHeight(self):
+        return self.__height
+    height = property(getHeight)
+    
+    def getCells(self):
+        """ Cells of the mesh: the ID of the agent in cell (x, y) is at index x*height+y, EMPTY when free. Must not be changed. """
+        return self.__world
+    cells = property(getCells)
+        
+    def getPosition(self, agentId):
+        cell = self.__positions.get(agentId, None)
+        if cell != None:
+            return divmod(cell, self.__height)
+        return None
         
     def born(self):
-        self.requestRole(role="mover")
+        self.subscribe("move")
         
     def live(self):
-        while self.hasMessage():
-            msg = self.getNextMessage()
-            if msg != None:
-                direction = int(msg.content)
-                x, y = (-1, -1)
-                for i in range(self.__width):
-                    for j in range(self.__height):
-                        if self.__world[i][j] == msg.sender:
-                            x, y = (i, j)
-                if x != -1:
-                    newX, newY = (-1, -1)
-                    if direction == 0:
-                        newX, newY = (x, (y-1)%self.__height)
-                    elif direction == 1:
-                        newX, newY = ((x+1)%self.__width, y)
-                    elif direction == 2:
-                        newX, newY = (x, (y+1)%self.__height)
-                    elif direction == 3:
-                        newX, newY = ((x-1)%self.__width, y)
-                    if newX != -1:
-                        if self.__world[newX][newY]==None:
-                            self.__world[newX][newY] = msg.sender
-                            self.__world[x][y] = None
-                        else:
-                            self.sendMessage(Message("NOT MOVED%s" %self.__world[newX][newY]), msg.sender)
-        self.displayState_text()
+        moves = [(msg.sender, int(msg.content)) for msg in self.drainMessages()]
+        while moves:
+            moves = self.resolveMoves(moves)
+        self.renderer.render(self)
+        
+    def resolveMoves(self, moves):
+        """ Applies a batch of moves together.
+        
+        All targets are computed first, then a move succeeds if its target cell was free before the batch and no earlier move of the batch claimed it. The successful moves are applied together, the others are answered by a "NOT MOVED" message carrying the ID of the agent in the way. Only the first move of each agent is resolved, the other ones are returned to be resolved by a next batch.
+        @param moves: Couples of agent ID and direction, in the order of the messages.
+        @type moves: C{list<(int, int)>}
+        @return: The moves which have been deferred.
+        @rtype: C{list<(int, int)>}
+        """
+        width, height = self.__width, self.__height
+        world, positions, offsets = self.__world, self.__positions, self.offsets
+        deferred = []
+        seen = {}
+        movers = []
+        for move in moves:
+            if move[0] in seen:
+                deferred.append(move)
+            else:
+                seen[move[0]] = None
+                if move[0] in positions and 0 <= move[1] < 4:
+                    movers.append(move)
+        origins = [positions[sender] for sender, direction in movers]
+        targets = [((cell // height + offsets[direction][0]) % width) * height + (cell % height + offsets[direction][1]) % height
+                   for cell, (sender, direction) in zip(origins, movers)]
+        occupants = [world[target] for target in targets]
+        claimed = {}
+        winners = []
+        for i in range(len(movers)):
+            target = targets[i]
+            occupant = occupants[i]
+            if occupant == EMPTY:
+                occupant = claimed.setdefault(target, movers[i][0])
+            if occupant == movers[i][0]:
+                winners.append(i)
+            else:
+                self.sendMessage(Message("NOT MOVED%s" %occupant), movers[i][0])
+        for i in winners:
+            world[origins[i]] = EMPTY
+        for i in winners:
+            sender = movers[i][0]
+            world[targets[i]] = sender
+            positions[sender] = targets[i]
+        return deferred
         
     def displayState_text(self):
-        lines = "-"*77+"\n"
-        for i in range(self.__width):
-            line = ""
-            for j in range(self.__height):
-                if self.__world[i][j] == None:
-                    line = line + "[    ]\t"
-                elif self.__world[i][j] in self.kernel.getAgentsWith(role="hunted"):
-                    line = line + "[ ** ]\t"
-                else:
-                    line = line + "[ %02d ]\t" %self.__world[i][j]
-            lines = lines + line + "\n"
-        lines = lines + "-"*77
-        print lines
\ No newline at end of file
+        if self.__text == None:
+            self.__text = TextRenderer()
+        self.__text.draw(self)
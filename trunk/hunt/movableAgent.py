@@ -7,4 +7,4 @@ class MovableAgent(Agent):
     direction = {"TOP":0, "RIGHT":1, "BOTTOM":2, "LEFT":3}
     
     def moveTo(self, aDirection):
-        return self.sendBroadcastMessage(Message("%s" %aDirection), "mover")
+        return self.publish(Message("%s" %aDirection), "move")
@@ -4,8 +4,6 @@ Predator agent of the prey/predator game.
 from movableAgent import MovableAgent
 import random
 
-random.seed()
-
 class Predator(MovableAgent):
     def born(self):
         self.requestRole(role="hunter")
@@ -4,8 +4,6 @@ Prey agent of the prey/predator game.
 from movableAgent import MovableAgent
 import random
 
-random.seed()
-
 class Prey(MovableAgent):
     def born(self):
         self.requestRole(role="hunted")
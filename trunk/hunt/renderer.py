@@ -0,0 +1,117 @@
+"""
+Renderers of the world mesh of the prey/predator game.
+"""
+from array import array
+import sys, time
+
+class Renderer(object):
+    """ Base class of the mesh renderers. It draws nothing, so it can be used for headless runs.
+    @ivar fps: Maximum number of frames drawn per second (if C{None}, a frame is drawn at each call of C{L{render}}).
+    @type fps: C{float}
+    @ivar output: File where the frames are written.
+    @type output: C{file}
+    @ivar __last: Time (as returned by C{time.time()}) at which the last frame was drawn.
+    @type __last: C{float}
+    """
+    def __init__(self, fps=None, output=None):
+        if output == None:
+            output = sys.stdout
+        self.fps = fps
+        self.output = output
+        self.__last = None
+        
+    def render(self, mesh):
+        """ Draws a frame of the mesh, unless the frame rate is exceeded. Called by the mesh at each step. """
+        if self.fps:
+            now = time.time()
+            if self.__last != None and now - self.__last < 1.0 / self.fps:
+                return
+            self.__last = now
+        self.draw(mesh)
+        
+    def draw(self, mesh):
+        """ Draws a frame of the mesh. """
+        pass
+        
+class TextRenderer(Renderer):
+    """ Renderer which writes the whole board at each frame, one line by column of the mesh.
+    @ivar __view: View of the "hunted" role when C{__hunted} was built.
+    @type __view: C{L{RoleView}}
+    @ivar __version: Version of C{__view} when C{__hunted} was built.
+    @type __version: C{int}
+    @ivar __hunted: IDs of the hunted agents.
+    @type __hunted: C{dict<int, None>}
+    """
+    EMPTY = "[    ]"
+    HUNTED = "[ ** ]"
+    AGENT = "[ %02d ]"
+    SEPARATOR = "-"*77
+    
+    def __init__(self, fps=None, output=None):
+        Renderer.__init__(self, fps, output)
+        self.__view = None
+        self.__version = None
+        self.__hunted = None
+        
+    def getHunted(self, mesh):
+        """ IDs of the hunted agents, as a dictionnary. The same dictionnary is returned until the "hunted" role changes. """
+        view = mesh.kernel.getRoleView(role="hunted")
+        if view is not self.__view or view.version != self.__version:
+            self.__hunted = dict.fromkeys([agent.id for agent in view])
+            self.__view = view
+            self.__version = view.version
+        return self.__hunted
+        
+    def cellText(self, agentId, hunted):
+        if agentId < 0:
+            return self.EMPTY
+        if agentId in hunted:
+            return self.HUNTED
+        return self.AGENT %agentId
+        
+    def draw(self, mesh):
+        hunted = self.getHunted(mesh)
+        cells, height = mesh.cells, mesh.height
+        parts = [self.SEPARATOR, "\n"]
+        for i in xrange(mesh.width):
+            for j in xrange(height):
+                parts.append(self.cellText(cells[i * height + j], hunted))
+                parts.append("\t")
+            parts.append("\n")
+        parts.append(self.SEPARATOR)
+        parts.append("\n")
+        self.output.write("".join(parts))
+        self.output.flush()
+        
+class DiffRenderer(TextRenderer):
+    """ Renderer for ANSI terminals which writes the whole board once, then only the cells which changed since the last frame.
+    @ivar __cells: Cells of the mesh at the last frame.
+    @type __cells: C{array}
+    @ivar __hunted: IDs of the hunted agents at the last frame.
+    @type __hunted: C{dict<int, None>}
+    """
+    def __init__(self, fps=None, output=None):
+        TextRenderer.__init__(self, fps, output)
+        self.__cells = None
+        self.__hunted = None
+        
+    def draw(self, mesh):
+        hunted = self.getHunted(mesh)
+        cells, height = mesh.cells, mesh.height
+        previous = self.__cells
+        if previous == None or len(previous) != len(cells) or hunted is not self.__hunted:
+            self.output.write("\033[2J\033[H")
+            TextRenderer.draw(self, mesh)
+        else:
+            parts = []
+            for index in xrange(len(cells)):
+                if cells[index] != previous[index]:
+                    # One line by column, one tab stop (8 characters) by cell
+                    i, j = divmod(index, height)
+                    parts.append("\033[%d;%dH%s" %(i + 2, j * 8 + 1, self.cellText(cells[index], hunted)))
+            if parts:
+                parts.append("\033[%d;1H" %(mesh.width + 3))
+                self.output.write("".join(parts))
+                self.output.flush()
+        self.__cells = array(cells.typecode, cells)
+        self.__hunted = hunted
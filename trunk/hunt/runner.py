@@ -0,0 +1,151 @@
+"""
+Batch runner of the prey/predator game: plays many seeded headless games over several grid sizes and numbers of predators, on a pool of processes, and collects the number of steps until the prey is catched and the wall time of each game.
+
+Usage: python runner.py [sizes=21x10,50x50] [predators=8,32] [replicates=10] [seed=0] [maxsteps=100000] [processes=4] [csv=results.csv] [json=results.json]
+"""
+from pysma import StepScheduler
+from renderer import Renderer
+from game import createGame
+import sys, time, random
+
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+FIELDS = ("width", "height", "predators", "seed", "steps", "captured", "wallTime")
+
+class _Null(object):
+    """ Output which drops everything, to silence the games. """
+    def write(self, text):
+        pass
+    def flush(self):
+        pass
+
+def runGame(config):
+    """ Plays a game until the prey is catched, or until the maximum number of steps.
+    @param config: Width, height, number of predators, seed and maximum number of steps of the game.
+    @type config: C{tuple}
+    @return: The result of the game, by field name (see C{L{FIELDS}}).
+    @rtype: C{dict}
+    """
+    width, height, predators, seed, maxSteps = config
+    random.seed(seed)
+    stdout = sys.stdout
+    sys.stdout = _Null()
+    try:
+        start = time.time()
+        scheduler = StepScheduler()
+        kernel = createGame(width, height, predators, scheduler, Renderer())
+        scheduler.run(maxSteps)
+        wallTime = time.time() - start
+        captured = scheduler.kernel == None
+        if not captured:
+            kernel.stopKernel()
+    finally:
+        sys.stdout = stdout
+    return {"width": width, "height": height, "predators": predators, "seed": seed,
+            "steps": scheduler.ticks, "captured": captured, "wallTime": wallTime}
+
+def runExperiments(sizes=((21,10),), predators=(8,), replicates=10, seed=0, maxSteps=100000, processes=None):
+    """ Plays C{replicates} games for each grid size and number of predators. Each game has its own seed, so the results do not depend on the number of processes.
+    @param sizes: Couples of width and height.
+    @type sizes: C{list<(int, int)>}
+    @param predators: Numbers of predators.
+    @type predators: C{list<int>}
+    @param replicates: Number of games by grid size and number of predators.
+    @type replicates: C{int}
+    @param seed: Seed of the first game, the next ones are seeded with the following integers.
+    @type seed: C{int}
+    @param maxSteps: Maximum number of steps of a game.
+    @type maxSteps: C{int}
+    @param processes: Number of processes (if C{None}, one by processor; if 1, the games are played in this process).
+    @type processes: C{int}
+    @return: The results of the games (see C{L{runGame}}), in the order of the configurations.
+    @rtype: C{list<dict>}
+    """
+    configs = []
+    for width, height in sizes:
+        for nb in predators:
+            for i in range(replicates):
+                configs.append((width, height, nb, seed + len(configs), maxSteps))
+    if processes == 1 or multiprocessing == None:
+        return map(runGame, configs)
+    pool = multiprocessing.Pool(processes)
+    try:
+        return pool.map(runGame, configs, 1)
+    finally:
+        pool.close()
+        pool.join()
+
+def summarize(results):
+    """ Aggregates the results by grid size and number of predators.
+    @return: By configuration: the width, the height, the number of predators, the number of games, the capture rate, the mean and the median number of steps, the mean wall time and the steps per second.
+    @rtype: C{list<tuple>}
+    """
+    groups = {}
+    order = []
+    for result in results:
+        key = (result["width"], result["height"], result["predators"])
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append(result)
+    summary = []
+    for key in order:
+        games = groups[key]
+        steps = [game["steps"] for game in games]
+        steps.sort()
+        wallTime = sum([game["wallTime"] for game in games])
+        captured = len([game for game in games if game["captured"]])
+        summary.append(key + (len(games), float(captured) / len(games), float(sum(steps)) / len(games),
+                              steps[len(steps) // 2], wallTime / len(games), sum(steps) / max(wallTime, 1e-9)))
+    return summary
+
+def writeCsv(results, path):
+    """ Writes the results of the games to a CSV file, one line by game. """
+    import csv
+    out = open(path, "wb")
+    try:
+        writer = csv.writer(out)
+        writer.writerow(FIELDS)
+        for result in results:
+            writer.writerow([result[field] for field in FIELDS])
+    finally:
+        out.close()
+
+def writeJson(results, path):
+    """ Writes the results of the games to a JSON file, as a list of objects. """
+    import json
+    out = open(path, "w")
+    try:
+        json.dump(results, out, indent=1)
+    finally:
+        out.close()
+
+def main(csvPath=None, jsonPath=None, **kwargs):
+    start = time.time()
+    results = runExperiments(**kwargs)
+    print "%d games in %.2f s" %(len(results), time.time() - start)
+    print "%-10s %9s %6s %8s %10s %8s %10s %12s" %("grid", "predators", "games", "captured", "mean steps", "median", "mean time", "steps/s")
+    for width, height, nb, games, rate, mean, median, wallTime, speed in summarize(results):
+        print "%-10s %9d %6d %7.0f%% %10.1f %8d %9.3fs %12.0f" %("%dx%d" %(width, height), nb, games, rate * 100, mean, median, wallTime, speed)
+    if csvPath:
+        writeCsv(results, csvPath)
+    if jsonPath:
+        writeJson(results, jsonPath)
+
+if __name__ == "__main__":
+    kwargs = {}
+    for arg in sys.argv:
+        if arg.count("=") == 1:
+            cle, val = arg.split("=")
+            if cle=="sizes": kwargs["sizes"] = [tuple(map(int, s.split("x"))) for s in val.split(",")]
+            if cle=="predators": kwargs["predators"] = map(int, val.split(","))
+            if cle=="replicates": kwargs["replicates"] = int(val)
+            if cle=="seed": kwargs["seed"] = int(val)
+            if cle=="maxsteps": kwargs["maxSteps"] = int(val)
+            if cle=="processes": kwargs["processes"] = int(val)
+            if cle=="csv": kwargs["csvPath"] = val
+            if cle=="json": kwargs["jsonPath"] = val
+    main(**kwargs)
@@ -1,6 +1,12 @@
 # Initialisation of the package PySMA
 from agent import *
+from lightAgent import *
+from population import *
 from actionAgent import *
 from kernel import *
 from scheduler import *
 from message import *
+from messageBox import *
+from metrics import *
+from coroutine import *
+from shard import *
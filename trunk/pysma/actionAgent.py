@@ -4,24 +4,76 @@
 """
 from agent import Agent
 from message import Message
+import types, time
+
+def handles(*actions):
+    """ Decorator which registers a method of an C{L{ActionAgent}} subclass as the action-specific handler of the given actions, whatever its name.
+    @param actions: Names of the handled actions.
+    @type actions: C{str}
+    @return: The decorator.
+    @rtype: C{callable}
+    """
+    def register(fct):
+        fct.handledActions = getattr(fct, "handledActions", ()) + actions
+        return fct
+    return register
+
+def _isHandler(value):
+    """ Verifies if a class attribute may be a message handler: a callable, or a function marked by C{L{handles}}.
+    @param value: Value of the attribute.
+    @rtype: C{bool}
+    """
+    return callable(value) or hasattr(value, "handledActions")
+
+class ActionAgentType(type):
+    """ Metaclass of the action agents. It drops the handler dispatch tables when a method is added, replaced or removed in an action agent class. Setting or deleting another class attribute (e.g. a counter) keeps them. """
+    def __setattr__(cls, name, value):
+        handler = _isHandler(value) or _isHandler(getattr(cls, name, None))
+        type.__setattr__(cls, name, value)
+        if handler:
+            ActionAgent.invalidateHandlers()
+        
+    def __delattr__(cls, name):
+        handler = _isHandler(getattr(cls, name, None))
+        type.__delattr__(cls, name)
+        if handler:
+            ActionAgent.invalidateHandlers()
 
 class ActionAgent(Agent):
     """ It is the subclass of an agent which processes messages by calling methods.
     
-    An event-specific handler is an instance method which handle one and only one action type. It has a conventionnal name made by the concatenation of the C{prefix} L{constructor<__init__>} parameter + the action name + the C{suffix} L{constructor<__init__>} parameter.
+    An event-specific handler is an instance method which handle one and only one action type. It has a conventionnal name made by the concatenation of the C{prefix} L{constructor<__init__>} parameter + the action name + the C{suffix} L{constructor<__init__>} parameter. A method of any name can also be registered as the handler of one or more actions with the C{L{handles}} decorator.
+    
+    The handler of an action is looked up once per class and pattern, then kept in a dispatch table, so processing a message only costs a dictionnary lookup. The tables are dropped when a method is set on an action agent class.
     
     The default handler is an instace method which handle each action message which cannot be handled by its repective action-specific handler. It has a conventionnal name defined by the C{default} L{constructor<__init__>} parameter.
     
     If the event cannot be handled (because the default handler is not implemented), an C{L{UnhandledActionError}} is raised, except if C{L{silent}} flag is C{True}.
     
     If a message which is not an C{L{ActionMessage}} instance is processed, it will be handled by the default handler. If the default handler is not implemented, the message will be ignored.
+    @cvar batchSize: Maximum number of messages taken from the message box at once by C{L{processAllMessages}}.
+    @type batchSize: C{int}
+    @cvar __tables: Handler dispatch tables. Dictionnary of couples (type C{tuple}) which contain an action agent class and a handler pattern (type C{str}), which point to a dictionnary of action names (type C{str}) which point to a handler function (C{None} if the action has no handler).
+    @type __tables: C{dict<(class, str), dict<str, function>>}
     @ivar pattern: Action-specific handler pattern.
     @type pattern: C{str}
     @ivar silent: Silent flag. If C{False}, C{L{UnhandledActionError}} is raised if an action cannot be handled. If C{True}, do nothing, listener does not handle the event.
     @type silent: C{str}
     @ivar currentMessage: The last message processed. C{None} when no action-specific handler is executing.
     @type currentMessage: C{L{Message}}
+    @ivar recycleMessages: Recycling flag. If C{True}, C{L{processAllMessages}} releases each message once handled, so messages acquired from a C{L{MessagePool}} go back to it. Handlers must not keep the messages then.
+    @type recycleMessages: C{bool}
+    @ivar __handlers: Dispatch table of the class and the pattern of the agent.
+    @type __handlers: C{dict<str, function>}
+    @ivar __handlersPattern: Pattern used to get C{__handlers}.
+    @type __handlersPattern: C{str}
+    @ivar __default: Name of the default handler.
+    @type __default: C{str}
     """
+    __metaclass__ = ActionAgentType
+    batchSize = 256
+    __tables = {}
+    
     def __init__(self, prefix="msg", suffix="", default="messageReceived", silent=False):
         """ Action agent constructor.
         @param prefix: Prefix for all action-specific handler function name.
@@ -35,45 +87,143 @@ class ActionAgent(Agent):
         """
         Agent.__init__(self)
         self.pattern = prefix + "%s" + suffix
-        if hasattr(self, default):
-            self.__defaultHandler = getattr(self, default)
-        else:
-            self.__defautlHandler = self.__default_handler
+        self.__default = default
+        self.__setDefaultHandler()
         self.silent = silent
         self.currentMessage = None
+        self.recycleMessages = False
+        self.__handlersPattern = None
+        self.__handlers = None
+    
+    def getHandlers(cls, pattern):
+        """ Gets the dispatch table of an action agent class for a handler pattern. The table is filled as actions are processed.
+        @param pattern: Action-specific handler pattern.
+        @type pattern: C{str}
+        @return: Dictionnary of action names which point to a handler function (C{None} if the action has no handler).
+        @rtype: C{dict<str, function>}
+        """
+        return ActionAgent.__tables.setdefault((cls, pattern), {})
+    getHandlers = classmethod(getHandlers)
+    
+    def invalidateHandlers(cls):
+        """ Empties all the dispatch tables, so the handlers are looked up again. Called automatically when a method is set on an action agent class. """
+        for table in ActionAgent.__tables.values():
+            table.clear()
+    invalidateHandlers = classmethod(invalidateHandlers)
+        
+    def findHandler(cls, action, pattern):
+        """ Looks up the handler of an action in an action agent class and its bases. In each class, a method registered with C{L{handles}} comes before a method with a conventionnal name.
+        @param action: Name of the action.
+        @type action: C{str}
+        @param pattern: Action-specific handler pattern.
+        @type pattern: C{str}
+        @return: The handler function, to be called with the agent as first argument, or C{None} if not found.
+        @rtype: C{function}
+        """
+        name = pattern %(action.replace(' ', '_'))
+        for klass in cls.__mro__:
+            for key, value in klass.__dict__.items():
+                if action in getattr(value, "handledActions", ()):
+                    # The method may be overrided in a subclass
+                    value = getattr(cls, key)
+                    return getattr(value, "im_func", value)
+            if name in klass.__dict__:
+                value = klass.__dict__[name]
+                if isinstance(value, types.FunctionType):
+                    return value
+                if callable(getattr(cls, name)):
+                    return lambda agent, *arg, **kw: getattr(agent, name)(*arg, **kw)
+                return None
+        return None
+    findHandler = classmethod(findHandler)
     
     # Launch message processing for the next message
     def processActionMessage(self, msg):
         """ Processes a message to be handled.
         @param msg: The message processed.
         @type msg: C{L{ActionMessage} or L{Message}}
+        @return: The value returned by the handler (e.g. a generator if the handler is a coroutine, see C{L{AsyncActionAgent}}).
         @raise UnhandledActionError: if C{L{silent}} is C{False} and there is no default handler to handle the message.
         """
         if msg == None:
-            return
+            return None
         if isinstance(msg, ActionMessage):
-            action = self.pattern %(msg.action.replace(' ', '_'))
-            if hasattr(self, action):
-                fct = getattr(self, action)
-                if callable(fct):
-                    self.currentMessage = msg
-                    try:
-                        fct(*msg.arg, **msg.kw)
-                        self.currentMessage = None
-                    except:
-                        self.currentMessage = None
-                        raise
-                    return
-        self.__defaultHandler(msg)        
+            if self.__handlersPattern is not self.pattern:
+                self.__handlers = type(self).getHandlers(self.pattern)
+                self.__handlersPattern = self.pattern
+            try:
+                fct = self.__handlers[msg.action]
+            except KeyError:
+                fct = self.findHandler(msg.action, self.pattern)
+                self.__handlers[msg.action] = fct
+            if fct != None:
+                self.currentMessage = msg
+                metrics = self.kernel != None and self.kernel.metrics
+                try:
+                    if metrics:
+                        start = time.time()
+                        result = fct(self, *msg.arg, **msg.kw)
+                        metrics.recordHandler(msg.action, time.time() - start)
+                    else:
+                        result = fct(self, *msg.arg, **msg.kw)
+                finally:
+                    self.currentMessage = None
+                return result
+            # Handler set on the instance itself
+            fct = self.__dict__.get(self.pattern %(msg.action.replace(' ', '_')))
+            if callable(fct):
+                self.currentMessage = msg
+                try:
+                    return fct(*msg.arg, **msg.kw)
+                finally:
+                    self.currentMessage = None
+        return self.__defaultHandler(msg)
         
     # Lanch message processing for all waiting messages
     def processAllMessages(self):
-        """ Processes all the messages of the box to be handled.
+        """ Processes all the messages of the box to be handled. If a handler raises an error, the messages taken from the box after the failed one are put back in it, so they are processed by the next call.
         @raise UnhandledActionError: if C{L{silent}} is C{False} and there is no default handler to handle a message.
         """
-        while self.hasMessage():
-            self.processActionMessage(self.getNextMessage())
+        batch = self.drainMessages(self.batchSize)
+        while batch:
+            done = 0
+            try:
+                for msg in batch:
+                    done = done + 1
+                    self.processActionMessage(msg)
+                    if self.recycleMessages:
+                        msg.release()
+            except:
+                self.putBackMessages(batch[done:])
+                raise
+            batch = self.drainMessages(self.batchSize)
        
+    def __setDefaultHandler(self):
+        """ Binds the default handler, or C{L{__default_handler}} if the agent has no method named by C{__default}. """
+        if hasattr(self, self.__default):
+            self.__defaultHandler = getattr(self, self.__default)
+        else:
+            self.__defaultHandler = self.__default_handler
+        
+    def __getstate__(self):
+        """ Gets the state of the agent to pickle, e.g. to save it in a checkpoint: the bound default handler and the dispatch table are dropped, and rebound by C{L{__setstate__}}.
+        @return: The attributes of the agent.
+        @rtype: C{dict<str, any>}
+        """
+        state = self.__dict__.copy()
+        del state["_ActionAgent__defaultHandler"]
+        state["_ActionAgent__handlers"] = None
+        state["_ActionAgent__handlersPattern"] = None
+        return state
+        
+    def __setstate__(self, state):
+        """ Sets the state of an unpickled agent.
+        @param state: The state returned by C{L{__getstate__}}.
+        @type state: C{dict<str, any>}
+        """
+        self.__dict__.update(state)
+        self.__setDefaultHandler()
+        
     def __default_handler(self, message):
         """ The default function for the default handler. If the C{default} L{constructor<__init__>} parameter is not implememented, this function will be used.
         @param message: The message which cannot be handled.
@@ -91,10 +241,16 @@ class ActionAgent(Agent):
     
 class ActionMessage(Message):
     """ Represents a message to an C{L{ActionAgent}} which will call the corresponding method.
+    @ivar action: Type of the action to perform. The name of the handler will depend on the action name.
     @type action: C{str}
+    @ivar arg: Arguments attached to the action (Empty tuple (C{()}) for none).
     @type arg: C{tuple or list}
+    @ivar kw: Keywords (optional arguments) attached to the action (Empty dictionnary (C{E{lb}E{rb}}) for none).
     @type kw: C{dict}
+    @type content: C{(str, tuple, dict)}
     """
+    __slots__ = ("action", "arg", "kw")
+    
     def __init__(self, action, arg, kw={}):
         """ Action message constructor.
         @param action: Type of the action to perform. The name of the handler will depend on the action name.
@@ -104,33 +260,18 @@ class ActionMessage(Message):
         @param kw: Keywords (optional arguments) attached to the action (Empty dictionnary (C{E{lb}E{rb}}) for none).
         @type kw: C{dict}
         """
-        Message.__init__(self, (action, arg, kw))
+        Message.__init__(self, None)
+        self.action = action
+        self.arg = arg
+        self.kw = kw
         
-    def __getAction(self):
-        """ C{L{action}} property getter.
-        @return: The name of the action.
-        @rtype: C{str}
+    def __getContent(self):
+        """ C{L{content}} property getter.
+        @return: The action, its arguments and its keywords.
+        @rtype: C{(str, tuple, dict)}
         """
-        return self.content[0]
-    
-    action = property(__getAction, doc="Type of the action to perform. The name of the handler will depend on the action name.")
-    
-
-    def __getArguments(self):
-        """ C{L{arg}} property getter.
-        @return: The action arguments.
-        @rtype: C{tuple or list}
-        """
-        return self.content[1]
-    arg = property(__getArguments, doc="Arguments attached to the action (Empty tuple (C{()}) for none).")
-        
-    def __getKeywords(self):
-        """ C{L{kw}} property getter.
-        @return: The action keywords.
-        @rtype: C{dict}
-        """
-        return self.content[2]
-    kw = property(__getKeywords, doc="Keywords (optional arguments) attached to the action (Empty dictionnary (C{E{lb}E{rb}}) for none).")
+        return (self.action, self.arg, self.kw)
+    content = property(__getContent, doc="Triple which contains the action, its arguments and its keywords (Read only).")
     
     def __str__(self):
         return "<pysma.actionAgent.ActionMessage sender=%s receiver=%s content=%s(*%s, **%s)>" %(self.sender, self.receiver, self.action, self.arg, self.kw)
@@ -140,6 +281,18 @@ class ActionMessage(Message):
         msg.sender = self.sender
         msg.receiver = self.receiver
         return msg
+        
+    def __getstate__(self):
+        return (self.sender, self.receiver, self.action, self.arg, self.kw)
+        
+    def __setstate__(self, state):
+        Message.__setstate__(self, (state[0], state[1], None))
+        self.action, self.arg, self.kw = state[2:]
+        
+    def _clear(self):
+        Message._clear(self)
+        self.arg = None
+        self.kw = None
     
 class UnhandledActionError(AttributeError):
     """ Error raised when an action message cannot be handled, except if C{L{silent<ActionAgent.silent>}} flag is C{True}. """
@@ -2,21 +2,31 @@
 @author: Damien Boucard
 @version: 0.3
 """
+from messageBox import MessageBox
+
 class Agent(object):
     """ It is the class of an agent of the multi-agent system.
     @ivar kernel: The kernel where the agents lives. C{None} until born or since died.
     @type kernel: C{L{Kernel}}
     @type id: C{int}
+    @type messageBox: C{L{MessageBox}}
     @ivar __msgbox: Incomming message box.
-    @type __msgbox: C{list<L{Message}>}
-    @group Abstract methods: born, live, die
-    @group Message methods: sendMessage, sendBroadcastMessage, receiveMessage, getNextMessage, hasMessage
-    @group Organization methods: requestRole, leaveRole
+    @type __msgbox: C{L{MessageBox}}
+    @group Abstract methods: born, live, die, restored
+    @group Message methods: sendMessage, sendNamedMessage, publish, sendBroadcastMessage, sendMulticastMessage, receiveMessage, getNextMessage, drainMessages, putBackMessages, hasMessage
+    @group Organization methods: requestRole, leaveRole, subscribe, unsubscribe
+    @group Activation methods: wake
+    @group Persistence methods: touch
     """
-    def __init__(self):
-        """ Agent constructor. """
+    def __init__(self, messageBox=None):
+        """ Agent constructor.
+        @param messageBox: Incomming message box (if C{None}, an unbounded C{L{MessageBox}} is used).
+        @type messageBox: C{L{MessageBox}}
+        """
         self.kernel = None
-        self.__msgbox = []
+        if messageBox == None:
+            messageBox = MessageBox()
+        self.__msgbox = messageBox
         
     def __getId(self):
         """ C{L{id}} property getter.
@@ -26,6 +36,14 @@ class Agent(object):
         return self.kernel.getAgentId(self)
     id = property(__getId, "The ID of the agent (Read only).")
     
+    def __getMessageBox(self):
+        """ C{L{messageBox}} property getter.
+        @return: The message box.
+        @rtype: C{L{MessageBox}}
+        """
+        return self.__msgbox
+    messageBox = property(__getMessageBox, doc="Incomming message box, which gives its bound, overflow policy and counters (Read only).")
+    
     def addAgent(self, agent, name="unamed"):
         """ Launches a child agent.
         @param agent: Agent to launch.
@@ -49,6 +67,10 @@ class Agent(object):
         """ Abstract method which is called when the agent is killed. """
         pass
         
+    def restored(self):
+        """ Abstract method which is called when the agent has been restored from a checkpoint, instead of C{born}. It restarts what is not saved with the agent, like threads. """
+        pass
+        
     # MESSAGE MANAGEMENT
     def sendMessage(self, message, receiver):
         """ Sends a message to another agent.
@@ -62,6 +84,34 @@ class Agent(object):
             message.receiver = receiver
             self.kernel.sendMessage(message)
     
+    def sendNamedMessage(self, message, name):
+        """ Sends a message to the agents launched with a given name. See C{L{Kernel.sendNamedMessage}}.
+        @param message: Message to send.
+        @type message: C{L{Message}}
+        @param name: Name of the agents who will receive the message.
+        @type name: C{str}
+        @return: The number of receivers (0 if the agent has no kernel).
+        @rtype: C{int}
+        """
+        if self.kernel != None:
+            message.sender = self.id
+            return self.kernel.sendNamedMessage(message, name)
+        return 0
+    
+    def publish(self, message, topic=None):
+        """ Sends a message to the agents subscribed to a topic. See C{L{Kernel.publish}}.
+        @param message: Message to publish.
+        @type message: C{L{Message}}
+        @param topic: Topic of the message (if C{None}, the topics are given by the class of the message and its action name, if any).
+        @type topic: any hashable
+        @return: The number of subscribers whose message box is full and has rejected the message (0 if the agent has no kernel).
+        @rtype: C{int}
+        """
+        if self.kernel != None:
+            message.sender = self.id
+            return self.kernel.publish(message, topic)
+        return 0
+    
     def sendBroadcastMessage(self, message, role=None, group=None):
         """ Sends a message to all the agent of a given role.
         @param message: Message to send.
@@ -70,17 +120,36 @@ class Agent(object):
         @type role: C{str}
         @param group: Group of the concerned role (if C{None}, the common group is used).
         @type group: C{str}
+        @return: The number of receivers whose message box is full and has rejected the message (0 if the agent has no kernel).
+        @rtype: C{int}
         """
-        message.sender = self.id
-        message.receiver = (group,role)
-        self.kernel.sendBroadcastMessage(message)
+        if self.kernel != None:
+            message.sender = self.id
+            message.receiver = (group,role)
+            return self.kernel.sendBroadcastMessage(message)
+        return 0
+        
+    def sendMulticastMessage(self, message, roles):
+        """ Sends a message to all the agents of several roles. Each agent receives the message once.
+        @param message: Message to send.
+        @type message: C{L{Message}}
+        @param roles: Couples which contain a group (type C{str}, C{None} for the common group) and a role (type C{str}).
+        @type roles: C{list<(str, str)>}
+        @return: The number of receivers whose message box is full and has rejected the message (0 if the agent has no kernel).
+        @rtype: C{int}
+        """
+        if self.kernel != None:
+            message.sender = self.id
+            return self.kernel.sendMulticastMessage(message, roles)
+        return 0
     
     def receiveMessage(self, message):
         """ Receives an incoming message and puts it, in the message box. Called by the kernel.
         @param message: The incoming message.
         @type message: C{L{Message}}
+        @raise MessageBoxFullError: if the message box is full and its overflow policy is "reject".
         """
-        self.__msgbox.append(message)
+        self.__msgbox.put(message)
     
     def getNextMessage(self):
         """ Gets the oldest message of the message box.
@@ -89,9 +158,28 @@ class Agent(object):
         @rtype: C{L{Message}}
         """
         if self.kernel != None:
-            return self.__msgbox.pop(0)
+            return self.__msgbox.get()
         return None
         
+    def drainMessages(self, max_n=None):
+        """ Gets the oldest messages of the message box.
+        @param max_n: Maximum number of messages to get (if C{None}, all the messages are got).
+        @type max_n: C{int}
+        @return: The messages, oldest first.
+        @rtype: C{list<L{Message}>}
+        """
+        if self.kernel != None:
+            return self.__msgbox.drain(max_n)
+        return []
+        
+    def putBackMessages(self, messages):
+        """ Puts messages back at the front of the message box, e.g. the ones drained by C{L{drainMessages}} but not processed.
+        @param messages: The messages, oldest first.
+        @type messages: C{list<L{Message}>}
+        """
+        if self.kernel != None:
+            self.__msgbox.putBack(messages)
+        
     def hasMessage(self):
         """ Verify if the message box is empty or not.
         @return: C{False}, if the message box is empty. C{True}, if there are one or more messages in the box (C{L{self.getNextMessage()<getNextMessage>}} can be called).
@@ -120,4 +208,28 @@ class Agent(object):
         @param group: Group in which the role belongs to (if C{None}, the common group is used.
         @type group: C{str}
         """
-        self.kernel.leaveRole(self.id, role, group)
\ No newline at end of file
+        self.kernel.leaveRole(self.id, role, group)
+        
+    def subscribe(self, topic):
+        """ Subscribes the agent to a topic, to receive the messages published on it.
+        @param topic: The topic: any hashable, e.g. an action name or a message class.
+        @type topic: any hashable
+        """
+        self.kernel.subscribe(self.id, topic)
+        
+    def unsubscribe(self, topic):
+        """ Unsubscribes the agent from a topic.
+        @param topic: The topic.
+        @type topic: any hashable
+        """
+        self.kernel.unsubscribe(self.id, topic)
+        
+    # ACTIVATION MANAGEMENT
+    def wake(self):
+        """ Asks to be activated at the next step by the reactive activators, even without incoming message. """
+        self.kernel.wake(self.id)
+        
+    # PERSISTENCE MANAGEMENT
+    def touch(self):
+        """ Marks the agent as changed, so the next incremental checkpoint saves it again. To be called when the state of the agent changes otherwise than by receiving messages or changing roles. """
+        self.kernel.touch(self.id)
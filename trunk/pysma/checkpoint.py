@@ -0,0 +1,262 @@
+"""
+Checkpoints: saving the whole state of a kernel in a compact binary file, and restoring it in bulk.
+
+A checkpoint file holds the agents (with their message boxes), their names, parents and roles, and the ID counter of the kernel. Restoring it does not replay the launching of the agents: they are registered in bulk, and their C{restored} method is called instead of C{born}.
+
+    >>> save(kernel, "run.ckp")
+    >>> kernel = load("run.ckp")
+
+A C{L{Checkpointer}} saves incremental checkpoints: after a first full checkpoint, each save only appends the agents which have been launched or killed since the previous save, and the ones which have changed: the kernel tracks the agents which receive messages or change roles, and the agents which change their state otherwise must call C{touch} (see C{L{Agent.touch}}). The schedulers, whose state changes at each step (ticks, calendar), are always saved again. The other agents are not pickled again.
+
+The agents are pickled one by one: the references to the kernel and to the agents of the kernel are kept, but the other objects shared by several agents (e.g. a broadcast message in several message boxes) are restored as distinct copies. The agents which hold resources which cannot be pickled (threads, locks, files, running generators) must handle them with C{__getstate__}/C{__setstate__}, and restart them in C{restored}.
+
+File format (version 1): the 8 bytes C{L{MAGIC}}, a version byte, then frames. Each frame is a 4-byte big-endian length followed by a zlib-compressed pickle (protocol 2) of a dictionnary, which holds the saved agents (each one pickled apart with its name, parent and roles), the IDs of the killed agents, and the kernel tables which have changed (launching order, role members). A full frame replaces everything which was read before it.
+@author: Damien Boucard
+@version: 0.3
+"""
+from agent import Agent
+from lightAgent import LightAgent
+from kernel import Kernel
+from scheduler import Scheduler
+import gc, struct, zlib
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from StringIO import StringIO
+
+try:
+    from hashlib import md5
+except ImportError:
+    from md5 import new as md5
+
+MAGIC = "PYSMACKP"
+VERSION = 1
+
+def save(kernel, path):
+    """ Saves a full checkpoint of a kernel.
+    @param kernel: The kernel.
+    @type kernel: C{L{Kernel}}
+    @param path: Path of the checkpoint file, replaced if it already exists.
+    @type path: C{str}
+    @return: The size of the file (in bytes).
+    @rtype: C{int}
+    """
+    return Checkpointer(path).save(kernel)
+
+def load(path, kernel=None):
+    """ Restores a kernel from a checkpoint file.
+    @param path: Path of the checkpoint file.
+    @type path: C{str}
+    @param kernel: Kernel where the agents are restored, which must not have agents (if C{None}, a new kernel is created).
+    @type kernel: C{L{Kernel}}
+    @return: The kernel.
+    @rtype: C{L{Kernel}}
+    @raise CheckpointError: if the file is not a valid checkpoint.
+    """
+    frames = readFrames(path)
+    if not frames:
+        raise CheckpointError("No frame in checkpoint: %s" %path)
+    agents = {}
+    for frame in frames:
+        if frame["full"]:
+            agents = {}
+        for id in frame["removed"]:
+            del agents[id]
+        agents.update(frame["agents"])
+        if frame["order"] != None:
+            order = frame["order"]
+        if frame["groups"] != None:
+            groups = frame["groups"]
+    if kernel == None:
+        kernel = Kernel()
+    # The agents are created before their states are loaded, so the states can refer to any agent.
+    shells = {}
+    for id in order:
+        cls = agents[id][0]
+        shells[id] = cls.__new__(cls)
+    def persistentLoad(pid):
+        if pid == "kernel":
+            return kernel
+        return shells[pid]
+    # Millions of objects are created without garbage: the cyclic garbage collector would only slow down the loading.
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        entries = []
+        roles = {}
+        for id in order:
+            unpickler = pickle.Unpickler(StringIO(agents[id][1]))
+            unpickler.persistent_load = persistentLoad
+            name, parent, roles[id], state = unpickler.load()
+            agent = shells[id]
+            setState(agent, state)
+            entries.append((id, agent, name, parent))
+        kernel.importState({"nextId": frame["nextId"], "agents": entries, "groups": groups, "roles": roles, "shareBroadcasts": frame["shareBroadcasts"]})
+    finally:
+        if collecting:
+            gc.enable()
+    return kernel
+
+def readFrames(path):
+    """ Reads the frames of a checkpoint file.
+    @param path: Path of the checkpoint file.
+    @type path: C{str}
+    @return: The frames, in writing order.
+    @rtype: C{list<dict<str, any>>}
+    @raise CheckpointError: if the file is not a valid checkpoint.
+    """
+    data = open(path, "rb").read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise CheckpointError("Not a checkpoint file: %s" %path)
+    version = ord(data[len(MAGIC)])
+    if version != VERSION:
+        raise CheckpointError("Unsupported checkpoint version %d: %s" %(version, path))
+    frames = []
+    offset = len(MAGIC) + 1
+    while offset < len(data):
+        if offset + 4 > len(data):
+            raise CheckpointError("Truncated checkpoint: %s" %path)
+        size = struct.unpack(">I", data[offset:offset+4])[0]
+        offset = offset + 4
+        if offset + size > len(data):
+            raise CheckpointError("Truncated checkpoint: %s" %path)
+        frames.append(pickle.loads(zlib.decompress(data[offset:offset+size])))
+        offset = offset + size
+    return frames
+
+def getState(agent):
+    """ Gets the state of an agent to pickle, like the pickle module does.
+    @param agent: The agent.
+    @type agent: C{L{Agent}}
+    @return: The state.
+    """
+    getstate = getattr(agent, "__getstate__", None)
+    if getstate != None:
+        return getstate()
+    return agent.__dict__
+
+def setState(agent, state):
+    """ Sets the state of an agent, like the pickle module does.
+    @param agent: The agent, created without calling its constructor.
+    @type agent: C{L{Agent}}
+    @param state: The state returned by C{L{getState}}.
+    """
+    setstate = getattr(agent, "__setstate__", None)
+    if setstate != None:
+        setstate(state)
+    else:
+        agent.__dict__.update(state)
+
+class Checkpointer(object):
+    """ It saves incremental checkpoints of a kernel in a file. The first save writes a full checkpoint and starts tracking the changed agents in the kernel (see C{L{Kernel.trackChanges}}); each next one appends a frame with the agents which have been launched or have changed since the previous save, and the kernel tables which have changed. An agent saved with messages in its box is saved again by the next save, since it may have consumed them meanwhile. The C{L{Scheduler}} agents are saved by every save. The file can be restored with C{L{load}}.
+    @ivar path: Path of the checkpoint file.
+    @type path: C{str}
+    @ivar fullEvery: Number of saves after which a full checkpoint is written again, to bound the size of the file (if C{None}, only the first save is full).
+    @type fullEvery: C{int}
+    @ivar saves: Number of saves done since the last full checkpoint.
+    @type saves: C{int}
+    @ivar __kernel: The kernel saved by the previous save. Saving another kernel writes a full checkpoint.
+    @type __kernel: C{L{Kernel}}
+    @ivar __ids: IDs of the agents saved by the previous save.
+    @type __ids: C{set<int>}
+    @ivar __groupsDigest: Digest of the role members at the previous save.
+    @type __groupsDigest: C{str}
+    """
+    def __init__(self, path, fullEvery=None):
+        """ Checkpointer constructor.
+        @param path: Path of the checkpoint file.
+        @type path: C{str}
+        @param fullEvery: Number of saves after which a full checkpoint is written again (if C{None}, only the first save is full).
+        @type fullEvery: C{int}
+        """
+        self.path = path
+        self.fullEvery = fullEvery
+        self.saves = 0
+        self.__kernel = None
+        self.__ids = None
+        self.__groupsDigest = None
+    
+    def save(self, kernel, full=False):
+        """ Saves a checkpoint of a kernel.
+        @param kernel: The kernel.
+        @type kernel: C{L{Kernel}}
+        @param full: Full flag. If C{True}, a full checkpoint replaces the file, even if an incremental one could be appended.
+        @type full: C{bool}
+        @return: The size of the written frame (in bytes).
+        @rtype: C{int}
+        """
+        kernel.trackChanges()
+        changed = kernel.takeChanged()
+        state = kernel.exportState()
+        full = full or self.__ids == None or kernel is not self.__kernel or (self.fullEvery != None and self.saves >= self.fullEvery)
+        if full:
+            previous = set()
+            self.saves = 0
+        else:
+            previous = self.__ids
+        ids = {}
+        for id, agent, name, parent in state["agents"]:
+            ids[agent] = id
+        def persistentId(obj):
+            if obj is kernel:
+                return "kernel"
+            if isinstance(obj, (Agent, LightAgent)):
+                return ids.get(obj)
+            return None
+        buffer = StringIO()
+        pickler = pickle.Pickler(buffer, 2)
+        if pickle.__name__ == "cPickle":
+            # cPickle: only called for the instances of classes, not for the builtin types
+            pickler.inst_persistent_id = persistentId
+        else:
+            pickler.persistent_id = persistentId
+        roles = state["roles"]
+        agents = {}
+        order = []
+        launched = False
+        for id, agent, name, parent in state["agents"]:
+            order.append(id)
+            if full or id in changed or id not in previous or isinstance(agent, Scheduler):
+                pickler.clear_memo()
+                buffer.seek(0)
+                buffer.truncate()
+                pickler.dump((name, parent, roles[id], getState(agent)))
+                agents[id] = (agent.__class__, buffer.getvalue())
+                launched = launched or id not in previous
+                if agent.hasMessage():
+                    kernel.touch(id)
+        ids = set(order)
+        removed = [id for id in previous if id not in ids]
+        groups = pickle.dumps(state["groups"], 2)
+        groupsDigest = md5(groups).digest()
+        frame = {"full": full, "nextId": state["nextId"], "shareBroadcasts": state["shareBroadcasts"], "agents": agents, "removed": removed, "order": None, "groups": None}
+        if full or launched or removed:
+            frame["order"] = order
+        if full or groupsDigest != self.__groupsDigest:
+            frame["groups"] = state["groups"]
+        data = zlib.compress(pickle.dumps(frame, 2))
+        if full:
+            out = open(self.path, "wb")
+            out.write(MAGIC + chr(VERSION))
+        else:
+            out = open(self.path, "ab")
+        try:
+            out.write(struct.pack(">I", len(data)))
+            out.write(data)
+        finally:
+            out.close()
+        self.__kernel = kernel
+        self.__ids = ids
+        self.__groupsDigest = groupsDigest
+        self.saves = self.saves + 1
+        return len(data) + 4
+
+class CheckpointError(Exception):
+    """ Error raised when a checkpoint file cannot be read. """
+    pass
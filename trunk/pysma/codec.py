@@ -0,0 +1,209 @@
+"""
+Binary codec of the messages, used to send them to another process (see C{L{transport}}).
+
+A value is encoded as a one-byte tag followed by its data, in big-endian order. The messages (C{L{Message}}, C{L{ActionMessage}}) and the topics (C{L{Topic}}) have their own tags; a C{L{MessageView}} is encoded as its plain message. The values of the builtin types which C{marshal} supports (C{None}, booleans, numbers, strings, and tuples, lists, sets and dictionnaries of them) are encoded with it, in one block; the tuples, lists and dictionnaries which hold other values are encoded item by item. Any other value, including an instance of another subclass of C{L{Message}}, is pickled inside the encoded data.
+
+    >>> data = dumps(ActionMessage("move", (1, 2)))
+    >>> message = loads(data)
+
+The data returned by C{L{dumps}} begins with the C{L{VERSION}} byte of the codec. Encoded values nest, so a batch of messages is encoded as a list. The format of C{marshal} depends on the version of Python, so both ends must run the same one; and the pickled values are rebuilt by their own code, so only trusted data must be decoded.
+@author: Damien Boucard
+@version: 0.3
+"""
+from message import Message, MessageView, Topic
+from actionAgent import ActionMessage
+import marshal, struct
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+VERSION = 1
+
+def dumps(value):
+    """ Encodes a value.
+    @param value: The value.
+    @return: The encoded data, beginning with the version of the codec.
+    @rtype: C{str}
+    @raise CodecError: if the value cannot be encoded.
+    """
+    parts = [chr(VERSION)]
+    try:
+        encode(value, parts)
+    except (pickle.PicklingError, TypeError), error:
+        raise CodecError("Cannot encode %r: %s" %(value, error))
+    return "".join(parts)
+
+def loads(data):
+    """ Decodes a value encoded by C{L{dumps}}.
+    @param data: The encoded data.
+    @type data: C{str}
+    @return: The value.
+    @raise CodecError: if the data is not valid, or has been encoded by another version of the codec.
+    """
+    if not data:
+        raise CodecError("No data to decode")
+    version = ord(data[0])
+    if version != VERSION:
+        raise CodecError("Unsupported codec version %d" %version)
+    try:
+        value, offset = decode(data, 1)
+    except (IndexError, KeyError, ValueError, EOFError, struct.error, pickle.UnpicklingError), error:
+        raise CodecError("Invalid data: %s" %error)
+    if offset != len(data):
+        raise CodecError("Invalid data: %d bytes left" %(len(data) - offset))
+    return value
+
+# ENCODING
+def encode(value, parts):
+    """ Appends the encoding of a value to a list of strings, without the version byte. Used to write values in a stream which has its own header, like a trace.
+    @param value: The value.
+    @param parts: The encoded strings.
+    @type parts: C{list<str>}
+    """
+    encoder = _ENCODERS.get(type(value))
+    if encoder != None:
+        encoder(value, parts)
+        return
+    try:
+        data = marshal.dumps(value)
+    except ValueError:
+        parts.append("P")
+        data = pickle.dumps(value, 2)
+    else:
+        parts.append("V")
+    parts.append(struct.pack(">I", len(data)))
+    parts.append(data)
+
+def _encodeItems(tag, encodeItem):
+    """ Builds the encoder of a container, which tries to encode it with C{marshal} in one block, else item by item. """
+    def encodeContainer(value, parts):
+        try:
+            data = marshal.dumps(value)
+        except ValueError:
+            parts.append(tag + struct.pack(">I", len(value)))
+            encodeItem(value, parts)
+        else:
+            parts.append("V" + struct.pack(">I", len(data)))
+            parts.append(data)
+    return encodeContainer
+
+def _encodeSequence(value, parts):
+    for item in value:
+        encode(item, parts)
+
+def _encodeDict(value, parts):
+    for key, item in value.iteritems():
+        encode(key, parts)
+        encode(item, parts)
+
+def _encodeMessage(value, parts):
+    parts.append("M")
+    _encodeTuple((value.sender, value.receiver, value.content), parts)
+
+def _encodeActionMessage(value, parts):
+    parts.append("A")
+    _encodeTuple((value.sender, value.receiver, value.action, value.arg, value.kw), parts)
+
+def _encodeView(value, parts):
+    encode(value.toMessage(), parts)
+
+def _encodeTopic(value, parts):
+    parts.append("O")
+    encode(value.topic, parts)
+
+_encodeTuple = _encodeItems("t", _encodeSequence)
+
+_ENCODERS = {
+    tuple: _encodeTuple,
+    list: _encodeItems("l", _encodeSequence),
+    dict: _encodeItems("m", _encodeDict),
+    Message: _encodeMessage,
+    ActionMessage: _encodeActionMessage,
+    MessageView: _encodeView,
+    Topic: _encodeTopic,
+}
+
+# DECODING
+def decode(data, offset):
+    """ Decodes a value encoded by C{L{encode}}.
+    @param data: The encoded data (a string, or a memory-mapped file).
+    @type data: C{str}
+    @param offset: Position of the tag of the value in C{data}.
+    @type offset: C{int}
+    @return: The value, and the position which follows its data.
+    @rtype: C{(any, int)}
+    @raise Exception: if the data is not valid (the errors are not wrapped in a C{L{CodecError}}, see C{L{loads}}).
+    """
+    return _DECODERS[data[offset]](data, offset + 1)
+
+def _block(data, offset):
+    """ Gets a block of data which follows its 4-byte length. """
+    end = offset + 4 + struct.unpack(">I", data[offset:offset+4])[0]
+    if end > len(data):
+        raise IndexError("truncated data")
+    return data[offset+4:end], end
+
+def _decodeMarshal(data, offset):
+    block, end = _block(data, offset)
+    return marshal.loads(block), end
+
+def _decodePickle(data, offset):
+    block, end = _block(data, offset)
+    return pickle.loads(block), end
+
+def _decodeList(data, offset):
+    count = struct.unpack(">I", data[offset:offset+4])[0]
+    offset = offset + 4
+    items = []
+    for i in xrange(count):
+        item, offset = decode(data, offset)
+        items.append(item)
+    return items, offset
+
+def _decodeTuple(data, offset):
+    items, offset = _decodeList(data, offset)
+    return tuple(items), offset
+
+def _decodeDict(data, offset):
+    count = struct.unpack(">I", data[offset:offset+4])[0]
+    offset = offset + 4
+    items = {}
+    for i in xrange(count):
+        key, offset = decode(data, offset)
+        items[key], offset = decode(data, offset)
+    return items, offset
+
+def _decodeMessage(data, offset):
+    (sender, receiver, content), offset = decode(data, offset)
+    message = Message(content)
+    message.sender = sender
+    message.receiver = receiver
+    return message, offset
+
+def _decodeActionMessage(data, offset):
+    (sender, receiver, action, arg, kw), offset = decode(data, offset)
+    message = ActionMessage(action, arg, kw)
+    message.sender = sender
+    message.receiver = receiver
+    return message, offset
+
+def _decodeTopic(data, offset):
+    topic, offset = decode(data, offset)
+    return Topic(topic), offset
+
+_DECODERS = {
+    "V": _decodeMarshal,
+    "P": _decodePickle,
+    "t": _decodeTuple,
+    "l": _decodeList,
+    "m": _decodeDict,
+    "M": _decodeMessage,
+    "A": _decodeActionMessage,
+    "O": _decodeTopic,
+}
+
+class CodecError(Exception):
+    """ Error raised when a value cannot be encoded, or data cannot be decoded. """
+    pass
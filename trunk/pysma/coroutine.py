@@ -0,0 +1,455 @@
+"""
+Coroutine agents, run by an event loop.
+
+The C{live} method of an agent scheduled by an C{L{AsyncScheduler}} may be a generator function. The generator is then run as a coroutine: it suspends itself by yielding an awaitable (C{L{Sleep}}, C{L{Receive}}, C{L{Readable}}, another generator to wait for its end, or C{None} to let the other agents run), and is resumed when the awaitable is done. Thousands of agents waiting for timers, messages or files share one thread, and cost nothing while waiting.
+
+    >>> class Pinger(Agent):
+    ...     def live(self):
+    ...         while True:
+    ...             message = yield Receive(timeout=5)
+    ...             if message == None:
+    ...                 break
+    ...             yield Sleep(0.1)
+    ...             self.sendMessage(Message("pong"), message.sender)
+
+@note: Coroutines need Python 2.5 or later (generator C{send} method).
+@author: Damien Boucard
+@version: 0.3
+"""
+from scheduler import Scheduler
+from actionAgent import ActionAgent
+import heapq, os, select, time, types
+
+class Sleep(object):
+    """ Awaitable which suspends a coroutine for a given duration. The coroutine is resumed with C{None}.
+    @ivar delay: Duration of the suspension (in seconds).
+    @type delay: C{float}
+    """
+    __slots__ = ("delay",)
+    
+    def __init__(self, delay):
+        """ Sleep constructor.
+        @param delay: Duration of the suspension (in seconds).
+        @type delay: C{float}
+        """
+        self.delay = delay
+
+class Receive(object):
+    """ Awaitable which suspends a coroutine until its agent has a message. The coroutine is resumed with the oldest message of the box, or with C{None} if the timeout expires first.
+    @ivar timeout: Maximum duration of the suspension (in seconds). If C{None}, no limit.
+    @type timeout: C{float}
+    """
+    __slots__ = ("timeout",)
+    
+    def __init__(self, timeout=None):
+        """ Receive constructor.
+        @param timeout: Maximum duration of the suspension (in seconds). If C{None}, no limit.
+        @type timeout: C{float}
+        """
+        self.timeout = timeout
+
+class Readable(object):
+    """ Awaitable which suspends a coroutine until a file (e.g. a socket) can be read without blocking. The coroutine is resumed with C{True}, or with C{False} if the timeout expires first. Only one coroutine at once can wait for a given file.
+    @ivar file: The file, or its descriptor.
+    @type file: C{file or int}
+    @ivar timeout: Maximum duration of the suspension (in seconds). If C{None}, no limit.
+    @type timeout: C{float}
+    """
+    __slots__ = ("file", "timeout")
+    
+    def __init__(self, file, timeout=None):
+        """ Readable constructor.
+        @param file: The file, or its descriptor.
+        @type file: C{file or int}
+        @param timeout: Maximum duration of the suspension (in seconds). If C{None}, no limit.
+        @type timeout: C{float}
+        """
+        self.file = file
+        self.timeout = timeout
+    
+    def getDescriptor(self):
+        """ C{L{descriptor}} property getter.
+        @return: The descriptor of the file.
+        @rtype: C{int}
+        """
+        if isinstance(self.file, (int, long)):
+            return self.file
+        return self.file.fileno()
+    descriptor = property(getDescriptor, doc="Descriptor of the file (Read only).")
+
+class Task(object):
+    """ It is a coroutine run for an agent by an C{L{AsyncScheduler}}.
+    @ivar agent: The agent.
+    @type agent: C{L{Agent}}
+    @ivar stack: Generators of the coroutine. The last one is running, each other one waits for the end of the next one.
+    @type stack: C{list<generator>}
+    @ivar waiting: Awaitable the coroutine is waiting for (C{None} if it is not suspended by an awaitable).
+    @type waiting: C{L{Sleep} or L{Receive} or L{Readable}}
+    @ivar token: Number of times the coroutine has been resumed, used to ignore the timeouts of the awaitables already done.
+    @type token: C{int}
+    """
+    def __init__(self, agent, generator):
+        """ Task constructor.
+        @param agent: The agent.
+        @type agent: C{L{Agent}}
+        @param generator: Generator returned by the C{live} method of the agent.
+        @type generator: C{generator}
+        """
+        self.agent = agent
+        self.stack = [generator]
+        self.waiting = None
+        self.token = 0
+
+class AsyncScheduler(Scheduler):
+    """ Subclass of C{L{Scheduler}} which runs an event loop. It activates the agents of a role when they are ready (see C{L{ReactiveActivator}}): when they have been launched, have received a message or have been woken up. If the C{live} method of an agent returns a generator, it is run as a coroutine: the agent is not activated again before the end of the coroutine, which is resumed when the awaitable it yields is done.
+    
+    The event loop runs on the calling thread with C{L{run}}, or on its own thread if the C{threaded} flag is set. While nothing is ready, it waits in C{select} without using the CPU; the agents of other threads wake it up by sending messages.
+    
+    Errors raised by the agents are not caught: they stop the loop (and the coroutine which raised it).
+    @ivar threaded: Threaded flag. If C{True}, the scheduler runs its event loop by itself on another thread, like other schedulers.
+    @type threaded: C{bool}
+    @type role: C{str}
+    @type group: C{str}
+    @ivar __role: Role of the agents to activate (if C{group} and C{role} equal C{None}, the common role is used).
+    @type __role: C{str}
+    @ivar __group: Group of the concerned role (if C{None}, the common group is used).
+    @type __group: C{str}
+    @ivar __tasks: Running coroutines. Dictionnary of agents which point to their coroutine.
+    @type __tasks: C{dict<L{Agent}, L{Task}>}
+    @ivar __runnable: Coroutines to resume at the next step.
+    @type __runnable: C{list<L{Task}>}
+    @ivar __timers: Heap of the coroutine timeouts: triples which contain the deadline (as returned by C{time.time()}), the coroutine and its token at suspension.
+    @type __timers: C{list<(float, L{Task}, int)>}
+    @ivar __files: Dictionnary of file descriptors which point to the coroutine waiting for them.
+    @type __files: C{dict<int, L{Task}>}
+    @ivar __pipe: Descriptors of the pipe used to wake up the loop while it waits.
+    @type __pipe: C{(int, int)}
+    @ivar __sleeping: Sleeping flag. C{True} while the loop may wait in C{select}.
+    @type __sleeping: C{bool}
+    @ivar __woken: Woken flag. C{True} if an agent has got ready since the beginning of the current step.
+    @type __woken: C{bool}
+    """
+    def __init__(self, role=None, group=None, threaded=False):
+        """ Asynchronous scheduler constructor.
+        @param role: Role of the agents to activate (if C{group} and C{role} equal C{None}, the common role is used).
+        @type role: C{str}
+        @param group: Group of the concerned role (if C{None}, the common group is used).
+        @type group: C{str}
+        @param threaded: Threaded flag. If C{True}, the scheduler runs its event loop by itself on another thread.
+        @type threaded: C{bool}
+        """
+        Scheduler.__init__(self)
+        self.__role = role
+        self.__group = group
+        self.threaded = threaded
+        self.__tasks = {}
+        self.__runnable = []
+        self.__timers = []
+        self.__files = {}
+        self.__pipe = None
+        self.__sleeping = False
+        self.__woken = False
+    
+    def getGroup(self):
+        """ C{L{group}} property getter.
+        @return: The group of the concerned role.
+        @rtype: C{str}
+        """
+        return self.__group
+    group = property(getGroup, doc="Group of the concerned role (if C{None}, the common group is used) (Read only).")
+    
+    def getRole(self):
+        """ C{L{role}} property getter.
+        @return: The role of the activated agents.
+        @rtype: C{str}
+        """
+        return self.__role
+    role = property(getRole, doc="Role of the agents to activate (if C{group} and C{role} equal C{None}, the common role is used) (Read only).")
+    
+    def born(self):
+        self.leaveRole(None)
+        self.restored()
+        
+    def restored(self):
+        """ Starts the restored event loop. The coroutines are not saved with the scheduler: the agents which were running one are activated again. """
+        self.__tasks = {}
+        self.__runnable = []
+        self.__timers = []
+        self.__files = {}
+        self.__pipe = os.pipe()
+        self.__woken = True
+        self.kernel.readyListeners.append(self.__notify)
+        self.kernel.trackReadiness()
+        if self.threaded:
+            Scheduler.born(self)
+    
+    def die(self):
+        """ Stops the event loop and closes the running coroutines. """
+        Scheduler.die(self)
+        self.kernel.readyListeners.remove(self.__notify)
+        for task in self.__tasks.values():
+            self.__finish(task)
+        self.__runnable = []
+        self.__timers = []
+        if self.threaded:
+            self.__sleeping = True
+            self.__notify()
+        else:
+            self.__closePipe()
+    
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("tasks", "files"):
+            state["_AsyncScheduler__" + name] = {}
+        for name in ("runnable", "timers"):
+            state["_AsyncScheduler__" + name] = []
+        state["_AsyncScheduler__pipe"] = None
+        return state
+        
+    def schedule(self):
+        """ Runs the event loop until the scheduler is killed. """
+        Scheduler.schedule(self)
+        self.__closePipe()
+    
+    def live(self):
+        """ Runs one step of the event loop, waiting as long as needed for the next event. """
+        self.step()
+    
+    def run(self, duration=None):
+        """ Runs the event loop on the calling thread.
+        @param duration: Duration of the run (in seconds). If C{None}, the loop runs until there is nothing left to do: no ready agent, and no coroutine waiting for a timer or a file (the coroutines waiting for a message do not keep it running).
+        @type duration: C{float}
+        @return: The number of steps run.
+        @rtype: C{int}
+        """
+        if duration != None:
+            end = time.time() + duration
+        done = 0
+        while self.kernel != None:
+            if duration == None:
+                if not (self.__woken or self.__runnable or self.__timers or self.__files):
+                    break
+                timeout = None
+            else:
+                timeout = end - time.time()
+                if timeout < 0:
+                    break
+            self.step(timeout)
+            done = done + 1
+        return done
+    
+    def step(self, timeout=None):
+        """ Runs one step of the event loop: activates the ready agents, resumes the coroutines which awaitable is done, then waits for the next event. The beginning of the step is recorded as a tick if the kernel has a tracer.
+        @param timeout: Maximum duration of the wait (in seconds). If C{None}, no limit, but the loop does not wait if it runs on the calling thread and no coroutine waits for a timer or a file.
+        @type timeout: C{float}
+        """
+        kernel = self.kernel
+        if kernel == None:
+            return
+        if kernel.tracer != None:
+            kernel.tracer.tick()
+        self.__woken = False
+        tasks = self.__tasks
+        for agent in kernel.takeReady(self.__role, self.__group):
+            task = tasks.get(agent)
+            if task == None:
+                self.__activate(agent)
+            elif type(task.waiting) is Receive:
+                message = agent.getNextMessage()
+                if message != None:
+                    self.__resume(task, message)
+        runnable = self.__runnable
+        self.__runnable = []
+        for task in runnable:
+            self.__resume(task, None)
+        timers = self.__timers
+        now = time.time()
+        while timers and timers[0][0] <= now:
+            deadline, task, token = heapq.heappop(timers)
+            if task.token == token:
+                self.__expire(task)
+        if self.kernel == None:
+            return
+        # Waiting for the next event
+        if self.__runnable:
+            timeout = 0
+        elif timers:
+            delay = max(timers[0][0] - time.time(), 0)
+            if timeout == None or delay < timeout:
+                timeout = delay
+        elif timeout == None and not self.threaded and not self.__files:
+            timeout = 0
+        self.__sleeping = True
+        if self.__woken:
+            timeout = 0
+        descriptors = self.__files.keys()
+        descriptors.append(self.__pipe[0])
+        try:
+            readable = select.select(descriptors, [], [], timeout)[0]
+        except select.error:
+            readable = []
+        self.__sleeping = False
+        for descriptor in readable:
+            if descriptor == self.__pipe[0]:
+                os.read(descriptor, 4096)
+            else:
+                task = self.__files.pop(descriptor, None)
+                if task != None:
+                    self.__resume(task, True)
+    
+    def __notify(self):
+        """ Wakes the loop up if it is waiting. Called by the kernel when an agent gets ready. """
+        self.__woken = True
+        if self.__sleeping:
+            self.__sleeping = False
+            try:
+                os.write(self.__pipe[1], "x")
+            except (OSError, TypeError):
+                pass
+    
+    def __closePipe(self):
+        """ Closes the pipe used to wake up the loop. """
+        if self.__pipe != None:
+            for descriptor in self.__pipe:
+                os.close(descriptor)
+            self.__pipe = None
+    
+    def __activate(self, agent):
+        """ Activates an agent, and starts its coroutine if its C{live} method returns one. The duration of the activation is recorded if the kernel has metrics.
+        @param agent: The agent.
+        @type agent: C{L{Agent}}
+        """
+        metrics = self.kernel.metrics
+        if metrics != None:
+            start = time.time()
+        result = agent.live()
+        if type(result) is types.GeneratorType:
+            task = Task(agent, result)
+            self.__tasks[agent] = task
+            self.__resume(task, None)
+        elif metrics != None:
+            metrics.recordLive(agent, time.time() - start)
+    
+    def __resume(self, task, value):
+        """ Resumes a coroutine until it yields an awaitable which is not done yet, or until its end. The duration of the resumption is recorded if the kernel has metrics.
+        @param task: The coroutine.
+        @type task: C{L{Task}}
+        @param value: Value sent to the coroutine.
+        """
+        agent = task.agent
+        if agent.kernel == None or self.kernel == None:
+            self.__finish(task)
+            return
+        task.token = task.token + 1
+        task.waiting = None
+        metrics = self.kernel.metrics
+        if metrics != None:
+            start = time.time()
+        try:
+            try:
+                self.__run(task, value)
+            except:
+                self.__finish(task)
+                raise
+        finally:
+            if metrics != None:
+                metrics.recordLive(agent, time.time() - start)
+    
+    def __run(self, task, value):
+        """ Runs a coroutine until it yields an awaitable which is not done yet, or until its end.
+        @param task: The coroutine.
+        @type task: C{L{Task}}
+        @param value: Value sent to the coroutine.
+        @raise TypeError: if the coroutine yields something which is not an awaitable.
+        """
+        stack = task.stack
+        while True:
+            try:
+                awaited = stack[-1].send(value)
+            except StopIteration:
+                stack.pop()
+                if not stack:
+                    self.__finish(task)
+                    return
+                value = None
+                continue
+            kind = type(awaited)
+            if awaited == None:
+                self.__runnable.append(task)
+                return
+            elif kind is types.GeneratorType:
+                stack.append(awaited)
+                value = None
+            elif kind is Receive:
+                value = task.agent.getNextMessage()
+                if value == None:
+                    task.waiting = awaited
+                    if awaited.timeout != None:
+                        self.__setTimer(task, awaited.timeout)
+                    return
+            elif kind is Sleep:
+                task.waiting = awaited
+                self.__setTimer(task, awaited.delay)
+                return
+            elif kind is Readable:
+                descriptor = awaited.descriptor
+                if descriptor in self.__files:
+                    raise ValueError("A coroutine is already waiting for this file: %s" %awaited.file)
+                task.waiting = awaited
+                self.__files[descriptor] = task
+                if awaited.timeout != None:
+                    self.__setTimer(task, awaited.timeout)
+                return
+            else:
+                raise TypeError("Not an awaitable: %r" %(awaited,))
+    
+    def __setTimer(self, task, delay):
+        """ Sets the timeout of the awaitable a coroutine is waiting for.
+        @param task: The coroutine.
+        @type task: C{L{Task}}
+        @param delay: Duration before the timeout (in seconds).
+        @type delay: C{float}
+        """
+        heapq.heappush(self.__timers, (time.time() + delay, task, task.token))
+    
+    def __expire(self, task):
+        """ Resumes a coroutine which awaitable has expired.
+        @param task: The coroutine.
+        @type task: C{L{Task}}
+        """
+        waiting = task.waiting
+        if type(waiting) is Readable:
+            self.__files.pop(waiting.descriptor, None)
+            self.__resume(task, False)
+        else:
+            self.__resume(task, None)
+    
+    def __finish(self, task):
+        """ Closes a coroutine and forgets it. If its agent still has messages, it is woken up to be activated again.
+        @param task: The coroutine.
+        @type task: C{L{Task}}
+        """
+        task.token = task.token + 1
+        if type(task.waiting) is Readable:
+            self.__files.pop(task.waiting.descriptor, None)
+        task.waiting = None
+        while task.stack:
+            task.stack.pop().close()
+        agent = task.agent
+        if self.__tasks.get(agent) is task:
+            del self.__tasks[agent]
+            if agent.kernel != None and agent.hasMessage():
+                agent.wake()
+
+class AsyncActionAgent(ActionAgent):
+    """ Subclass of C{L{ActionAgent}} to be run by an C{L{AsyncScheduler}}, which handlers may be coroutines. A coroutine handler is run until its end before the next message is processed. It can wait for any awaitable, but the messages it receives with C{L{Receive}} are not processed by the handlers. """
+    def live(self):
+        """ Coroutine which processes all the incoming messages. """
+        message = self.getNextMessage()
+        while message != None:
+            result = self.processActionMessage(message)
+            if type(result) is types.GeneratorType:
+                yield result
+            if self.recycleMessages:
+                message.release()
+            message = self.getNextMessage()
@@ -0,0 +1,118 @@
+"""
+@author: Damien Boucard
+@version: 0.3
+"""
+class IndexedSet(object):
+    """ It is a set which keeps the insertion order of its items. Adding, removing and testing an item cost a constant time.
+    
+    A removed item leaves a hole in the ordered list of items. The list is compacted when holes fill half of it. Compacting builds a new list, so an iteration which is running meanwhile goes on with the old one.
+    @ivar __items: The items in insertion order, with holes (C{L{HOLE}}) left by removed items.
+    @type __items: C{list}
+    @ivar __index: Position of each item in C{__items}.
+    @type __index: C{dict<any, int>}
+    @ivar __holes: Number of holes in C{__items}.
+    @type __holes: C{int}
+    """
+    __slots__ = ("__items", "__index", "__holes")
+    
+    def __init__(self, items=()):
+        """ Indexed set constructor.
+        @param items: Initial items.
+        @type items: iterable
+        """
+        self.__items = list(items)
+        self.__index = dict(zip(self.__items, xrange(len(self.__items))))
+        self.__holes = 0
+        if len(self.__index) < len(self.__items):
+            # Duplicate items: the first occurrence is kept
+            items = self.__items
+            self.__items = []
+            self.__index = {}
+            self.update(items)
+        
+    def add(self, item):
+        """ Adds an item at the end of the set, if not already in.
+        @param item: The item to add.
+        @type item: hashable
+        @return: C{True} if the item has been added, C{False} if it was already in.
+        @rtype: C{bool}
+        """
+        if item in self.__index:
+            return False
+        self.__index[item] = len(self.__items)
+        self.__items.append(item)
+        return True
+        
+    def update(self, items):
+        """ Adds several items at the end of the set, in the given order, except those already in.
+        @param items: The items to add.
+        @type items: iterable
+        """
+        index, entries = self.__index, self.__items
+        for item in items:
+            if item not in index:
+                index[item] = len(entries)
+                entries.append(item)
+        
+    def discard(self, item):
+        """ Removes an item from the set, if in.
+        @param item: The item to remove.
+        @type item: hashable
+        @return: C{True} if the item has been removed, C{False} if it was not in.
+        @rtype: C{bool}
+        """
+        position = self.__index.pop(item, None)
+        if position == None:
+            return False
+        self.__items[position] = HOLE
+        self.__holes = self.__holes + 1
+        if self.__holes > 8 and self.__holes * 2 > len(self.__items):
+            self.__compact()
+        return True
+        
+    def clear(self):
+        """ Removes all the items. """
+        self.__items = []
+        self.__index = {}
+        self.__holes = 0
+        
+    def __compact(self):
+        """ Removes the holes, by replacing the list of items. """
+        items = [item for item in self.__items if item is not HOLE]
+        index = {}
+        for position in xrange(len(items)):
+            index[items[position]] = position
+        self.__items = items
+        self.__index = index
+        self.__holes = 0
+        
+    def __contains__(self, item):
+        return item in self.__index
+        
+    def __len__(self):
+        return len(self.__index)
+        
+    def __iter__(self):
+        for item in self.__items:
+            if item is not HOLE:
+                yield item
+                
+    def toTuple(self):
+        """ Gets the items of the set.
+        @return: The items in insertion order.
+        @rtype: C{tuple}
+        """
+        if self.__holes:
+            return tuple([item for item in self.__items if item is not HOLE])
+        return tuple(self.__items)
+        
+    def __repr__(self):
+        return "IndexedSet(%r)" %(list(self),)
+
+class _Hole(object):
+    """ Class of the C{L{HOLE}} marker. """
+    def __repr__(self):
+        return "HOLE"
+
+HOLE = _Hole()
+""" Marker of the place of a removed item in an C{L{IndexedSet}}. """
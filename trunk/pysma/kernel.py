@@ -3,43 +3,109 @@
 @version: 0.3
 """
 from whitePages import WhitePages
-from message import Message
+from message import Message, MessageView, Topic
+from messageBox import MessageBoxFullError
+from indexedSet import IndexedSet
+from roleView import RoleView
+import gc, thread, threading
 
 class Kernel(object):
     """ The core of the multi-agent system.
     @cvar instance: The last created instance, for a global access (by all agents).
     @type instance: C{L{Kernel}}
+    @cvar TOPICS: Group whose roles are the topics of the published messages (see C{L{publish}}). An agent subscribed to a topic has the role named by the topic in this group.
+    @type TOPICS: C{str}
     @cvar __agentCounter: Used for affect a new agent IDs. In each agent creation, it increments.
     @type __agentCounter: C{int}
     @ivar __wPages: Agent white pages for this kernel.
     @type __wPages: C{L{WhitePages}}
-    @ivar __agents: Collection of agents in this kernel.
-    @type __agents: C{list<L{Agent}>}
-    @ivar __groups: Collection of groups and roles to access to agent IDs in this kernel. Dictionnary of groups (type C{str}) which point to a dictionnary of roles (type C{str}) which point to a list of agent ids (type C{int}).
-    @type __groups: C{dict<str, dict<str, list<int>>>}
-    @ivar __roles: Collection of agent IDs to access to groups and roles in this kernel. Dictionnary of agent IDs (type C{int}) which point to a list of couples (type C{tuple}) which contain a group (type C{str}) and a role (type C{str}).
-    @type __roles: C{dict<int, list<(str, str)>>}
-    @group Agent Management: addAgent, removeAgent, getAgent, getAgentId, getAgentNb
-    @group Message Management: sendMessage, sendBroadcastMessage
-    @group Organization Management: requestRole, leaveRole, leaveAllRoles, getGroupsOf, getGroups, getRoles, getRolesOf, getAgentsIn, getAgentsWith
+    @ivar __table: Table of the agents indexed by their local ID, shared with the white pages, used to route the messages.
+    @type __table: C{list<L{Agent}>}
+    @ivar __stride: Step between the IDs allocated by the kernel: the local ID of an agent is its ID divided by the stride.
+    @type __stride: C{int}
+    @ivar __offset: Remainder of the IDs allocated by the kernel by C{__stride}.
+    @type __offset: C{int}
+    @ivar __agentNb: Number of agents living in this kernel. The agents themselves are found in C{__table}, in launching order.
+    @type __agentNb: C{int}
+    @ivar __groups: Collection of groups and roles to access to agent IDs in this kernel. Dictionnary of groups (type C{str}) which point to a dictionnary of roles (type C{str}) which point to an ordered set of agent ids (type C{int}).
+    @type __groups: C{dict<str, dict<str, L{IndexedSet}<int>>>}
+    @ivar __roles: Collection of agent IDs to access to groups and roles in this kernel. Dictionnary of agent IDs (type C{int}) which point to a tuple of couples (type C{tuple}) which contain a group (type C{str}) and a role (type C{str}), in joining order. An agent has few roles: the tuples are replaced at each change rather than changed, so the agents launched together share the same tuple as long as they only have the common role.
+    @type __roles: C{dict<int, tuple<(str, str)>>}
+    @ivar __held: Messages held by thread. Dictionnary of thread identifiers (type C{int}) which point to a list of couples (type C{tuple}) which contain a broadcast flag (type C{bool}) and a message (type C{L{Message}}).
+    @type __held: C{dict<int, list<(bool, L{Message})>>}
+    @ivar __lock: Lock which protects the agent collection and the organization when they are changed from several threads.
+    @type __lock: C{threading.RLock}
+    @ivar __snapshots: Immutable copies of the role member lists, used to read the organization without locking. A copy is made at the first read after a change of the role. Dictionnary of couples (type C{tuple}) which contain a group (type C{str}) and a role (type C{str}), which point to a tuple of agent ids (type C{int}).
+    @type __snapshots: C{dict<(str, str), tuple<int>>}
+    @ivar __views: Live views of the roles, created at the first request and updated at each change of their role. They are also used to deliver broadcast messages without looking up the agent IDs. Dictionnary of couples (type C{tuple}) which contain a group (type C{str}) and a role (type C{str}), which point to a view.
+    @type __views: C{dict<(str, str), L{RoleView}>}
+    @ivar __ready: IDs of the agents which have been added, have received a message or have been woken up since their last reactive activation, in waking order. C{None} while readiness is not tracked.
+    @type __ready: C{L{IndexedSet}<int>}
+    @ivar __activated: Roles activated by the reactive activators, as couples which contain a group and a role: only the agents having one of these roles get ready. Copied on write.
+    @type __activated: C{frozenset<(str, str)>}
+    @ivar __readyLock: Lock which protects C{__ready} and C{__activated}.
+    @type __readyLock: C{thread.LockType}
+    @ivar __changed: IDs of the agents which have received a message, have changed roles or have been touched since the last C{L{takeChanged}}. C{None} while changes are not tracked.
+    @type __changed: C{set<int>}
+    @ivar __changedLock: Lock which protects C{__changed}.
+    @type __changedLock: C{thread.LockType}
+    @ivar readyListeners: Functions without argument called each time an agent gets ready, e.g. to wake up a waiting event loop. They can be called from any thread.
+    @type readyListeners: C{list<callable>}
+    @ivar metrics: Instrumentation of the kernel (if C{None}, nothing is measured).
+    @type metrics: C{L{Metrics}}
+    @ivar tracer: Trace recorder of the kernel (if C{None}, nothing is recorded, see C{L{trace}}).
+    @type tracer: C{L{Tracer}}
+    @ivar shareBroadcasts: Broadcast sharing flag (C{False} by default). If C{False}, each receiver of a broadcast message gets its own C{L{MessageView}} of it, with its ID as C{receiver}. If C{True}, the message is delivered as is to all its receivers, which saves a view per receiver, but they must not change it, and its C{receiver} remains the role couple (or the list of role couples, or the topic).
+    @type shareBroadcasts: C{bool}
+    @group Agent Management: addAgent, addAgents, removeAgent, removeAgents, newAgentId, getAgent, getAgentId, getAgentNb, getAgents, getAgentsNamed, getChildren
+    @group State Management: exportState, importState, trackChanges, touch, takeChanged
+    @group Message Management: sendMessage, sendNamedMessage, sendBroadcastMessage, sendMulticastMessage, publish, holdMessages, releaseMessages, deliverMessages
+    @group Activation Management: trackReadiness, wake, takeReady
+    @group Organization Management: requestRole, leaveRole, leaveAllRoles, getGroupsOf, getGroups, getRoles, getRolesOf, getAgentsIn, getAgentsWith, getRoleView, subscribe, unsubscribe, getSubscribers
     """
     instance = None
+    TOPICS = "__topics__"
     __agentCounter = 0
     
-    def __init__(self):
-        """ Kernel constructor. """
+    def __init__(self, stride=1, offset=0):
+        """ Kernel constructor.
+        @param stride: Step between the IDs allocated by the kernel, when it allocates strided IDs (see C{L{ShardKernel}}).
+        @type stride: C{int}
+        @param offset: Remainder of the IDs allocated by the kernel by C{stride}.
+        @type offset: C{int}
+        """
         Kernel.instance = self
         Kernel.__agentCounter = 0
-        self.__wPages = WhitePages()
-        self.__agents = []
+        self.__wPages = WhitePages(stride, offset)
+        self.__table = self.__wPages.agents
+        self.__stride = stride
+        self.__offset = offset
+        self.__agentNb = 0
         self.__groups = {}
         self.__roles = {}
+        self.__held = {}
+        self.__lock = threading.RLock()
+        self.__snapshots = {}
+        self.__views = {}
+        self.shareBroadcasts = False
+        self.metrics = None
+        self.tracer = None
+        self.__ready = None
+        self.__activated = frozenset()
+        self.__readyLock = thread.allocate_lock()
+        self.__changed = None
+        self.__changedLock = thread.allocate_lock()
+        self.readyListeners = []
         
     def stopKernel(self):
         """ Shutdowns the kernel. Stops all agents living in this kernel. """
         Kernel.instance = None
-        for agt in self.__agents:
-            self.removeAgent(self.getAgentId(agt))
+        self.__lock.acquire()
+        try:
+            ids = self.__agentIds()
+        finally:
+            self.__lock.release()
+        self.removeAgents(ids)
         
     # AGENT MANAGEMENT
     def addAgent(self, agent, name="unamed", parent=None):
@@ -51,28 +117,134 @@ class Kernel(object):
         @param parent: Parent agent of the launched agent (Optional).
         @type parent: C{L{Agent}}
         """
+        self.addAgents((agent,), name, parent)
+        
+    def addAgents(self, agents, name="unamed", parent=None):
+        """ Launchs several agents in this kernel at once. They are registered in one pass, then their C{born} methods are called in order. If a C{born} method raises an error, the launching is undone: the agents already born are killed, the other ones are unregistered without calling their C{die} method, then the error is raised again.
+        @param agents: Agents to launch.
+        @type agents: C{list<L{Agent}>}
+        @param name: Name of the agents in the white pages (Optional).
+        @type name: C{str}
+        @param parent: Parent agent of the launched agents (Optional).
+        @type parent: C{L{Agent}}
+        @return: The IDs of the launched agents, in order.
+        @rtype: C{list<int>}
+        """
+        common = ((None, None),)
+        ids = []
+        self.__lock.acquire()
+        try:
+            register = self.__wPages.register
+            roles = self.__roles
+            # The registration only creates objects living as long as the agents: the cyclic garbage collector would only slow it down.
+            collecting = gc.isenabled()
+            gc.disable()
+            try:
+                for agent in agents:
+                    id = self.newAgentId()
+                    register(id, agent, name, parent)
+                    roles[id] = common
+                    agent.kernel = self
+                    ids.append(id)
+            finally:
+                if collecting:
+                    gc.enable()
+            self.__agentNb = self.__agentNb + len(agents)
+            members = self.__groups.get(None, {}).get(None)
+            if members == None:
+                self.__addRole(None, None, IndexedSet(ids))
+            else:
+                members.update(ids)
+            self.__roleChanged(None, None, agents)
+            if self.tracer != None:
+                self.tracer.launch(ids, agents, name, self.__wPages.getId(parent))
+        finally:
+            self.__lock.release()
+        born = 0
+        try:
+            for agent in agents:
+                agent.born()
+                born = born + 1
+        except:
+            self.removeAgents(ids[:born])
+            self.__removeAgents(ids[born:], False)
+            raise
+        if self.__ready != None:
+            for i in xrange(len(ids)):
+                if agents[i].kernel == self:
+                    self.wake(ids[i])
+        return ids
+        
+    def newAgentId(self):
+        """ Allocates the ID of a new agent. Called by C{L{addAgent}}, which holds the kernel lock. It can be overrided to allocate IDs differently (e.g. see C{L{ShardKernel}}).
+        @return: An ID never allocated before.
+        @rtype: C{int}
+        """
         id = Kernel.__agentCounter
         Kernel.__agentCounter = id + 1
-        self.__wPages.register(id, agent, name, parent)
-        self.__agents.append(agent)
-        self.__roles[id] = []
-        self.requestRole(id)
-        agent.kernel = self
-        agent.born()
+        return id
         
     def removeAgent(self, agentId):
         """ Kills an agent from this kernel.
         @param agentId: ID of the killed agent.
         @type agentId: C{int}
         """
-        agent = self.__wPages.getAgent(agentId)
-        if agent != None:
-            agent.die()
-            agent.kernel = None
-            self.__agents.remove(agent)
-        self.__wPages.unregister(agentId)
-        self.leaveAllRoles(agentId)
-        del self.__roles[agentId]
+        self.removeAgents((agentId,))
+        
+    def removeAgents(self, agentIds):
+        """ Kills several agents from this kernel at once, in order. Each role they had is updated once, after all of them are unregistered.
+        @param agentIds: IDs of the killed agents. Unknown IDs are ignored.
+        @type agentIds: C{list<int>}
+        """
+        self.__removeAgents(agentIds, True)
+        
+    def __removeAgents(self, agentIds, dying):
+        """ Unregisters several agents, in order.
+        @param agentIds: IDs of the agents. Unknown IDs are ignored.
+        @type agentIds: C{list<int>}
+        @param dying: Dying flag. If C{True}, the C{die} method of each agent is called first; C{False} for agents which have not been born.
+        @type dying: C{bool}
+        """
+        self.__lock.acquire()
+        try:
+            roles = self.__roles
+            wPages = self.__wPages
+            changed = {}
+            killed = []
+            for id in agentIds:
+                if id not in roles:
+                    continue
+                agent = wPages.getAgent(id)
+                if agent != None:
+                    if dying:
+                        agent.die()
+                        if id not in roles:
+                            # Killed by itself
+                            continue
+                    agent.kernel = None
+                    self.__agentNb = self.__agentNb - 1
+                wPages.unregister(id)
+                killed.append(id)
+                for couple in roles.pop(id):
+                    entry = changed.get(couple)
+                    if entry == None:
+                        entry = changed[couple] = (self.__groups[couple[0]][couple[1]], [])
+                    entry[0].discard(id)
+                    if agent != None:
+                        entry[1].append(agent)
+            for (group, role), (members, removed) in changed.items():
+                self.__roleChanged(group, role, removed=removed)
+            if self.tracer != None and killed:
+                self.tracer.kill(killed)
+            if self.__ready != None:
+                self.__readyLock.acquire()
+                try:
+                    for id in agentIds:
+                        self.__ready.discard(id)
+                finally:
+                    self.__readyLock.release()
+        finally:
+            self.__lock.release()
         
     def getAgentId(self, agent):
         """ Gets the ID of a given agent.
@@ -97,7 +269,42 @@ class Kernel(object):
         @return: The number of agents.
         @rtype: C{int}
         """
-        return len(self.__agents)
+        return self.__agentNb
+        
+    def getAgentsNamed(self, name):
+        """ Gets the agents presently living in the kernel which have been launched with a given name.
+        @param name: Name of the agents.
+        @type name: C{str}
+        @return: Their IDs, in launching order (empty for the default name, which is not indexed).
+        @rtype: C{list<int>}
+        """
+        return list(self.__wPages.getAgentsNamed(name))
+        
+    def getChildren(self, agentId):
+        """ Gets the agents presently living in the kernel which have been launched by a given agent.
+        @param agentId: ID of the parent agent.
+        @type agentId: C{int}
+        @return: Their IDs, in launching order.
+        @rtype: C{list<int>}
+        """
+        return self.__wPages.getChildren(agentId)
+        
+    def getAgents(self):
+        """ Gets the agents presently living in the kernel.
+        @return: A collection of agents, in launching order.
+        @rtype: C{list<L{Agent}>}
+        """
+        return [agent for agent in self.__table if agent != None]
+    
+    def __agentIds(self):
+        """ Gets the IDs of the agents presently living in the kernel.
+        @return: The IDs, in launching order.
+        @rtype: C{list<int>}
+        """
+        table = self.__table
+        stride = self.__stride
+        offset = self.__offset
+        return [index * stride + offset for index in xrange(len(table)) if table[index] != None]
         
     # MESSAGE MANAGEMENT
     def sendMessage(self, message):
@@ -105,26 +312,342 @@ class Kernel(object):
         @param message: Message to send.
         @type message: C{L{Message}}
         """
-        agent = self.__wPages.getAgent(message.receiver)
-        if agent != None:
-            agent.receiveMessage(message)
+        if self.__held:
+            held = self.__held.get(thread.get_ident())
+            if held != None:
+                held.append((False, message))
+                return
+        if self.metrics != None:
+            self.metrics.sent = self.metrics.sent + 1
+        if self.tracer != None:
+            self.tracer.send(message)
+        receiver = message.receiver
+        index = receiver
+        if self.__stride != 1:
+            index, rest = divmod(receiver, self.__stride)
+            if rest != self.__offset:
+                index = -1
+        if 0 <= index < len(self.__table):
+            agent = self.__table[index]
+            if agent != None:
+                agent.receiveMessage(message)
+                if self.__ready != None:
+                    self.wake(receiver)
+                if self.__changed != None:
+                    self.touch(receiver)
             
-    def sendBroadcastMessage(self, message):
-        """ Sends a message from an agent to all the agents of a role.
+    def sendNamedMessage(self, message, name):
+        """ Sends a message from an agent to the agents launched with a given name, found through the name index of the white pages. If several agents have this name, each one gets its own copy, with its ID as C{receiver}.
         @param message: Message to send.
         @type message: C{L{Message}}
+        @param name: Name of the receivers.
+        @type name: C{str}
+        @return: The number of receivers.
+        @rtype: C{int}
         """
-        group, role = message.receiver
-        if group in self.__groups and role in self.__groups[group]:
-            for id in self.__groups[group][role]:
-                agent = self.__wPages.getAgent(id)
+        ids = self.__wPages.getAgentsNamed(name)
+        if len(ids) == 1:
+            message.receiver = ids[0]
+            self.sendMessage(message)
+        else:
+            for id in ids:
                 msg = message.__copy__()
                 msg.receiver = id
-                agent.receiveMessage(msg)
+                self.sendMessage(msg)
+        return len(ids)
+        
+    def publish(self, message, topic=None):
+        """ Sends a message from an agent to the agents subscribed to a topic (see C{L{subscribe}}). It is delivered like a broadcast message, with a C{L{Topic}} as C{receiver}.
+        @param message: Message to publish.
+        @type message: C{L{Message}}
+        @param topic: Topic of the message (if C{None}, the message goes to the subscribers of its class or of one of its base classes, and of its action name if it has one; each one receives it once).
+        @type topic: any hashable
+        @return: The number of subscribers which have rejected the message (see C{L{sendBroadcastMessage}}).
+        @rtype: C{int}
+        """
+        message.receiver = Topic(topic)
+        return self.sendBroadcastMessage(message)
+        
+    def sendBroadcastMessage(self, message):
+        """ Sends a message from an agent to all the agents of a role, or of several roles.
+        
+        The receiver of the message is a couple which contains a group and a role, or a list of such couples. In the latter case, an agent having several of these roles receives the message once. It can also be a C{L{Topic}}, for a published message.
+        
+        Each receiver gets its own C{L{MessageView}} of the message, with its ID as C{receiver}, which shares the message instead of copying it, unless C{L{shareBroadcasts}} is C{True}: then the same message is put in the box of each receiver.
+        
+        A receiver whose message box is full with the "reject" overflow policy is skipped, so the other receivers still get the message; the number of these rejected deliveries is returned.
+        @param message: Message to send.
+        @type message: C{L{Message}}
+        @return: The number of receivers which have rejected the message (0 if the message is held, see C{L{holdMessages}}).
+        @rtype: C{int}
+        """
+        if self.__held:
+            held = self.__held.get(thread.get_ident())
+            if held != None:
+                held.append((True, message))
+                return 0
+        if self.tracer != None:
+            self.tracer.broadcast(message)
+        receiver = message.receiver
+        if isinstance(receiver, Topic):
+            audience = self.__subscribers(receiver.topic, message)
+        elif isinstance(receiver, list):
+            audience = IndexedSet()
+            for group, role in receiver:
+                audience.update(self.__audience(group, role))
+                if self.metrics != None:
+                    self.metrics.countBroadcast(group, role)
+        else:
+            audience = self.__audience(receiver[0], receiver[1])
+            if self.metrics != None:
+                self.metrics.countBroadcast(receiver[0], receiver[1])
+        rejected = 0
+        getId = self.__wPages.getId
+        if self.shareBroadcasts:
+            ids = None
+            for agent in audience:
+                try:
+                    agent.receiveMessage(message)
+                except MessageBoxFullError:
+                    rejected = rejected + 1
+        else:
+            ids = []
+            for agent in audience:
+                id = getId(agent)
+                ids.append(id)
+                try:
+                    agent.receiveMessage(MessageView(message, id))
+                except MessageBoxFullError:
+                    rejected = rejected + 1
+        if self.__ready != None or self.__changed != None:
+            if ids == None:
+                ids = [getId(agent) for agent in audience]
+            if self.__ready != None:
+                for id in ids:
+                    self.wake(id)
+            if self.__changed != None:
+                for id in ids:
+                    self.touch(id)
+        return rejected
+                
+    def sendMulticastMessage(self, message, roles):
+        """ Sends a message from an agent to all the agents of several roles. Each agent receives the message once.
+        @param message: Message to send.
+        @type message: C{L{Message}}
+        @param roles: Couples which contain a group (type C{str}) and a role (type C{str}).
+        @type roles: C{list<(str, str)>}
+        @return: The number of receivers which have rejected the message (see C{L{sendBroadcastMessage}}).
+        @rtype: C{int}
+        """
+        message.receiver = list(roles)
+        return self.sendBroadcastMessage(message)
+    
+    def holdMessages(self):
+        """ Holds all the messages sent from the calling thread, instead of delivering them, until C{L{releaseMessages}} is called on the same thread. """
+        self.__held[thread.get_ident()] = []
+        
+    def releaseMessages(self):
+        """ Stops holding the messages sent from the calling thread.
+        @return: The messages held since C{L{holdMessages}} was called, in sending order, to be given to C{L{deliverMessages}}.
+        @rtype: C{list<(bool, L{Message})>}
+        """
+        return self.__held.pop(thread.get_ident(), [])
+        
+    def deliverMessages(self, held):
+        """ Delivers messages which have been held.
+        @param held: Messages returned by C{L{releaseMessages}}.
+        @type held: C{list<(bool, L{Message})>}
+        """
+        for broadcast, message in held:
+            if broadcast:
+                self.sendBroadcastMessage(message)
+            else:
+                self.sendMessage(message)
+        
+    # STATE MANAGEMENT
+    def exportState(self):
+        """ Exports the state of the kernel: its agents, their names, parents and roles, and the ID counter. The messages being held, the readiness and the metrics are not exported. The agents are not copied. Used to save checkpoints (see C{L{checkpoint}}).
+        @return: Dictionnary which contains:
+            - "nextId": the ID of the next launched agent.
+            - "agents": the agents in launching order, as quadruples which contain an ID, an agent, its name and the ID of its parent (C{None} if it has none).
+            - "groups": the members of the roles, as a dictionnary of groups which point to a dictionnary of roles which point to a tuple of agent IDs.
+            - "roles": the roles of the agents, as a dictionnary of agent IDs which point to a tuple of couples which contain a group and a role.
+            - "shareBroadcasts": the broadcast sharing flag.
+        @rtype: C{dict<str, any>}
+        """
+        self.__lock.acquire()
+        try:
+            wPages = self.__wPages
+            agents = []
+            for id in self.__agentIds():
+                agent = wPages.getAgent(id)
+                parent = wPages.getParent(id)
+                if parent != None:
+                    parent = wPages.getId(parent)
+                agents.append((id, agent, wPages.getName(id), parent))
+            groups = {}
+            for group, roles in self.__groups.items():
+                groups[group] = dict([(role, members.toTuple()) for role, members in roles.items()])
+            roles = self.__roles.copy()
+            return {"nextId": Kernel.__agentCounter, "agents": agents, "groups": groups, "roles": roles, "shareBroadcasts": self.shareBroadcasts}
+        finally:
+            self.__lock.release()
+            
+    def importState(self, state):
+        """ Imports a state exported by C{L{exportState}} into this kernel, which must not have agents yet. The agents are registered in bulk: their C{born} method is not called, but their C{restored} method is called once all the agents are registered.
+        @param state: The state.
+        @type state: C{dict<str, any>}
+        @raise ValueError: if the kernel already has agents.
+        """
+        self.__lock.acquire()
+        try:
+            if self.__agentNb:
+                raise ValueError("Cannot import a state into a kernel which has agents")
+            Kernel.instance = self
+            Kernel.__agentCounter = state["nextId"]
+            agents = {}
+            for id, agent, name, parent in state["agents"]:
+                agents[id] = agent
+            for id, agent, name, parent in state["agents"]:
+                self.__wPages.register(id, agent, name, agents.get(parent))
+                agent.kernel = self
+            self.__agentNb = len(state["agents"])
+            groups = {}
+            for group, roles in state["groups"].items():
+                groups[group] = dict([(role, IndexedSet(members)) for role, members in roles.items()])
+            self.__groups = groups
+            self.__roles = dict([(id, tuple(couples)) for id, couples in state["roles"].items()])
+            self.__snapshots = {}
+            for (group, role), view in self.__views.items():
+                view.reset([agents[id] for id in groups.get(group, {}).get(role, ())])
+            self.shareBroadcasts = state["shareBroadcasts"]
+        finally:
+            self.__lock.release()
+        for id, agent, name, parent in state["agents"]:
+            agent.restored()
+            
+    def trackChanges(self):
+        """ Starts tracking the agents which change: the agents which receive messages or change roles, and the ones touched by C{L{touch}}. Called by the C{L{Checkpointer}}, to only save these agents again. """
+        self.__changedLock.acquire()
+        try:
+            if self.__changed == None:
+                self.__changed = set()
+        finally:
+            self.__changedLock.release()
+        
+    def touch(self, agentId):
+        """ Marks an agent as changed, so an incremental checkpoint will save it again. Done by the kernel when the agent receives a message or changes roles; an agent which changes its state otherwise must be touched. Ignored while changes are not tracked.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        """
+        if self.__changed == None:
+            return
+        self.__changedLock.acquire()
+        try:
+            self.__changed.add(agentId)
+        finally:
+            self.__changedLock.release()
+        
+    def takeChanged(self):
+        """ Takes the agents which have changed since the last call: they are not changed anymore.
+        @return: Their IDs, or C{None} if changes are not tracked (see C{L{trackChanges}}).
+        @rtype: C{set<int>}
+        """
+        self.__changedLock.acquire()
+        try:
+            changed = self.__changed
+            if changed != None:
+                self.__changed = set()
+            return changed
+        finally:
+            self.__changedLock.release()
+            
+    # ACTIVATION MANAGEMENT
+    def trackReadiness(self):
+        """ Starts tracking the agents which are ready to be activated by a reactive activator: the agents which have been added, have received messages or have been woken up. All the agents already launched are ready. Called by the reactive activators.
+        """
+        if self.__ready != None:
+            return
+        self.__lock.acquire()
+        try:
+            self.__ready = IndexedSet(self.__agentIds())
+        finally:
+            self.__lock.release()
+        
+    def wake(self, agentId):
+        """ Marks an agent as ready, so a reactive activator will activate it even without incoming message. Starts tracking readiness if not already done. The agents which have no role activated by a reactive activator are ignored: they get ready when they join such a role.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        """
+        if self.__ready == None:
+            self.trackReadiness()
+        if self.__activated and not self.__isActivated(agentId):
+            return
+        self.__readyLock.acquire()
+        try:
+            self.__ready.add(agentId)
+        finally:
+            self.__readyLock.release()
+        for listener in self.readyListeners:
+            listener()
+            
+    def takeReady(self, role=None, group=None):
+        """ Takes the ready agents having a given role: they are not ready anymore. The ready agents without this role stay ready if they have another role activated by a reactive activator, and are dropped otherwise. The first call for a role activates it: all its members get ready.
+        @param role: Role of the agents (if C{group} and C{role} equal C{None}, the common role is used).
+        @type role: C{str}
+        @param group: Group of the concerned role (if C{None}, the common group is used).
+        @type group: C{str}
+        @return: The agents, in waking order.
+        @rtype: C{list<L{Agent}>}
+        """
+        if self.__ready == None:
+            self.trackReadiness()
+        agents = []
+        members = self.__groups.get(group, {}).get(role)
+        if members == None:
+            return agents
+        self.__readyLock.acquire()
+        try:
+            ready = self.__ready
+            if (group, role) not in self.__activated:
+                self.__activated = self.__activated.union(((group, role),))
+                ready.update(members)
+            if len(ready) == 0:
+                return agents
+            taken = []
+            dropped = []
+            for id in ready:
+                if id in members:
+                    taken.append(id)
+                elif not self.__isActivated(id):
+                    dropped.append(id)
+            for id in taken:
+                ready.discard(id)
+            for id in dropped:
+                ready.discard(id)
+        finally:
+            self.__readyLock.release()
+        for id in taken:
+            agent = self.__wPages.getAgent(id)
+            if agent != None:
+                agents.append(agent)
+        return agents
+        
+    def __isActivated(self, agentId):
+        """ Verifies if an agent has a role activated by a reactive activator.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        @rtype: C{bool}
+        """
+        activated = self.__activated
+        for couple in self.__roles.get(agentId, ()):
+            if couple in activated:
+                return True
+        return False
         
     # ORGANIZATION MANAGEMENT
     def requestRole(self, agentId, role=None, group=None):
-        """ Adds an agent into a role. Creates the role and/or the group if not already existing.
+        """ Adds an agent into a role. Creates the role and/or the group if not already existing. Nothing is done (the view of the role is not changed, nothing is traced) if the agent already has the role.
         @note: All agents are automatically added into the common role at launching.
         @param agentId: ID of the agent to add.
         @type agentId: C{int}
@@ -133,15 +656,46 @@ class Kernel(object):
         @param group: Group in which the role belongs to (if C{None}, the common group is used.
         @type group: C{str}
         """
-        if group in self.__groups:
-            if role in self.__groups[group]:
-                self.__groups[group][role].append(agentId)
+        self.__lock.acquire()
+        try:
+            couples = self.__roles[agentId]
+            if (group, role) in couples:
+                return
+            members = self.__groups.get(group, {}).get(role)
+            if members == None:
+                self.__addRole(group, role, IndexedSet((agentId,)))
             else:
-                self.__groups[group][role] = [agentId,]
-        else:
-            self.__groups[group] = {role: [agentId,]}
-        self.__roles[agentId].append((group, role))
+                members.add(agentId)
+            self.__roles[agentId] = couples + ((group, role),)
+            self.__roleChanged(group, role, (self.__wPages.getAgent(agentId),))
+            if self.tracer != None:
+                self.tracer.join(agentId, role, group)
+            if self.__changed != None:
+                self.touch(agentId)
+        finally:
+            self.__lock.release()
+        if self.__ready != None and (group, role) in self.__activated:
+            self.wake(agentId)
     
+    def __addRole(self, group, role, members):
+        """ Creates a role, and its group if not already existing. The dictionnaries are copied on write, for the readers iterating without locking. Called with the kernel lock.
+        @param group: Group in which the role belongs to.
+        @type group: C{str}
+        @param role: The created role.
+        @type role: C{str}
+        @param members: The first members of the role.
+        @type members: C{L{IndexedSet}<int>}
+        """
+        roles = self.__groups.get(group)
+        if roles == None:
+            groups = self.__groups.copy()
+            groups[group] = {role: members}
+            self.__groups = groups
+        else:
+            roles = roles.copy()
+            roles[role] = members
+            self.__groups[group] = roles
+            
     def leaveRole(self, agentId, role=None, group=None):
         """ Removes an agent from a role.
         @note: All agents are automatically added into the common role at launching.
@@ -152,19 +706,41 @@ class Kernel(object):
         @param group: Group in which the role belongs to (if C{None}, the common group is used.
         @type group: C{str}
         """
-        if group in self.__groups:
-            if role in self.__groups[group]:
-                self.__groups[group][role].remove(agentId)
-        self.__roles[agentId].remove((group, role))
+        self.__lock.acquire()
+        try:
+            if group in self.__groups:
+                if role in self.__groups[group]:
+                    self.__groups[group][role].discard(agentId)
+            couples = self.__roles[agentId]
+            if (group, role) not in couples:
+                raise ValueError("Agent #%s has not the role %s in the group %s" %(agentId, role, group))
+            self.__roles[agentId] = tuple([couple for couple in couples if couple != (group, role)])
+            self.__roleChanged(group, role, removed=(self.__wPages.getAgent(agentId),))
+            if self.tracer != None:
+                self.tracer.leave(agentId, role, group)
+            if self.__changed != None:
+                self.touch(agentId)
+        finally:
+            self.__lock.release()
 
     def leaveAllRoles(self, agentId):
         """ Removes an agent from all roles of all groups. It includes the common role.
         @param agentId: ID of the agent to remove.
         @type agentId: C{int}
         """
-        for group, role in self.__roles[agentId]:
-            self.__groups[group][role].remove(agentId)
-        self.__roles[agentId] = []
+        self.__lock.acquire()
+        try:
+            agent = self.__wPages.getAgent(agentId)
+            for group, role in self.__roles[agentId]:
+                self.__groups[group][role].discard(agentId)
+                self.__roleChanged(group, role, removed=(agent,))
+                if self.tracer != None:
+                    self.tracer.leave(agentId, role, group)
+            self.__roles[agentId] = ()
+            if self.__changed != None:
+                self.touch(agentId)
+        finally:
+            self.__lock.release()
         
     def getGroupsOf(self, agentId):
         """ Gets all the groups in which the given agent has a role.
@@ -204,7 +780,10 @@ class Kernel(object):
         @rtype: C{list<str>}
         """
         roles = []
-        for grp, rol in self.__roles.get(agentId, ()):
+        couples = self.__roles.get(agentId)
+        if couples == None:
+            return roles
+        for grp, rol in couples:
             if grp == group:
                 roles.append(rol)
         return roles
@@ -217,9 +796,8 @@ class Kernel(object):
         @rtype: C{list<int>}
         """
         agents = []
-        roles = self.__groups.get(group, {})
-        for role in roles:
-            agents.extend(roles[role])
+        for role in self.__groups.get(group, {}).keys():
+            agents.extend(self.__members(group, role))
         return agents
         
     def getAgentsWith(self, role=None, group=None):
@@ -231,4 +809,135 @@ class Kernel(object):
         @return: A collection of agent IDs.
         @rtype: C{list<int>}
         """
-        return self.__groups.get(group, {}).get(role, ())[:]
\ No newline at end of file
+        return list(self.__members(group, role))
+        
+    def __members(self, group, role):
+        """ Gets an immutable copy of the members of a role, which can be read without locking.
+        @param group: Group of the concerned role.
+        @type group: C{str}
+        @param role: The concerned role.
+        @type role: C{str}
+        @return: A collection of agent IDs.
+        @rtype: C{tuple<int>}
+        """
+        snapshot = self.__snapshots.get((group, role))
+        if snapshot == None:
+            self.__lock.acquire()
+            try:
+                members = self.__groups.get(group, {}).get(role)
+                if members == None:
+                    snapshot = ()
+                else:
+                    snapshot = members.toTuple()
+                self.__snapshots[(group, role)] = snapshot
+            finally:
+                self.__lock.release()
+        return snapshot
+        
+    def getRoleView(self, role=None, group=None):
+        """ Gets the live view of a role, which gives its agents without looking up their IDs. The view is created at the first request, even if the role does not exist yet, then kept up to date by the kernel: the same view is returned each time.
+        @param role: The concerned role (if C{group} and C{role} equal C{None}, the common role is used).
+        @type role: C{str}
+        @param group: Group of the concerned role (if C{None}, the common group is used).
+        @type group: C{str}
+        @return: The view of the role.
+        @rtype: C{L{RoleView}}
+        """
+        view = self.__views.get((group, role))
+        if view == None:
+            self.__lock.acquire()
+            try:
+                view = self.__views.get((group, role))
+                if view == None:
+                    agents = []
+                    for id in self.__groups.get(group, {}).get(role, ()):
+                        agent = self.__wPages.getAgent(id)
+                        if agent != None:
+                            agents.append(agent)
+                    view = RoleView(group, role, agents, self.__lock)
+                    self.__views[(group, role)] = view
+            finally:
+                self.__lock.release()
+        return view
+        
+    def subscribe(self, agentId, topic):
+        """ Subscribes an agent to a topic: it will receive the messages published on it. The agent gets the role named by the topic in the C{L{TOPICS}} group.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        @param topic: The topic: any hashable, e.g. an action name or a message class (then the agent receives the messages of this class and of its subclasses).
+        @type topic: any hashable
+        """
+        self.requestRole(agentId, topic, self.TOPICS)
+        
+    def unsubscribe(self, agentId, topic):
+        """ Unsubscribes an agent from a topic.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        @param topic: The topic.
+        @type topic: any hashable
+        @raise ValueError: if the agent is not subscribed to the topic.
+        """
+        self.leaveRole(agentId, topic, self.TOPICS)
+        
+    def getSubscribers(self, topic):
+        """ Gets the agents subscribed to a topic.
+        @param topic: The topic.
+        @type topic: any hashable
+        @return: A collection of agent IDs.
+        @rtype: C{list<int>}
+        """
+        return self.getAgentsWith(topic, self.TOPICS)
+        
+    def __subscribers(self, topic, message):
+        """ Gets the agents which receive a published message.
+        @param topic: Topic of the message (if C{None}, the topics are given by the message).
+        @type topic: any hashable
+        @param message: The message.
+        @type message: C{L{Message}}
+        @return: A collection of agents, each one once.
+        @rtype: iterable
+        """
+        if topic != None:
+            return self.__audience(self.TOPICS, topic)
+        topics = list(message.__class__.__mro__)
+        action = getattr(message, "action", None)
+        if action != None:
+            topics.append(action)
+        audiences = []
+        for topic in topics:
+            audience = self.__audience(self.TOPICS, topic)
+            if audience:
+                audiences.append(audience)
+        if len(audiences) == 1:
+            return audiences[0]
+        subscribers = IndexedSet()
+        for audience in audiences:
+            subscribers.update(audience)
+        return subscribers
+        
+    def __audience(self, group, role):
+        """ Gets the agents of a role, which can be read without locking.
+        @param group: Group of the concerned role.
+        @type group: C{str}
+        @param role: The concerned role.
+        @type role: C{str}
+        @return: A collection of agents.
+        @rtype: C{tuple<L{Agent}>}
+        """
+        return self.getRoleView(role, group).toTuple()
+        
+    def __roleChanged(self, group, role, added=(), removed=()):
+        """ Drops the copies of the members of a role and updates its view, after a change. Called with the lock held.
+        @param group: Group of the concerned role.
+        @type group: C{str}
+        @param role: The concerned role.
+        @type role: C{str}
+        @param added: Agents which have joined the role.
+        @type added: iterable
+        @param removed: Agents which have left the role.
+        @type removed: iterable
+        """
+        self.__snapshots.pop((group, role), None)
+        view = self.__views.get((group, role))
+        if view != None:
+            view.change(added, removed)
@@ -0,0 +1,240 @@
+"""
+@author: Damien Boucard
+@version: 0.3
+"""
+from agent import Agent
+import thread
+
+_boxLock = thread.allocate_lock()
+""" Lock taken to allocate the message box of a light agent. """
+
+_slotNames = {}
+""" Names of the slots of the light agent classes, by class. """
+
+def _getSlotNames(cls):
+    """ Gets the names of all the slots of a class, as C{getattr} expects them (the private names are mangled).
+    @param cls: The class.
+    @type cls: C{type}
+    @return: The names, from the most derived class.
+    @rtype: C{tuple<str>}
+    """
+    names = _slotNames.get(cls)
+    if names == None:
+        names = []
+        for klass in cls.__mro__:
+            slots = klass.__dict__.get("__slots__", ())
+            if isinstance(slots, str):
+                slots = (slots,)
+            for name in slots:
+                if name.startswith("__") and not name.endswith("__"):
+                    name = "_%s%s" %(klass.__name__.lstrip("_"), name)
+                if name not in ("__dict__", "__weakref__"):
+                    names.append(name)
+        names = _slotNames[cls] = tuple(names)
+    return names
+
+class LightAgent(object):
+    """ It is the class of a lightweight agent, for populations of millions of agents. It can be launched in a kernel like an C{L{Agent}}, with the same methods, but:
+        - it has slots instead of a dictionnary, so subclasses should declare C{__slots__} too;
+        - its ID is cached when it is registered in a kernel, instead of being looked up at each message sent;
+        - its message box is a list, allocated at the first incoming message, read from an offset which is moved forward by each message taken, so taking a message costs a constant time. It can be bounded for a whole class with C{L{boxBound}}, and has no counters but its C{L{depth}}: C{L{messageBox}} is C{None}.
+    
+    A light agent takes about 80 bytes, against about 2 kilobytes for an C{L{Agent}} with its message box. The state of an agent living in a C{L{Population}} is stored in the columns of the population.
+    @type kernel: C{L{Kernel}}
+    @type id: C{int}
+    @type depth: C{int}
+    @cvar boxBound: Maximum number of messages in the box of each agent of the class (if C{None}, the box is not bounded). A message which arrives in a full box is dropped ("drop newest" policy).
+    @type boxBound: C{int}
+    @ivar __kernel: The kernel where the agent lives. C{None} until born or since died.
+    @type __kernel: C{L{Kernel}}
+    @ivar __id: ID of the agent in C{__kernel}, C{None} while the agent has no kernel.
+    @type __id: C{int}
+    @ivar __box: Incoming messages, oldest first, from C{__head}. C{None} until the first message.
+    @type __box: C{list<L{Message}>}
+    @ivar __head: Index of the oldest message in C{__box}: the messages before it have been taken, and are dropped once they make half of the list.
+    @type __head: C{int}
+    @group Abstract methods: born, live, die, restored
+    @group Message methods: sendMessage, sendNamedMessage, publish, sendBroadcastMessage, sendMulticastMessage, receiveMessage, getNextMessage, drainMessages, putBackMessages, hasMessage
+    @group Organization methods: requestRole, leaveRole, subscribe, unsubscribe
+    @group Activation methods: wake
+    @group Persistence methods: touch
+    """
+    __slots__ = ("__kernel", "__id", "__box", "__head")
+    boxBound = None
+    
+    def __init__(self):
+        """ Light agent constructor. """
+        self.__kernel = None
+        self.__id = None
+        self.__box = None
+        self.__head = 0
+    
+    def __getKernel(self):
+        """ C{L{kernel}} property getter.
+        @return: The kernel.
+        @rtype: C{L{Kernel}}
+        """
+        return self.__kernel
+    
+    def __setKernel(self, kernel):
+        """ C{L{kernel}} property setter. Called by the kernel when the agent is registered or killed: the ID of the agent is cached.
+        @param kernel: The kernel.
+        @type kernel: C{L{Kernel}}
+        """
+        self.__kernel = kernel
+        if kernel == None:
+            self.__id = None
+        else:
+            self.__id = kernel.getAgentId(self)
+    kernel = property(__getKernel, __setKernel, doc="The kernel where the agents lives. C{None} until born or since died.")
+    
+    def __getId(self):
+        """ C{L{id}} property getter.
+        @return: The ID.
+        @rtype: C{int}
+        """
+        return self.__id
+    id = property(__getId, doc="The ID of the agent, C{None} while it has no kernel (Read only).")
+    
+    messageBox = None
+    """ Light agents have no C{L{MessageBox}}. """
+    
+    # The methods which only use the kernel and the ID are the ones of Agent
+    addAgent = Agent.__dict__["addAgent"]
+    born = Agent.__dict__["born"]
+    live = Agent.__dict__["live"]
+    die = Agent.__dict__["die"]
+    restored = Agent.__dict__["restored"]
+    sendMessage = Agent.__dict__["sendMessage"]
+    sendNamedMessage = Agent.__dict__["sendNamedMessage"]
+    publish = Agent.__dict__["publish"]
+    sendBroadcastMessage = Agent.__dict__["sendBroadcastMessage"]
+    sendMulticastMessage = Agent.__dict__["sendMulticastMessage"]
+    requestRole = Agent.__dict__["requestRole"]
+    leaveRole = Agent.__dict__["leaveRole"]
+    subscribe = Agent.__dict__["subscribe"]
+    unsubscribe = Agent.__dict__["unsubscribe"]
+    wake = Agent.__dict__["wake"]
+    touch = Agent.__dict__["touch"]
+    
+    # MESSAGE MANAGEMENT
+    def receiveMessage(self, message):
+        """ Receives an incoming message and puts it in the message box, allocated at the first message. The message is dropped if the box is full (see C{L{boxBound}}). Called by the kernel.
+        @param message: The incoming message.
+        @type message: C{L{Message}}
+        """
+        box = self.__box
+        if box == None:
+            box = self.__allocateBox()
+        if self.boxBound != None and len(box) - self.__head >= self.boxBound:
+            return
+        box.append(message)
+    
+    def __allocateBox(self):
+        """ Allocates the message box, unless another thread has just done it.
+        @return: The message box.
+        @rtype: C{list<L{Message}>}
+        """
+        _boxLock.acquire()
+        try:
+            box = self.__box
+            if box == None:
+                box = self.__box = []
+            return box
+        finally:
+            _boxLock.release()
+    
+    def getNextMessage(self):
+        """ Gets the oldest message of the message box.
+        @precondition: self.hasMessage()
+        @return: The message or C{None} if the box is empty.
+        @rtype: C{L{Message}}
+        """
+        box = self.__box
+        if self.__kernel == None or box == None:
+            return None
+        head = self.__head
+        if head >= len(box):
+            return None
+        message = box[head]
+        box[head] = None
+        head = head + 1
+        # Only the owner removes messages: the ones put meanwhile are after the head
+        if head * 2 >= len(box):
+            del box[:head]
+            head = 0
+        self.__head = head
+        return message
+    
+    def drainMessages(self, max_n=None):
+        """ Gets the oldest messages of the message box.
+        @param max_n: Maximum number of messages to get (if C{None}, all the messages are got).
+        @type max_n: C{int}
+        @return: The messages, oldest first.
+        @rtype: C{list<L{Message}>}
+        """
+        box = self.__box
+        if self.__kernel == None or box == None:
+            return []
+        head = self.__head
+        if max_n == None:
+            messages = box[head:]
+        else:
+            messages = box[head:head + max_n]
+        # Only the owner removes messages: the ones put meanwhile are after the slice
+        del box[:head + len(messages)]
+        self.__head = 0
+        return messages
+    
+    def putBackMessages(self, messages):
+        """ Puts messages back at the front of the message box, e.g. the ones drained by C{L{drainMessages}} but not processed.
+        @param messages: The messages, oldest first.
+        @type messages: C{list<L{Message}>}
+        """
+        if self.__kernel == None or not messages:
+            return
+        box = self.__box
+        if box == None:
+            box = self.__allocateBox()
+        box[:self.__head] = messages
+        self.__head = 0
+    
+    def hasMessage(self):
+        """ Verify if the message box is empty or not.
+        @return: C{False}, if the message box is empty. C{True}, if there are one or more messages in the box (C{L{self.getNextMessage()<getNextMessage>}} can be called).
+        @rtype: C{bool}
+        """
+        return self.__kernel != None and self.__box != None and len(self.__box) > self.__head
+    
+    def getDepth(self):
+        """ C{L{depth}} property getter.
+        @return: The number of messages waiting in the box.
+        @rtype: C{int}
+        """
+        if self.__box == None:
+            return 0
+        return len(self.__box) - self.__head
+    depth = property(getDepth, doc="Number of messages waiting in the box (Read only).")
+    
+    # PERSISTENCE
+    def __getstate__(self):
+        """ Gets the state of the agent to pickle, e.g. to save it in a checkpoint: the values of its slots, and of its dictionnary if a subclass has one.
+        @return: The values by attribute name.
+        @rtype: C{dict<str, any>}
+        """
+        state = {}
+        for name in _getSlotNames(self.__class__):
+            try:
+                state[name] = getattr(self, name)
+            except AttributeError:
+                pass
+        state.update(getattr(self, "__dict__", {}))
+        return state
+    
+    def __setstate__(self, state):
+        """ Sets the state of an unpickled agent.
+        @param state: The state returned by C{L{__getstate__}}.
+        @type state: C{dict<str, any>}
+        """
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
@@ -4,6 +4,8 @@
 """
 class Message(object):
     """ It is the class which represents messages transmitted between agents in the multi-agent system.
+    
+    Messages have slots instead of a dictionnary, so subclasses should declare C{__slots__} too.
     @ivar sender: ID of the agent who sent the message (Automatically set).
     @type sender: C{int}
     @ivar receiver: ID of the agent who received (or will receive) the message (Automatically set).
@@ -11,7 +13,11 @@ class Message(object):
     @type content: any
     @ivar __content: Data content of the message.
     @type __content: any
+    @ivar __pool: Pool which the message comes from, C{None} if the message has not been acquired from a pool.
+    @type __pool: C{L{MessagePool}}
     """
+    __slots__ = ("sender", "receiver", "__content", "__pool")
+    
     def __init__(self, content):
         """ Message constructor.
         @param content: Data content of the message.
@@ -20,6 +26,7 @@ class Message(object):
         self.sender = None    
         self.receiver = None
         self.__content = content
+        self.__pool = None
            
     def __getContent(self):
         """ C{L{content}} property getter.
@@ -44,4 +51,171 @@ class Message(object):
         msg = Message(self.__content)
         msg.sender = self.sender
         msg.receiver = self.receiver
-        return msg
\ No newline at end of file
+        return msg
+        
+    def __getstate__(self):
+        return (self.sender, self.receiver, self.__content)
+        
+    def __setstate__(self, state):
+        self.sender, self.receiver, self.__content = state
+        self.__pool = None
+        
+    def release(self):
+        """ Gives the message back to the pool which it comes from, once it has been processed. The message must not be used anymore.
+        
+        Nothing is done if the message does not come from a pool, or if it has been broadcast (its receiver is not a single agent ID), because then it is shared by several agents.
+        """
+        pool = self.__pool
+        if pool != None and isinstance(self.receiver, (int, long)):
+            self.__pool = None
+            pool.recycle(self)
+            
+    def _setPool(self, pool):
+        """ Records the pool which the message comes from. Called by C{L{MessagePool}}.
+        @param pool: The pool.
+        @type pool: C{L{MessagePool}}
+        """
+        self.__pool = pool
+        
+    def _clear(self):
+        """ Drops the references held by the message, before it waits in a pool. """
+        self.sender = None
+        self.receiver = None
+        self.__content = None
+        
+_setSlot = object.__setattr__
+
+class MessageView(object):
+    """ It is the view of a broadcast message delivered to one of its receivers: it has its own C{receiver}, the ID of the receiver, and reads the other attributes from the broadcast message, its envelope, which is shared by all the receivers. It costs much less than a copy of the message, and passes for an instance of the class of its envelope (C{isinstance}).
+    
+    Setting another attribute than C{receiver} (e.g. C{sender}, to forward the message) first replaces the envelope by a copy, so the other receivers are not affected. A view is pickled or encoded as a plain message (see C{L{toMessage}}).
+    @ivar receiver: ID of the agent who received the message.
+    @type receiver: C{int}
+    @ivar envelope: The broadcast message, or a copy of it once an attribute has been set.
+    @type envelope: C{L{Message}}
+    """
+    __slots__ = ("receiver", "envelope")
+    
+    def __init__(self, envelope, receiver):
+        """ Message view constructor. Called by the kernel.
+        @param envelope: The broadcast message.
+        @type envelope: C{L{Message}}
+        @param receiver: ID of the agent who receives the message.
+        @type receiver: C{int}
+        """
+        _setSlot(self, "envelope", envelope)
+        _setSlot(self, "receiver", receiver)
+        
+    def __getClass(self):
+        """ C{__class__} property getter, so C{isinstance} sees the class of the envelope.
+        @return: The class of the envelope.
+        @rtype: C{class}
+        """
+        return self.envelope.__class__
+    __class__ = property(__getClass)
+    
+    def __getattr__(self, name):
+        return getattr(self.envelope, name)
+        
+    def __setattr__(self, name, value):
+        if name == "receiver" or name == "envelope":
+            _setSlot(self, name, value)
+            return
+        envelope = self.envelope
+        if not isinstance(envelope.receiver, (int, long)):
+            # Still the shared message
+            envelope = envelope.__copy__()
+            envelope.receiver = self.receiver
+            _setSlot(self, "envelope", envelope)
+        setattr(envelope, name, value)
+        
+    def toMessage(self):
+        """ Makes a plain message from the view: a shallow copy of the envelope, with the receiver of the view.
+        @return: The message.
+        @rtype: C{L{Message}}
+        """
+        msg = self.envelope.__copy__()
+        msg.receiver = self.receiver
+        return msg
+        
+    def __copy__(self):
+        return self.toMessage()
+        
+    def __reduce_ex__(self, protocol):
+        return self.toMessage().__reduce_ex__(protocol)
+        
+    def __str__(self):
+        return str(self.toMessage())
+        
+class Topic(object):
+    """ It is the receiver of a published message (see C{L{Kernel.publish}}).
+    @ivar topic: Topic of the message: any hashable, e.g. an action name or a message class. If C{None}, the topics are given by the message itself: its class and base classes, and its action name if it has one.
+    @type topic: any hashable
+    """
+    def __init__(self, topic=None):
+        """ Topic constructor.
+        @param topic: Topic of the message (if C{None}, the topics are given by the message).
+        @type topic: any hashable
+        """
+        self.topic = topic
+        
+    def __eq__(self, other):
+        return isinstance(other, Topic) and self.topic == other.topic
+        
+    def __ne__(self, other):
+        return not self.__eq__(other)
+        
+    def __hash__(self):
+        return hash(self.topic)
+        
+    def __repr__(self):
+        return "Topic(%r)" %(self.topic,)
+        
+class MessagePool(object):
+    """ It is a free list of messages of a given class, which recycles the messages once they have been processed, instead of allocating new ones.
+    
+    A message is acquired from the pool by the sender instead of being built, and is given back by the receiver with C{L{Message.release}}.
+    @ivar messageClass: Class of the messages of the pool.
+    @type messageClass: C{class}
+    @ivar size: Maximum number of free messages kept by the pool.
+    @type size: C{int}
+    @ivar __free: The free messages.
+    @type __free: C{list<L{Message}>}
+    """
+    def __init__(self, messageClass=Message, size=1024):
+        """ Message pool constructor.
+        @param messageClass: Class of the messages of the pool.
+        @type messageClass: C{class}
+        @param size: Maximum number of free messages kept by the pool.
+        @type size: C{int}
+        """
+        self.messageClass = messageClass
+        self.size = size
+        self.__free = []
+        
+    def acquire(self, *arg, **kw):
+        """ Gets a message from the pool, or builds a new one if the pool is empty.
+        @param arg: Arguments of the message class constructor.
+        @param kw: Keywords of the message class constructor.
+        @return: The initialized message.
+        @rtype: C{L{Message}}
+        """
+        try:
+            msg = self.__free.pop()
+            msg.__init__(*arg, **kw)
+        except IndexError:
+            msg = self.messageClass(*arg, **kw)
+        msg._setPool(self)
+        return msg
+        
+    def recycle(self, message):
+        """ Takes back a released message. Called by C{L{Message.release}}.
+        @param message: The released message.
+        @type message: C{L{Message}}
+        """
+        if len(self.__free) < self.size:
+            message._clear()
+            self.__free.append(message)
+            
+    def __len__(self):
+        return len(self.__free)
@@ -0,0 +1,142 @@
+"""
+@author: Damien Boucard
+@version: 0.3
+"""
+from collections import deque
+import thread
+
+class MessageBox(object):
+    """ It is the FIFO message box of an agent. Putting and getting a message cost a constant time.
+    
+    Messages can be put from several threads. Only the owner of the box is expected to get them: getting a message takes no lock.
+    
+    A message box can be pickled with its messages, e.g. to move its agent to another process.
+    
+    A message box can be bounded. When a message arrives in a full bounded box, the overflow C{L{policy}} is applied.
+    @cvar POLICIES: Available overflow policies. "drop newest" drops the incoming message, "drop oldest" drops the oldest message of the box to make room for the incoming one, "reject" raises a C{L{MessageBoxFullError}} to the sender (backpressure; a broadcast skips the full boxes and returns their number instead, see C{L{Kernel.sendBroadcastMessage}}).
+    @type POLICIES: C{tuple<str>}
+    @ivar bound: Maximum number of messages in the box (if C{None}, the box is not bounded).
+    @type bound: C{int}
+    @ivar policy: Overflow policy, one of C{L{POLICIES}}.
+    @type policy: C{str}
+    @ivar received: Number of messages put into the box, including dropped ones.
+    @type received: C{int}
+    @ivar dropped: Number of messages dropped or rejected by the overflow policy.
+    @type dropped: C{int}
+    @ivar highWater: Greatest depth reached by the box.
+    @type highWater: C{int}
+    @type depth: C{int}
+    @ivar __queue: Messages waiting in the box, oldest first.
+    @type __queue: C{deque<L{Message}>}
+    @ivar __lock: Lock taken by the senders, and by the owner to drain the box.
+    @type __lock: C{thread.LockType}
+    """
+    POLICIES = ("drop newest", "drop oldest", "reject")
+    
+    def __init__(self, bound=None, policy="drop newest"):
+        """ Message box constructor.
+        @param bound: Maximum number of messages in the box (if C{None}, the box is not bounded).
+        @type bound: C{int}
+        @param policy: Overflow policy, one of C{L{POLICIES}}.
+        @type policy: C{str}
+        """
+        if policy not in self.POLICIES:
+            raise ValueError("Unknown overflow policy: %s" %policy)
+        self.bound = bound
+        self.policy = policy
+        self.received = 0
+        self.dropped = 0
+        self.highWater = 0
+        self.__queue = deque()
+        self.__lock = thread.allocate_lock()
+        
+    def put(self, message):
+        """ Puts a message at the end of the box, applying the overflow policy if the box is full.
+        @param message: The incoming message.
+        @type message: C{L{Message}}
+        @raise MessageBoxFullError: if the box is full and the policy is "reject".
+        """
+        queue = self.__queue
+        self.__lock.acquire()
+        try:
+            self.received = self.received + 1
+            if self.bound != None and len(queue) >= self.bound:
+                self.dropped = self.dropped + 1
+                if self.policy == "drop newest":
+                    return
+                if self.policy == "reject":
+                    raise MessageBoxFullError(message)
+                queue.popleft()
+            queue.append(message)
+            if len(queue) > self.highWater:
+                self.highWater = len(queue)
+        finally:
+            self.__lock.release()
+            
+    def get(self):
+        """ Gets and removes the oldest message of the box.
+        @return: The message or C{None} if the box is empty.
+        @rtype: C{L{Message}}
+        """
+        try:
+            return self.__queue.popleft()
+        except IndexError:
+            return None
+        
+    def drain(self, max_n=None):
+        """ Gets and removes the oldest messages of the box.
+        @param max_n: Maximum number of messages to get (if C{None}, all the messages are got).
+        @type max_n: C{int}
+        @return: The messages, oldest first.
+        @rtype: C{list<L{Message}>}
+        """
+        queue = self.__queue
+        self.__lock.acquire()
+        try:
+            if max_n == None or max_n >= len(queue):
+                messages = list(queue)
+                queue.clear()
+                return messages
+            popleft = queue.popleft
+            return [popleft() for i in xrange(max_n)]
+        finally:
+            self.__lock.release()
+        
+    def putBack(self, messages):
+        """ Puts messages back at the front of the box, e.g. messages drained but not processed. They are not counted as received again, and the bound is not applied.
+        @param messages: The messages, oldest first.
+        @type messages: C{list<L{Message}>}
+        """
+        queue = self.__queue
+        self.__lock.acquire()
+        try:
+            queue.extendleft(reversed(messages))
+            if len(queue) > self.highWater:
+                self.highWater = len(queue)
+        finally:
+            self.__lock.release()
+        
+    def getDepth(self):
+        """ C{L{depth}} property getter.
+        @return: The number of messages waiting in the box.
+        @rtype: C{int}
+        """
+        return len(self.__queue)
+    depth = property(getDepth, doc="Number of messages waiting in the box (Read only).")
+    
+    def __len__(self):
+        return len(self.__queue)
+        
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_MessageBox__lock"]
+        state["_MessageBox__queue"] = list(self.__queue)
+        return state
+        
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__queue = deque(self.__queue)
+        self.__lock = thread.allocate_lock()
+        
+class MessageBoxFullError(Exception):
+    """ Error raised when a message is put into a full message box which overflow policy is "reject". The message is attached to the error. """
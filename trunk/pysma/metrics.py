@@ -0,0 +1,181 @@
+"""
+@author: Damien Boucard
+@version: 0.3
+"""
+import math, time
+
+try:
+    import json
+except ImportError:
+    json = None
+
+class Histogram(object):
+    """ It is a histogram of durations, with buckets which bounds are powers of two microseconds.
+    @ivar count: Number of recorded durations.
+    @type count: C{int}
+    @ivar total: Sum of the recorded durations (in seconds).
+    @type total: C{float}
+    @ivar max: Greatest recorded duration (in seconds).
+    @type max: C{float}
+    @ivar buckets: Number of durations by bucket. Bucket M{k} counts the durations lower than M{2^k} microseconds, and not lower than M{2^(k-1)}.
+    @type buckets: C{dict<int, int>}
+    """
+    def __init__(self):
+        """ Histogram constructor. """
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = {}
+        
+    def record(self, duration):
+        """ Records a duration.
+        @param duration: The duration (in seconds).
+        @type duration: C{float}
+        """
+        self.count = self.count + 1
+        self.total = self.total + duration
+        if duration > self.max:
+            self.max = duration
+        bucket = math.frexp(duration * 1e6)[1]
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        
+    def percentile(self, ratio):
+        """ Gets an upper bound of a percentile of the durations.
+        @param ratio: The percentile, between 0 and 1 (e.g. 0.99).
+        @type ratio: C{float}
+        @return: The upper bound of the bucket of the percentile (in seconds).
+        @rtype: C{float}
+        """
+        remaining = ratio * self.count
+        buckets = self.buckets.keys()
+        buckets.sort()
+        for bucket in buckets:
+            remaining = remaining - self.buckets[bucket]
+            if remaining <= 0:
+                return min(2.0 ** bucket / 1e6, self.max)
+        return self.max
+        
+    def snapshot(self):
+        """ Summarizes the histogram.
+        @return: The count, the total, mean, median, 99th percentile and maximum durations (in seconds), and the buckets by upper bound (in microseconds).
+        @rtype: C{dict}
+        """
+        buckets = {}
+        for bucket, count in self.buckets.items():
+            buckets["<%gus" %(2.0 ** bucket)] = count
+        return {"count": self.count, "total": self.total, "mean": self.total / max(self.count, 1),
+                "p50": self.percentile(0.5), "p99": self.percentile(0.99), "max": self.max, "buckets": buckets}
+
+class Metrics(object):
+    """ It is the instrumentation of a kernel. It is enabled by setting the C{metrics} attribute of the kernel, and costs nothing more than a test when disabled.
+    
+    The counters are updated without locking, so they may be slightly underestimated when several threads send messages at once.
+    @ivar sent: Number of messages sent to a single agent.
+    @type sent: C{int}
+    @ivar broadcasts: Number of broadcast messages by couple which contains a group (type C{str}) and a role (type C{str}). A message sent to several roles counts for each of them.
+    @type broadcasts: C{dict<(str, str), int>}
+    @ivar liveTimes: Duration of the C{live} calls of the activated agents, by agent class name.
+    @type liveTimes: C{dict<str, L{Histogram}>}
+    @ivar handlerTimes: Duration of the action-specific handlers of the action agents, by action name.
+    @type handlerTimes: C{dict<str, L{Histogram}>}
+    @ivar ticks: Duration of the scheduling steps.
+    @type ticks: C{L{Histogram}}
+    @ivar dumpPath: File where a snapshot is appended periodically, as a line of JSON (if C{None}, nothing is written).
+    @type dumpPath: C{str}
+    @ivar dumpInterval: Minimal time (in seconds) between two periodic dumps, checked at the end of each scheduling step.
+    @type dumpInterval: C{float}
+    @ivar __lastDump: Time (as returned by C{time.time()}) of the last periodic dump.
+    @type __lastDump: C{float}
+    """
+    def __init__(self, dumpPath=None, dumpInterval=60.0):
+        """ Metrics constructor.
+        @param dumpPath: File where a snapshot is appended periodically (if C{None}, nothing is written).
+        @type dumpPath: C{str}
+        @param dumpInterval: Minimal time (in seconds) between two periodic dumps.
+        @type dumpInterval: C{float}
+        """
+        self.dumpPath = dumpPath
+        self.dumpInterval = dumpInterval
+        self.reset()
+        
+    def reset(self):
+        """ Clears all the counters and histograms. """
+        self.sent = 0
+        self.broadcasts = {}
+        self.liveTimes = {}
+        self.handlerTimes = {}
+        self.ticks = Histogram()
+        self.__lastDump = time.time()
+        
+    def countBroadcast(self, group, role):
+        """ Counts a message broadcast to a role. Called by the kernel. """
+        self.broadcasts[(group, role)] = self.broadcasts.get((group, role), 0) + 1
+        
+    def recordLive(self, agent, duration):
+        """ Records the duration of a C{live} call. Called by the activators. """
+        name = type(agent).__name__
+        histogram = self.liveTimes.get(name)
+        if histogram == None:
+            histogram = self.liveTimes[name] = Histogram()
+        histogram.record(duration)
+        
+    def recordHandler(self, action, duration):
+        """ Records the duration of an action-specific handler. Called by the action agents. """
+        histogram = self.handlerTimes.get(action)
+        if histogram == None:
+            histogram = self.handlerTimes[action] = Histogram()
+        histogram.record(duration)
+        
+    def recordTick(self, duration, kernel=None):
+        """ Records the duration of a scheduling step, then dumps a snapshot if the dump interval is elapsed. Called by the schedulers.
+        @param kernel: Kernel whose message boxes are included in the dump.
+        @type kernel: C{L{Kernel}}
+        """
+        self.ticks.record(duration)
+        if self.dumpPath != None and time.time() - self.__lastDump >= self.dumpInterval:
+            self.dump(self.dumpPath, kernel)
+            
+    def snapshot(self, kernel=None):
+        """ Summarizes the metrics.
+        @param kernel: If given, the message box depths of its agents are included, by agent class name: the number of agents, the total and greatest depths, and the greatest high-water mark.
+        @type kernel: C{L{Kernel}}
+        @return: The metrics, as a tree of dictionnaries, lists and numbers.
+        @rtype: C{dict}
+        """
+        snapshot = {"time": time.time(), "sent": self.sent, "ticks": self.ticks.snapshot()}
+        snapshot["broadcasts"] = [{"group": group, "role": role, "count": count} for (group, role), count in self.broadcasts.items()]
+        snapshot["live"] = dict([(name, histogram.snapshot()) for name, histogram in self.liveTimes.items()])
+        snapshot["handlers"] = dict([(action, histogram.snapshot()) for action, histogram in self.handlerTimes.items()])
+        if kernel != None:
+            boxes = {}
+            for agent in kernel.getAgents():
+                box = agent.messageBox
+                if box == None:
+                    # Light agents have no message box object
+                    continue
+                stats = boxes.setdefault(type(agent).__name__, {"agents": 0, "depth": 0, "maxDepth": 0, "highWater": 0})
+                stats["agents"] = stats["agents"] + 1
+                stats["depth"] = stats["depth"] + box.depth
+                stats["maxDepth"] = max(stats["maxDepth"], box.depth)
+                stats["highWater"] = max(stats["highWater"], box.highWater)
+            snapshot["messageBoxes"] = boxes
+        return snapshot
+        
+    def dump(self, path, kernel=None):
+        """ Appends a snapshot to a file, as a line of JSON (or of Python literals, if the C{json} module is not available).
+        @param path: The file.
+        @type path: C{str}
+        @param kernel: Kernel whose message boxes are included.
+        @type kernel: C{L{Kernel}}
+        """
+        snapshot = self.snapshot(kernel)
+        if json != None:
+            line = json.dumps(snapshot)
+        else:
+            line = repr(snapshot)
+        out = open(path, "a")
+        try:
+            out.write(line + "\n")
+        finally:
+            out.close()
+        self.__lastDump = time.time()
@@ -0,0 +1,140 @@
+"""
+Columnar populations: homogeneous light agents whose state is stored in arrays, one per field, instead of in each agent.
+
+The fields of the agents are declared on their class with C{L{Column}}, and are read and written like attributes. A C{L{Population}} is launched in a kernel first, then it launches its agents, which get consecutive rows in its columns.
+
+    >>> class Walker(PopulationAgent):
+    ...     __slots__ = ()
+    ...     x = Column("x", "i")
+    ...     energy = Column("energy", "d", 1.0)
+    ...     def live(self):
+    ...         self.x = self.x + 1
+    >>> population = Population(Walker)
+    >>> kernel.addAgent(population)
+    >>> population.launch(1000000)
+
+An agent of a population takes the memory of a C{L{LightAgent}} plus its values in the columns (e.g. 4 bytes for an C{"i"} column). The columns can also be read as a whole, e.g. to render or to compute statistics without going through the agents.
+@author: Damien Boucard
+@version: 0.3
+"""
+from lightAgent import LightAgent
+from array import array
+
+class Column(object):
+    """ It is a field of the agents of a population, declared on their class. Its values are stored in an C{array} of the population, at the row of each agent.
+    @ivar name: Name of the column in the population.
+    @type name: C{str}
+    @ivar typecode: Type code of the C{array} which stores the values (e.g. C{"i"}, C{"d"}).
+    @type typecode: C{str}
+    @ivar default: Value of the field of the launched agents.
+    @type default: C{int} or C{float}
+    """
+    def __init__(self, name, typecode, default=0):
+        """ Column constructor.
+        @param name: Name of the column in the population.
+        @type name: C{str}
+        @param typecode: Type code of the C{array} which stores the values.
+        @type typecode: C{str}
+        @param default: Value of the field of the launched agents.
+        @type default: C{int} or C{float}
+        """
+        self.name = name
+        self.typecode = typecode
+        self.default = default
+    
+    def __get__(self, agent, cls):
+        if agent == None:
+            return self
+        return agent.population.columns[self.name][agent.index]
+    
+    def __set__(self, agent, value):
+        agent.population.columns[self.name][agent.index] = value
+
+class PopulationAgent(LightAgent):
+    """ It is the class of the agents of a C{L{Population}}. Its subclasses declare their fields with C{L{Column}}, and should declare empty C{__slots__}.
+    @ivar population: The population of the agent.
+    @type population: C{L{Population}}
+    @ivar index: Row of the agent in the columns of its population.
+    @type index: C{int}
+    """
+    __slots__ = ("population", "index")
+    
+    def __init__(self, population, index):
+        """ Population agent constructor. Called by C{L{Population.launch}}.
+        @param population: The population of the agent.
+        @type population: C{L{Population}}
+        @param index: Row of the agent in the columns of its population.
+        @type index: C{int}
+        """
+        LightAgent.__init__(self)
+        self.population = population
+        self.index = index
+    
+    def touch(self):
+        """ Marks the population of the agent as changed, since it holds the fields of the agent, so the next incremental checkpoint saves it again. """
+        self.population.touch()
+
+class Population(LightAgent):
+    """ It is an agent which holds the columns of a population of agents of the same class, and launches them. It is saved in the checkpoints with its columns, and its agents refer to it, so the columns are saved once.
+    
+    The rows of the killed agents are not reused. The population is saved again by an incremental checkpoint when it launches agents, or when it or one of its agents is touched (see C{L{Agent.touch}}): the agents which change their fields should touch themselves.
+    @ivar agentClass: Class of the agents, subclass of C{L{PopulationAgent}}.
+    @type agentClass: C{type}
+    @ivar columns: Values of the fields of the agents, by column name.
+    @type columns: C{dict<str, array>}
+    @ivar agents: The agents, by row.
+    @type agents: C{list<L{PopulationAgent}>}
+    """
+    __slots__ = ("agentClass", "columns", "agents", "__defaults")
+    
+    def __init__(self, agentClass):
+        """ Population constructor. Creates the columns declared on the class of the agents and its base classes.
+        @param agentClass: Class of the agents, subclass of C{L{PopulationAgent}}.
+        @type agentClass: C{type}
+        """
+        LightAgent.__init__(self)
+        self.agentClass = agentClass
+        self.columns = {}
+        self.agents = []
+        self.__defaults = {}
+        for cls in agentClass.__mro__:
+            for value in cls.__dict__.values():
+                if isinstance(value, Column) and value.name not in self.columns:
+                    self.columns[value.name] = array(value.typecode)
+                    self.__defaults[value.name] = value.default
+    
+    def launch(self, count, name="unamed"):
+        """ Launches new agents in the kernel of the population, with the default values of their fields. If the launching fails (e.g. a C{born} method raises an error), the kernel undoes it (see C{L{Kernel.addAgents}}) and the rows of the agents are dropped, then the error is raised again.
+        @param count: Number of agents to launch.
+        @type count: C{int}
+        @param name: Name of the agents in the white pages (Optional).
+        @type name: C{str}
+        @return: The IDs of the launched agents, in order.
+        @rtype: C{list<int>}
+        @raise ValueError: if the population is not launched.
+        """
+        if self.kernel == None:
+            raise ValueError("The population must be launched before its agents")
+        start = len(self.agents)
+        agents = [self.agentClass(self, index) for index in xrange(start, start + count)]
+        for column, values in self.columns.items():
+            values.extend(array(values.typecode, [self.__defaults[column]]) * count)
+        self.agents.extend(agents)
+        try:
+            ids = self.kernel.addAgents(agents, name)
+        except:
+            for values in self.columns.values():
+                del values[start:]
+            del self.agents[start:]
+            raise
+        self.touch()
+        return ids
+    
+    def getColumn(self, name):
+        """ Gets the values of a field of all the agents.
+        @param name: Name of the column.
+        @type name: C{str}
+        @return: The values, by row. Changing them changes the fields of the agents.
+        @rtype: C{array}
+        """
+        return self.columns[name]
@@ -0,0 +1,121 @@
+"""
+@author: Damien Boucard
+@version: 0.3
+"""
+from indexedSet import IndexedSet
+
+class RoleView(object):
+    """ It is a live view of the agents of a role, got with C{L{Kernel.getRoleView}}. The kernel keeps one view by role and updates it in place each time the role changes, so it can be kept and read at each tick without looking up the agent IDs.
+    
+    Iterating a view goes over an immutable copy of its agents, made at the first read after a change: the agents which join or leave the role meanwhile do not disturb the iteration. The C{L{version}} changes at each change of the role, so a reader can tell whether the values it has computed from the view are still valid.
+    @ivar listeners: Functions called at each change of the role, with the agents which have joined it and the agents which have left it, e.g. to follow the changes without reading the whole view. They are called with the lock of the kernel held, from any thread.
+    @type listeners: C{list<callable>}
+    @ivar __group: Group of the role.
+    @type __group: C{str}
+    @ivar __role: The role.
+    @type __role: C{str}
+    @ivar __agents: The agents of the role, in joining order.
+    @type __agents: C{L{IndexedSet}<L{Agent}>}
+    @ivar __version: Number of changes of the role since the creation of the view.
+    @type __version: C{int}
+    @ivar __snapshot: Immutable copy of C{__agents}, C{None} after a change until the next read.
+    @type __snapshot: C{tuple<L{Agent}>}
+    @ivar __lock: Lock of the kernel, held while the view is changed.
+    @type __lock: C{threading.RLock}
+    """
+    def __init__(self, group, role, agents, lock):
+        """ Role view constructor.
+        @param group: Group of the role.
+        @type group: C{str}
+        @param role: The role.
+        @type role: C{str}
+        @param agents: The present agents of the role, in joining order.
+        @type agents: iterable
+        @param lock: Lock of the kernel, held while the view is changed.
+        @type lock: C{threading.RLock}
+        """
+        self.__group = group
+        self.__role = role
+        self.__agents = IndexedSet(agents)
+        self.__version = 0
+        self.__snapshot = None
+        self.__lock = lock
+        self.listeners = []
+    
+    def getGroup(self):
+        """ C{L{group}} property getter.
+        @return: The group of the role.
+        @rtype: C{str}
+        """
+        return self.__group
+    group = property(getGroup, doc="Group of the role (Read only).")
+    
+    def getRole(self):
+        """ C{L{role}} property getter.
+        @return: The role.
+        @rtype: C{str}
+        """
+        return self.__role
+    role = property(getRole, doc="The role (Read only).")
+    
+    def getVersion(self):
+        """ C{L{version}} property getter.
+        @return: The number of changes of the role.
+        @rtype: C{int}
+        """
+        return self.__version
+    version = property(getVersion, doc="Number of changes of the role since the creation of the view (Read only).")
+    
+    def change(self, added=(), removed=()):
+        """ Updates the view after a change of the role. Called by the kernel, with its lock held.
+        @param added: Agents which have joined the role.
+        @type added: iterable
+        @param removed: Agents which have left the role.
+        @type removed: iterable
+        """
+        agents = self.__agents
+        for agent in removed:
+            agents.discard(agent)
+        agents.update(added)
+        self.__version = self.__version + 1
+        self.__snapshot = None
+        for listener in self.listeners:
+            listener(added, removed)
+    
+    def reset(self, agents):
+        """ Replaces the agents of the view, e.g. after the kernel has imported a state. Called by the kernel, with its lock held.
+        @param agents: The agents of the role, in joining order.
+        @type agents: iterable
+        """
+        self.__agents = IndexedSet(agents)
+        self.__version = self.__version + 1
+        self.__snapshot = None
+        for listener in self.listeners:
+            listener(self.__agents.toTuple(), ())
+    
+    def toTuple(self):
+        """ Gets the agents of the role, which can be read without locking. The same tuple is returned until the role changes.
+        @return: The agents, in joining order.
+        @rtype: C{tuple<L{Agent}>}
+        """
+        snapshot = self.__snapshot
+        if snapshot == None:
+            self.__lock.acquire()
+            try:
+                snapshot = self.__agents.toTuple()
+                self.__snapshot = snapshot
+            finally:
+                self.__lock.release()
+        return snapshot
+    
+    def __iter__(self):
+        return iter(self.toTuple())
+    
+    def __len__(self):
+        return len(self.__agents)
+    
+    def __contains__(self, agent):
+        return agent in self.__agents
+    
+    def __repr__(self):
+        return "RoleView(%r, %r, version %d: %r)" %(self.__group, self.__role, self.__version, list(self.toTuple()))
@@ -3,7 +3,7 @@
 @version: 0.3
 """
 from agent import Agent
-import thread, time
+import thread, threading, Queue, random, sys, time, heapq
 
 class Scheduler(Agent):
     """ It is the class of an agent which schedules other agents.
@@ -25,9 +25,15 @@ class Scheduler(Agent):
             act.kernel = self.kernel
         thread.start_new_thread(self.schedule, ())
         
+    def restored(self):
+        """ Runs the restored scheduler on another thread. """
+        Scheduler.born(self)
+        
     def die(self):
-        """ Stops the scheduler. """
+        """ Stops the scheduler and its activators. """
         self.__alive = False
+        for act in self.activators:
+            act.stop()
         
     def schedule(self):
         """ Manages the scheduling. """
@@ -38,6 +44,26 @@ class Scheduler(Agent):
         """ Abstract method which activates a step of scheduling. """
         pass
         
+    def tick(self, activators):
+        """ Runs a step of scheduling: activates each given activator once. The duration of the step is recorded if the kernel has metrics, and its beginning if the kernel has a tracer.
+        @param activators: The activators.
+        @type activators: C{list<L{Activator}>}
+        """
+        kernel = self.kernel
+        if kernel == None:
+            return
+        if kernel.tracer != None:
+            kernel.tracer.tick()
+        metrics = kernel.metrics
+        if metrics == None:
+            for act in activators:
+                act.activate()
+        else:
+            start = time.time()
+            for act in activators:
+                act.activate()
+            metrics.recordTick(time.time() - start, kernel)
+        
 class Activator(object):
     """ It is the class used by a scheduler to activate other agents of a certain role.
     @ivar kernel: The kernel where the activator works. C{None} when the affected scheduler is not running.
@@ -87,25 +113,228 @@ class Activator(object):
         return []
     agents = property(getAgents, doc="Collection of agents activated by this activator.")
     
+    def getView(self):
+        """ C{L{view}} property getter.
+        @return: The live view of the concerned role, or C{None} if the activator does not work.
+        @rtype: C{L{RoleView}}
+        """
+        if self.kernel!=None:
+            return self.kernel.getRoleView(self.__role, self.__group)
+        return None
+    view = property(getView, doc="Live view of the concerned role, which gives the agents to activate without looking up their IDs (Read only).")
+    
     def activate(self):
-        """ Activates all agents of the concerned role. """
-        for id in self.agents:
-            agent = self.kernel.getAgent(id)
-            if agent != None:
+        """ Activates all agents of the concerned role, as they are at the beginning of the activation. """
+        self.activateAgents(self.view)
+        
+    def activateAgents(self, agents):
+        """ Activates the given agents, one after another. The agents killed meanwhile, e.g. by an agent activated before them, are skipped. The duration of each activation is recorded if the kernel has metrics.
+        @param agents: The agents.
+        @type agents: C{list<L{Agent}>}
+        """
+        metrics = self.kernel.metrics
+        if metrics == None:
+            for agent in agents:
+                if agent.kernel != None:
+                    agent.live()
+        else:
+            for agent in agents:
+                if agent.kernel == None:
+                    continue
+                start = time.time()
                 agent.live()
+                metrics.recordLive(agent, time.time() - start)
+                
+    def stop(self):
+        """ Called when the scheduler which uses the activator dies. Releases the resources of the activator, if any. """
+        pass
+    
+class ParallelActivator(Activator):
+    """ Activator which runs the agents of its role on a pool of threads.
+    
+    At each activation, the agents are ordered following the C{L{ordering}} policy, then split into contiguous shards which are run concurrently, one agent after another inside a shard. The activation returns when all shards are done (barrier).
+    
+    The messages sent during an activation are held by the kernel and delivered at the barrier, shard after shard, so the message boxes get the same contents as with a sequential activation in the same order. Agents of a shard do not see the messages sent by other agents during the same activation. For a given C{L{seed}}, the activation order and the delivery order are reproducible.
+    
+    Agents must not change roles nor launch or kill agents during an activation.
+    @cvar ORDERINGS: Available ordering policies. "role" keeps the order of the role, "shuffled" shuffles it at each activation with a random generator initialized with C{L{seed}}.
+    @type ORDERINGS: C{tuple<str>}
+    @ivar workers: Number of threads (and of shards).
+    @type workers: C{int}
+    @ivar ordering: Ordering policy, one of C{L{ORDERINGS}}.
+    @type ordering: C{str}
+    @ivar seed: Seed of the random generator used by the "shuffled" ordering.
+    @type seed: any hashable
+    @ivar __random: Random generator used by the "shuffled" ordering.
+    @type __random: C{random.Random}
+    @ivar __tasks: Queue of shards waiting to be run by the threads. C{None} until the threads are started.
+    @type __tasks: C{Queue.Queue}
+    @ivar __done: Condition notified when a shard is done.
+    @type __done: C{threading.Condition}
+    @ivar __results: Results of the running activation by shard: the held messages and the error information, if any.
+    @type __results: C{list<(list<(bool, L{Message})>, tuple)>}
+    @ivar __pending: Number of shards of the running activation which are not done yet.
+    @type __pending: C{int}
+    """
+    ORDERINGS = ("role", "shuffled")
+    
+    def __init__(self, role=None, group=None, workers=4, ordering="role", seed=None):
+        """ Parallel activator constructor.
+        @param role: Role of the agents to activate (if C{group} and C{role} equal C{None}, the common role is used).
+        @type role: C{str}
+        @param group: Group of the concerned role (if C{None}, the common group is used).
+        @type group: C{str}
+        @param workers: Number of threads (and of shards).
+        @type workers: C{int}
+        @param ordering: Ordering policy, one of C{L{ORDERINGS}}.
+        @type ordering: C{str}
+        @param seed: Seed of the random generator used by the "shuffled" ordering.
+        @type seed: any hashable
+        """
+        Activator.__init__(self, role, group)
+        if ordering not in self.ORDERINGS:
+            raise ValueError("Unknown ordering policy: %s" %ordering)
+        self.workers = max(1, workers)
+        self.ordering = ordering
+        self.seed = seed
+        self.__random = random.Random(seed)
+        self.__tasks = None
+        self.__done = threading.Condition()
+        self.__results = []
+        self.__pending = 0
+        
+    def getShards(self):
+        """ Orders the agents of the role and splits them into shards.
+        @return: One list of agents by shard.
+        @rtype: C{list<list<L{Agent}>>}
+        """
+        agents = list(self.view)
+        if self.ordering == "shuffled":
+            self.__random.shuffle(agents)
+        size, rest = divmod(len(agents), self.workers)
+        shards = []
+        start = 0
+        for i in range(self.workers):
+            end = start + size + (i < rest)
+            if end > start:
+                shards.append(agents[start:end])
+            start = end
+        return shards
+    
+    def activate(self):
+        """ Activates all agents of the concerned role on the threads and waits for all of them.
+        @raise Exception: the first error raised by an agent, in shard order.
+        """
+        if self.kernel == None:
+            return
+        shards = self.getShards()
+        if self.__tasks == None:
+            self.__tasks = Queue.Queue()
+            for i in range(self.workers):
+                worker = threading.Thread(target=self.__work, args=(self.__tasks,))
+                worker.setDaemon(True)
+                worker.start()
+        self.__done.acquire()
+        try:
+            self.__results = [None] * len(shards)
+            self.__pending = len(shards)
+            for index in range(len(shards)):
+                self.__tasks.put((self.kernel, index, shards[index]))
+            while self.__pending > 0:
+                self.__done.wait()
+            results = self.__results
+            self.__results = []
+        finally:
+            self.__done.release()
+        for held, error in results:
+            self.kernel.deliverMessages(held)
+        for held, error in results:
+            if error != None:
+                raise error[0], error[1], error[2]
+                
+    def __work(self, tasks):
+        """ Runs the shards given by the activations, on a thread of the pool.
+        @param tasks: Queue of the shards to run. C{None} stops the thread.
+        @type tasks: C{Queue.Queue}
+        """
+        while True:
+            task = tasks.get()
+            if task == None:
+                return
+            kernel, index, shard = task
+            error = None
+            kernel.holdMessages()
+            metrics = kernel.metrics
+            try:
+                for agent in shard:
+                    if agent.kernel == None:
+                        # Killed during the activation
+                        continue
+                    if metrics == None:
+                        agent.live()
+                    else:
+                        start = time.time()
+                        agent.live()
+                        metrics.recordLive(agent, time.time() - start)
+            except:
+                error = sys.exc_info()
+            held = kernel.releaseMessages()
+            self.__done.acquire()
+            try:
+                self.__results[index] = (held, error)
+                self.__pending = self.__pending - 1
+                self.__done.notify()
+            finally:
+                self.__done.release()
+                
+    def stop(self):
+        """ Stops the threads. They will be started again by the next activation. """
+        if self.__tasks != None:
+            for i in range(self.workers):
+                self.__tasks.put(None)
+            self.__tasks = None
+            
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_ParallelActivator__tasks"] = None
+        state["_ParallelActivator__results"] = []
+        state["_ParallelActivator__pending"] = 0
+        del state["_ParallelActivator__done"]
+        return state
+        
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__done = threading.Condition()
                 
+class ReactiveActivator(Activator):
+    """ Activator which only activates the agents of its role which are ready: the agents which have received a message, or which have been woken up (see C{L{Agent.wake}}), since their last activation. Idle agents cost nothing. Each agent is also activated once after it has been launched.
+    
+    It suits agents which only react to messages, like C{L{ActionAgent}}. An agent which wants to be activated without incoming message calls C{L{wake<Agent.wake>}}, e.g. in its C{born} method or at the end of its C{live} method to be activated again at the next step.
+    
+    The agents which get ready during an activation are activated by the next one.
+    """
+    def activate(self):
+        """ Activates the ready agents of the concerned role, in waking order. """
+        if self.kernel == None:
+            return
+        self.activateAgents(self.kernel.takeReady(self.role, self.group))
+        
 class DummyScheduler(Scheduler):
     """ Subclass which implements the abstract method of C{L{Scheduler}} with a very simple way. It activates all agents (on the common role), except itself of course.
     @ivar sleep_duration: Duration of the sleep (in seconds) of the thread between each step of scheduling.
     @type sleep_duration: C{float}
     """
-    def __init__(self, sleep=1):
+    def __init__(self, sleep=1, activator=None):
         """ Dummy scheduler constructor.
         @param sleep: Duration of the sleep (in seconds) of the thread between each step of scheduling.
         @type sleep: C{float}
+        @param activator: Activator of the common role (if C{None}, a sequential C{L{Activator}} is used).
+        @type activator: C{L{Activator}}
         """
         Scheduler.__init__(self)
-        self.activators.append(Activator())
+        if activator == None:
+            activator = Activator()
+        self.activators.append(activator)
         self.sleep_duration = sleep
         
     def born(self):
@@ -114,5 +343,326 @@ class DummyScheduler(Scheduler):
         
     def live(self):
         """ Activates a new step of scheduling. """
-        self.activators[0].activate()
-        time.sleep(self.sleep_duration)
\ No newline at end of file
+        self.tick(self.activators[:1])
+        time.sleep(self.sleep_duration)
+        
+class StepScheduler(Scheduler):
+    """ Subclass of C{L{Scheduler}} for synchronous discrete-time simulations. Each tick activates all its activators once (by default, all agents of the common role, except itself).
+    
+    The ticks are run as fast as possible, or paced up to a target tick rate. By default, they are run on the calling thread by C{L{run}} or C{L{runUntil}}. The scheduler stops running ticks as soon as it is killed (e.g. by C{L{Kernel.stopKernel}}).
+    @ivar rate: Target tick rate (in ticks per second). If C{None}, ticks are run as fast as possible.
+    @type rate: C{float}
+    @ivar threaded: Threaded flag. If C{True}, the scheduler runs the ticks by itself on another thread, like other schedulers.
+    @type threaded: C{bool}
+    @ivar ticks: Number of ticks run since the scheduler was created.
+    @type ticks: C{int}
+    @ivar __deadline: Time (as returned by C{time.time()}) at which the next tick should end, when the ticks are paced.
+    @type __deadline: C{float}
+    """
+    def __init__(self, rate=None, threaded=False, activator=None):
+        """ Step scheduler constructor.
+        @param rate: Target tick rate (in ticks per second). If C{None}, ticks are run as fast as possible.
+        @type rate: C{float}
+        @param threaded: Threaded flag. If C{True}, the scheduler runs the ticks by itself on another thread.
+        @type threaded: C{bool}
+        @param activator: Activator of the common role (if C{None}, a sequential C{L{Activator}} is used).
+        @type activator: C{L{Activator}}
+        """
+        Scheduler.__init__(self)
+        if activator == None:
+            activator = Activator()
+        self.activators.append(activator)
+        self.rate = rate
+        self.threaded = threaded
+        self.ticks = 0
+        self.__deadline = None
+        
+    def born(self):
+        self.leaveRole(None)
+        self.restored()
+        
+    def restored(self):
+        if self.threaded:
+            Scheduler.born(self)
+        else:
+            for act in self.activators:
+                act.kernel = self.kernel
+                
+    def live(self):
+        """ Runs one tick, then waits for the end of the tick period if the ticks are paced. """
+        self.tick(self.activators)
+        self.ticks = self.ticks + 1
+        if self.rate:
+            period = 1.0 / self.rate
+            now = time.time()
+            if self.__deadline == None or self.__deadline < now - period:
+                self.__deadline = now
+            self.__deadline = self.__deadline + period
+            delay = self.__deadline - time.time()
+            if delay > 0:
+                time.sleep(delay)
+                
+    def run(self, ticks):
+        """ Runs ticks on the calling thread.
+        @param ticks: Number of ticks to run.
+        @type ticks: C{int}
+        @return: The number of ticks run, lower than C{ticks} if the scheduler has been killed.
+        @rtype: C{int}
+        """
+        done = 0
+        while done < ticks and self.kernel != None:
+            self.live()
+            done = done + 1
+        return done
+        
+    def runUntil(self, predicate, ticks=None):
+        """ Runs ticks on the calling thread until a predicate is true.
+        @param predicate: Function without argument, called before each tick. The run stops when it returns C{True}.
+        @type predicate: C{callable}
+        @param ticks: Maximum number of ticks to run (if C{None}, no limit).
+        @type ticks: C{int}
+        @return: The number of ticks run.
+        @rtype: C{int}
+        """
+        done = 0
+        while (ticks == None or done < ticks) and self.kernel != None and not predicate():
+            self.live()
+            done = done + 1
+        return done
+        
+class EventScheduler(Scheduler):
+    """ Subclass of C{L{Scheduler}} for discrete-event simulations. The agents of a role are activated at simulated times, kept in an event calendar: the scheduler jumps straight from an activation to the next one, so agents which act rarely cost nothing between their activations.
+    
+    Each agent has at most one pending activation. The agents of the role are scheduled at the current time when the scheduler is launched, and so are the agents which join the role later, at the next C{L{step}} (the agents can be launched after the scheduler): they are followed with a listener of the view of the role, so the members are not read again. Then an agent is scheduled again if its C{live} method returns a number, which is the delay until its next activation, or with C{L{scheduleAt}} and C{L{scheduleIn}}. The activations at the same time are done in the order they have been scheduled.
+    
+    In reactive mode, the agents which receive messages or are woken up (see C{L{ReactiveActivator}}) are also activated at the current time.
+    
+    The events are run on the calling thread by C{L{run}} or C{L{step}}.
+    @ivar reactive: Reactive flag. If C{True}, the ready agents are activated at the current time.
+    @type reactive: C{bool}
+    @ivar events: Number of activations done since the scheduler was created.
+    @type events: C{int}
+    @type now: C{float}
+    @type role: C{str}
+    @type group: C{str}
+    @ivar __role: Role of the agents to activate (if C{group} and C{role} equal C{None}, the common role is used).
+    @type __role: C{str}
+    @ivar __group: Group of the concerned role (if C{None}, the common group is used).
+    @type __group: C{str}
+    @ivar __now: Current simulated time.
+    @type __now: C{float}
+    @ivar __calendar: Heap of the activations: triples which contain the simulated time, the sequence number of the activation and the ID of the agent.
+    @type __calendar: C{list<(float, int, int)>}
+    @ivar __pending: Dictionnary of agent IDs which point to the time and the sequence number of their pending activation. The activations of the calendar which are not pending have been cancelled.
+    @type __pending: C{dict<int, (float, int)>}
+    @ivar __sequence: Sequence number of the next activation.
+    @type __sequence: C{int}
+    @ivar __newcomers: Agents which have joined the role since the last step, to be scheduled at the current time. Filled by the listener of the view of the role.
+    @type __newcomers: C{list<L{Agent}>}
+    @ivar __tickTime: Simulated time of the last tick recorded by the tracer of the kernel, C{None} before the first one.
+    @type __tickTime: C{float}
+    """
+    def __init__(self, role=None, group=None, start=0.0, reactive=False):
+        """ Event scheduler constructor.
+        @param role: Role of the agents to activate (if C{group} and C{role} equal C{None}, the common role is used).
+        @type role: C{str}
+        @param group: Group of the concerned role (if C{None}, the common group is used).
+        @type group: C{str}
+        @param start: Initial simulated time.
+        @type start: C{float}
+        @param reactive: Reactive flag. If C{True}, the ready agents are activated at the current time.
+        @type reactive: C{bool}
+        """
+        Scheduler.__init__(self)
+        self.__role = role
+        self.__group = group
+        self.__now = start
+        self.__calendar = []
+        self.__pending = {}
+        self.__sequence = 0
+        self.__newcomers = []
+        self.__tickTime = None
+        self.reactive = reactive
+        self.events = 0
+        
+    def getGroup(self):
+        """ C{L{group}} property getter.
+        @return: The group of the concerned role.
+        @rtype: C{str}
+        """
+        return self.__group
+    group = property(getGroup, doc="Group of the concerned role (if C{None}, the common group is used) (Read only).")
+    
+    def getRole(self):
+        """ C{L{role}} property getter.
+        @return: The role of the activated agents.
+        @rtype: C{str}
+        """
+        return self.__role
+    role = property(getRole, doc="Role of the agents to activate (if C{group} and C{role} equal C{None}, the common role is used) (Read only).")
+    
+    def getNow(self):
+        """ C{L{now}} property getter.
+        @return: The current simulated time.
+        @rtype: C{float}
+        """
+        return self.__now
+    now = property(getNow, doc="Current simulated time: time of the current or last activation (Read only).")
+    
+    def born(self):
+        self.leaveRole(None)
+        for id in self.kernel.getAgentsWith(self.__role, self.__group):
+            self.scheduleAt(id, self.__now)
+        self.kernel.getRoleView(self.__role, self.__group).listeners.append(self.__roleChanged)
+        if self.reactive:
+            self.kernel.trackReadiness()
+            self.kernel.takeReady(self.__role, self.__group)
+            
+    def restored(self):
+        """ Follows the role again, and restarts the readiness tracking of the kernel in reactive mode. The calendar has been saved with the scheduler, and the events are run by C{L{run}} or C{L{step}}: no thread is started. """
+        self.kernel.getRoleView(self.__role, self.__group).listeners.append(self.__roleChanged)
+        if self.reactive:
+            self.kernel.trackReadiness()
+            self.kernel.takeReady(self.__role, self.__group)
+            
+    def die(self):
+        """ Stops following the role. """
+        if self.kernel != None:
+            listeners = self.kernel.getRoleView(self.__role, self.__group).listeners
+            if self.__roleChanged in listeners:
+                listeners.remove(self.__roleChanged)
+        Scheduler.die(self)
+        
+    def scheduleAt(self, agentId, time):
+        """ Sets the next activation of an agent, replacing its pending activation if any.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        @param time: Simulated time of the activation. It cannot be earlier than the current time.
+        @type time: C{float}
+        @raise ValueError: if the time is earlier than the current time.
+        """
+        if time < self.__now:
+            raise ValueError("Cannot schedule an activation in the past: %s < %s" %(time, self.__now))
+        sequence = self.__sequence
+        self.__sequence = sequence + 1
+        self.__pending[agentId] = (time, sequence)
+        heapq.heappush(self.__calendar, (time, sequence, agentId))
+        
+    def scheduleIn(self, agentId, delay):
+        """ Sets the next activation of an agent after a delay from the current time, replacing its pending activation if any.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        @param delay: Delay before the activation (in simulated time).
+        @type delay: C{float}
+        """
+        self.scheduleAt(agentId, self.__now + delay)
+        
+    def cancel(self, agentId):
+        """ Cancels the pending activation of an agent, if any.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        """
+        self.__pending.pop(agentId, None)
+        
+    def getNextTime(self):
+        """ Gets the simulated time of the next activation.
+        @return: The time, or C{None} if no activation is pending.
+        @rtype: C{float}
+        """
+        self.__scheduleNewcomers()
+        self.__wakeReady()
+        calendar = self.__calendar
+        pending = self.__pending
+        while calendar:
+            when, sequence, id = calendar[0]
+            if pending.get(id) == (when, sequence):
+                return when
+            heapq.heappop(calendar)
+        return None
+        
+    def step(self):
+        """ Runs the next activation, after moving the current time to its time. A tick is recorded each time the current time changes if the kernel has a tracer.
+        @return: C{False} if no activation is pending, C{True} otherwise.
+        @rtype: C{bool}
+        """
+        kernel = self.kernel
+        if kernel == None or self.getNextTime() == None:
+            return False
+        self.__runNext(kernel)
+        return True
+        
+    def __runNext(self, kernel):
+        """ Runs the first activation of the calendar, which C{L{getNextTime}} has found pending.
+        @param kernel: The kernel of the scheduler.
+        @type kernel: C{L{Kernel}}
+        """
+        self.__now, sequence, id = heapq.heappop(self.__calendar)
+        del self.__pending[id]
+        if kernel.tracer != None and self.__now != self.__tickTime:
+            self.__tickTime = self.__now
+            kernel.tracer.tick()
+        agent = kernel.getAgent(id)
+        if agent == None:
+            return
+        self.events = self.events + 1
+        metrics = kernel.metrics
+        if metrics == None:
+            delay = agent.live()
+        else:
+            start = time.time()
+            delay = agent.live()
+            metrics.recordLive(agent, time.time() - start)
+        if delay != None and id not in self.__pending and agent.kernel != None:
+            self.scheduleIn(id, delay)
+        
+    def run(self, until=None, maxEvents=None):
+        """ Runs the activations on the calling thread, in time order.
+        @param until: Simulated time at which the run stops: the activations scheduled later are not run, and the current time is moved to this time. If C{None}, the run stops when no activation is pending.
+        @type until: C{float}
+        @param maxEvents: Maximum number of activations to run (if C{None}, no limit).
+        @type maxEvents: C{int}
+        @return: The number of activations run, lower than C{maxEvents} if the scheduler has been killed or has nothing left to run.
+        @rtype: C{int}
+        """
+        events = self.events
+        while self.kernel != None and (maxEvents == None or self.events - events < maxEvents):
+            next = self.getNextTime()
+            if next == None or (until != None and next > until):
+                if until != None and until > self.__now:
+                    self.__now = until
+                break
+            self.__runNext(self.kernel)
+        return self.events - events
+        
+    def __roleChanged(self, added, removed):
+        """ Listener of the view of the role: keeps the agents which have joined it, to be scheduled by the next step. Called by the kernel, from any thread.
+        @param added: Agents which have joined the role.
+        @type added: iterable
+        @param removed: Agents which have left the role.
+        @type removed: iterable
+        """
+        self.__newcomers.extend(added)
+        
+    def __scheduleNewcomers(self):
+        """ Schedules at the current time the agents which have joined the role since the last call, unless they are already scheduled. """
+        newcomers = self.__newcomers
+        if not newcomers or self.kernel == None:
+            return
+        # The agents added meanwhile are after the slice
+        agents = newcomers[:]
+        del newcomers[:len(agents)]
+        getAgentId = self.kernel.getAgentId
+        for agent in agents:
+            id = getAgentId(agent)
+            if id != None and id not in self.__pending:
+                self.scheduleAt(id, self.__now)
+        
+    def __wakeReady(self):
+        """ In reactive mode, schedules the ready agents at the current time, unless they are scheduled earlier. """
+        if not self.reactive or self.kernel == None:
+            return
+        for agent in self.kernel.takeReady(self.__role, self.__group):
+            id = self.kernel.getAgentId(agent)
+            pending = self.__pending.get(id)
+            if pending == None or pending[0] > self.__now:
+                self.scheduleAt(id, self.__now)
@@ -0,0 +1,371 @@
+"""
+Sharded kernel: the agents are partitioned across worker processes, to use several cores and more memory than a single process can.
+
+Each worker process runs a C{L{ShardKernel}}, which allocates strided agent IDs: the agent IDs of the shard M{i} among M{n} shards are M{i}, M{i+n}, M{i+2n}... so the IDs are globally unique, and the shard of an agent is its ID modulo M{n}.
+
+A C{L{ShardedKernel}} coordinates the shards with synchronized ticks. At each tick, every shard activates its agents in parallel. The messages between agents of the same shard are delivered at once, like in a single kernel; the messages for other shards are batched, sent back to the coordinator with the end of the tick, and delivered at the beginning of the next tick: one pipe round trip per shard and per tick, whatever the number of messages.
+
+    >>> kernel = ShardedKernel(shards=4)
+    >>> for i in range(100000):
+    ...     kernel.addAgent(Walker())
+    >>> kernel.run(1000)
+    >>> kernel.stopKernel()
+
+@note: The agents and the messages are pickled to be sent to the shards: their classes must be importable by the worker processes (not defined in the main script on the platforms which cannot fork). The sharded kernel needs the C{multiprocessing} module (Python 2.6 or later).
+@author: Damien Boucard
+@version: 0.3
+"""
+from kernel import Kernel
+from message import Topic
+from scheduler import Activator
+import traceback
+
+try:
+    import multiprocessing
+except ImportError:
+    multiprocessing = None
+
+class ShardKernel(Kernel):
+    """ Subclass of C{L{Kernel}} which runs a shard of a C{L{ShardedKernel}}. It allocates the IDs of the shard, delivers the messages to its own agents, and keeps the other ones in an outbox, to be routed by the coordinator.
+    
+    The broadcast messages are delivered to the agents of the shard, and kept in the outbox to be delivered to the agents of the other shards.
+    @ivar index: Index of the shard.
+    @type index: C{int}
+    @ivar shards: Number of shards.
+    @type shards: C{int}
+    @ivar __counter: Number of IDs allocated by the shard.
+    @type __counter: C{int}
+    @ivar __outbox: Messages for the other shards, in sending order. List of couples which contain a broadcast flag and a message.
+    @type __outbox: C{list<(bool, L{Message})>}
+    """
+    def __init__(self, index, shards):
+        """ Shard kernel constructor.
+        @param index: Index of the shard.
+        @type index: C{int}
+        @param shards: Number of shards.
+        @type shards: C{int}
+        """
+        Kernel.__init__(self, shards, index)
+        self.index = index
+        self.shards = shards
+        self.__counter = 0
+        self.__outbox = []
+    
+    def newAgentId(self):
+        """ Allocates the ID of a new agent of the shard.
+        @return: An ID which modulo the number of shards is the index of the shard.
+        @rtype: C{int}
+        """
+        id = self.__counter * self.shards + self.index
+        self.__counter = self.__counter + 1
+        return id
+    
+    def sendMessage(self, message):
+        """ Sends a message from an agent to another agent, of this shard or of another one.
+        @param message: Message to send.
+        @type message: C{L{Message}}
+        """
+        receiver = message.receiver
+        if isinstance(receiver, (int, long)) and receiver % self.shards != self.index:
+            self.__outbox.append((False, message))
+        else:
+            Kernel.sendMessage(self, message)
+    
+    def sendBroadcastMessage(self, message):
+        """ Sends a message from an agent to all the agents of a role, or of several roles, in all the shards.
+        @param message: Message to send.
+        @type message: C{L{Message}}
+        """
+        self.__outbox.append((True, message))
+        return Kernel.sendBroadcastMessage(self, message)
+    
+    def deliverMessages(self, held):
+        """ Delivers messages to the agents of this shard only: messages which have been held, or messages from the other shards.
+        @param held: The messages. List of couples which contain a broadcast flag and a message.
+        @type held: C{list<(bool, L{Message})>}
+        """
+        for broadcast, message in held:
+            if broadcast:
+                Kernel.sendBroadcastMessage(self, message)
+            else:
+                Kernel.sendMessage(self, message)
+    
+    def takeOutbox(self):
+        """ Takes the messages for the other shards sent since the last call.
+        @return: The messages, in sending order. List of couples which contain a broadcast flag and a message.
+        @rtype: C{list<(bool, L{Message})>}
+        """
+        outbox = self.__outbox
+        self.__outbox = []
+        return outbox
+
+def serveShard(connection, index, shards, activator):
+    """ Main function of a shard process: runs the commands of the coordinator until it asks to stop.
+    @param connection: End of the pipe to the coordinator.
+    @type connection: C{multiprocessing.Connection}
+    @param index: Index of the shard.
+    @type index: C{int}
+    @param shards: Number of shards.
+    @type shards: C{int}
+    @param activator: Activator of the agents of the shard.
+    @type activator: C{L{Activator}}
+    """
+    kernel = ShardKernel(index, shards)
+    activator.kernel = kernel
+    while True:
+        command = connection.recv()
+        try:
+            if command[0] == "tick":
+                kernel.deliverMessages(command[1])
+                activator.activate()
+                result = kernel.takeOutbox()
+            elif command[0] == "add":
+                agent = command[1]
+                kernel.addAgent(agent, command[2])
+                result = kernel.getAgentId(agent)
+            elif command[0] == "call":
+                result = getattr(kernel, command[1])(*command[2])
+            else:
+                activator.stop()
+                kernel.stopKernel()
+                connection.send(("ok", None))
+                break
+            connection.send(("ok", result))
+        except Exception:
+            connection.send(("error", traceback.format_exc()))
+    connection.close()
+
+class ShardedKernel(object):
+    """ It is the coordinator of a kernel partitioned across worker processes, one per shard. It launches the agents in the shards, routes the messages between the shards, and runs synchronized ticks.
+    
+    The coordinator has no agent: the agents are handled with their ID, and most kernel methods can be called on a shard with C{L{call}}, or on all of them with C{L{callAll}}.
+    @ivar shards: Number of shards.
+    @type shards: C{int}
+    @ivar ticks: Number of ticks run since the kernel was created.
+    @type ticks: C{int}
+    @ivar __processes: Worker processes, one per shard.
+    @type __processes: C{list<multiprocessing.Process>}
+    @ivar __connections: Ends of the pipes to the shards.
+    @type __connections: C{list<multiprocessing.Connection>}
+    @ivar __inboxes: Messages to deliver to each shard at the next tick. Lists of couples which contain a broadcast flag and a message.
+    @type __inboxes: C{list<list<(bool, L{Message})>>}
+    @ivar __next: Index of the shard where the next agent is launched, if not given.
+    @type __next: C{int}
+    """
+    def __init__(self, shards=None, activator=None):
+        """ Sharded kernel constructor. Starts the worker processes.
+        @param shards: Number of shards (if C{None}, one per processor).
+        @type shards: C{int}
+        @param activator: Activator used by each shard at each tick, pickled to be sent to the shards (if C{None}, a sequential C{L{Activator}} of the common role is used).
+        @type activator: C{L{Activator}}
+        @raise RuntimeError: if the C{multiprocessing} module is not available.
+        """
+        if multiprocessing == None:
+            raise RuntimeError("The sharded kernel needs the multiprocessing module (Python 2.6 or later)")
+        if shards == None:
+            shards = multiprocessing.cpu_count()
+        if activator == None:
+            activator = Activator()
+        self.shards = shards
+        self.ticks = 0
+        self.__processes = []
+        self.__connections = []
+        self.__inboxes = [[] for i in range(shards)]
+        self.__next = 0
+        for index in range(shards):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=serveShard, args=(child, index, shards, activator))
+            process.daemon = True
+            process.start()
+            child.close()
+            self.__processes.append(process)
+            self.__connections.append(parent)
+    
+    def shardOf(self, agentId):
+        """ Gets the shard of an agent.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        @return: The index of the shard.
+        @rtype: C{int}
+        """
+        return agentId % self.shards
+    
+    def addAgent(self, agent, name="unamed", shard=None):
+        """ Launchs an agent in a shard. The agent is pickled: the given instance is not the launched one.
+        @param agent: Agent to launch.
+        @type agent: C{L{Agent}}
+        @param name: Name of the agent in the white pages of the shard (Optional).
+        @type name: C{str}
+        @param shard: Index of the shard (if C{None}, the agents are spread over the shards in turn).
+        @type shard: C{int}
+        @return: The ID of the launched agent.
+        @rtype: C{int}
+        """
+        if shard == None:
+            shard = self.__next
+            self.__next = (shard + 1) % self.shards
+        self.__connections[shard].send(("add", agent, name))
+        return self.__receive(shard)
+    
+    def removeAgent(self, agentId):
+        """ Kills an agent from its shard.
+        @param agentId: ID of the killed agent.
+        @type agentId: C{int}
+        """
+        self.call(self.shardOf(agentId), "removeAgent", agentId)
+    
+    def call(self, shard, method, *arg):
+        """ Calls a method of the kernel of a shard.
+        @param shard: Index of the shard.
+        @type shard: C{int}
+        @param method: Name of the method.
+        @type method: C{str}
+        @param arg: Arguments of the method, pickled to be sent to the shard.
+        @return: The value returned by the method, pickled to be sent back.
+        @raise ShardError: if the method raises an error.
+        """
+        self.__connections[shard].send(("call", method, arg))
+        return self.__receive(shard)
+    
+    def callAll(self, method, *arg):
+        """ Calls a method of the kernel of every shard, in parallel.
+        @param method: Name of the method.
+        @type method: C{str}
+        @param arg: Arguments of the method, pickled to be sent to the shards.
+        @return: The values returned by the method, in shard order.
+        @rtype: C{list}
+        @raise ShardError: if the method raises an error.
+        """
+        for connection in self.__connections:
+            connection.send(("call", method, arg))
+        return self.__receiveAll()
+    
+    def getAgentsWith(self, role=None, group=None):
+        """ Gets all the agent having the given role, in all the shards.
+        @param role: Role in which the agents are wanted (if C{group} and C{role} equal C{None}, the common role is used).
+        @type role: C{str}
+        @param group: Group of the concerned role (if C{None}, the common group is used).
+        @type group: C{str}
+        @return: A collection of agent IDs, in shard order.
+        @rtype: C{list<int>}
+        """
+        ids = []
+        for shardIds in self.callAll("getAgentsWith", role, group):
+            ids.extend(shardIds)
+        return ids
+    
+    def requestRole(self, agentId, role=None, group=None):
+        """ Adds an agent into a role. See C{L{Kernel.requestRole}}. """
+        self.call(self.shardOf(agentId), "requestRole", agentId, role, group)
+    
+    def leaveRole(self, agentId, role=None, group=None):
+        """ Removes an agent from a role. See C{L{Kernel.leaveRole}}. """
+        self.call(self.shardOf(agentId), "leaveRole", agentId, role, group)
+    
+    def subscribe(self, agentId, topic):
+        """ Subscribes an agent to a topic. See C{L{Kernel.subscribe}}. """
+        self.requestRole(agentId, topic, Kernel.TOPICS)
+    
+    def unsubscribe(self, agentId, topic):
+        """ Unsubscribes an agent from a topic. See C{L{Kernel.unsubscribe}}. """
+        self.leaveRole(agentId, topic, Kernel.TOPICS)
+    
+    def sendMessage(self, message):
+        """ Sends a message to an agent. It is delivered at the beginning of the next tick.
+        @param message: Message to send.
+        @type message: C{L{Message}}
+        """
+        self.__inboxes[self.shardOf(message.receiver)].append((False, message))
+    
+    def sendBroadcastMessage(self, message):
+        """ Sends a message to all the agents of a role, or of several roles (see C{L{Kernel.sendBroadcastMessage}}), in all the shards. It is delivered at the beginning of the next tick.
+        @param message: Message to send.
+        @type message: C{L{Message}}
+        """
+        for inbox in self.__inboxes:
+            inbox.append((True, message))
+    
+    def publish(self, message, topic=None):
+        """ Sends a message to the agents subscribed to a topic (see C{L{Kernel.publish}}), in all the shards. It is delivered at the beginning of the next tick.
+        @param message: Message to publish.
+        @type message: C{L{Message}}
+        @param topic: Topic of the message (if C{None}, the topics are given by the message).
+        @type topic: any hashable
+        """
+        message.receiver = Topic(topic)
+        self.sendBroadcastMessage(message)
+    
+    def tick(self):
+        """ Runs a tick: each shard delivers the messages routed to it, then activates its agents, in parallel with the other shards. The messages sent to the other shards are routed, to be delivered at the next tick.
+        @return: The number of messages routed between the shards.
+        @rtype: C{int}
+        @raise ShardError: if an agent raises an error.
+        """
+        inboxes = self.__inboxes
+        self.__inboxes = [[] for i in range(self.shards)]
+        for shard in range(self.shards):
+            self.__connections[shard].send(("tick", inboxes[shard]))
+        routed = 0
+        outboxes = self.__receiveAll()
+        for shard in range(self.shards):
+            outbox = outboxes[shard]
+            routed = routed + len(outbox)
+            for broadcast, message in outbox:
+                if broadcast:
+                    for other in range(self.shards):
+                        if other != shard:
+                            self.__inboxes[other].append((True, message))
+                else:
+                    self.__inboxes[self.shardOf(message.receiver)].append((False, message))
+        self.ticks = self.ticks + 1
+        return routed
+    
+    def run(self, ticks):
+        """ Runs ticks.
+        @param ticks: Number of ticks to run.
+        @type ticks: C{int}
+        """
+        for i in xrange(ticks):
+            self.tick()
+    
+    def stopKernel(self):
+        """ Kills all the agents of all the shards, and stops the worker processes. """
+        for connection in self.__connections:
+            connection.send(("stop",))
+        try:
+            self.__receiveAll()
+        finally:
+            for shard in range(self.shards):
+                self.__connections[shard].close()
+                self.__processes[shard].join()
+            self.__connections = []
+            self.__processes = []
+    
+    def __receive(self, shard):
+        """ Receives the result of a command sent to a shard.
+        @param shard: Index of the shard.
+        @type shard: C{int}
+        @return: The result.
+        @raise ShardError: if the command raised an error in the shard.
+        """
+        status, result = self.__connections[shard].recv()
+        if status == "error":
+            raise ShardError("Error in shard %d:\n%s" %(shard, result))
+        return result
+        
+    def __receiveAll(self):
+        """ Receives the results of a command sent to every shard. All the results are received before raising an error, so the pipes stay in sync.
+        @return: The results, in shard order.
+        @rtype: C{list}
+        @raise ShardError: if the command raised an error in a shard (the error of the first one is raised).
+        """
+        replies = [connection.recv() for connection in self.__connections]
+        for shard in range(self.shards):
+            status, result = replies[shard]
+            if status == "error":
+                raise ShardError("Error in shard %d:\n%s" %(shard, result))
+        return [result for status, result in replies]
+
+class ShardError(Exception):
+    """ Error raised by the coordinator of a C{L{ShardedKernel}} when a command raises an error in a shard. The traceback of the shard is attached to the error. """
+    pass
@@ -0,0 +1,321 @@
+"""
+Traces: recording what happens in a kernel in a compact binary file, and replaying it offline.
+
+A C{L{Tracer}} set as the C{tracer} of a kernel records every message sent or broadcast (when it is delivered), every role change, the launched and killed agents, and the tick boundaries of the schedulers. The records are encoded with C{L{codec}} and written by batches, so tracing costs little more than encoding the messages.
+
+    >>> kernel.tracer = Tracer("run.trc")
+    >>> scheduler.run(1000)
+    >>> kernel.tracer.close()
+
+A C{L{Replayer}} re-feeds a trace into a fresh kernel, to reproduce the traffic of a run, check it or profile the kernel offline. The trace is read through a memory-mapped file when C{mmap} is available.
+
+File format (version 1): the 8 bytes C{L{MAGIC}}, a version byte, the version byte of the codec, then records. A record is a kind byte (see C{L{KINDS}}) followed by a value encoded with C{L{codec.encode}}. A trace cut by a crash ends with a truncated record, reported after the complete ones have been read.
+@author: Damien Boucard
+@version: 0.3
+"""
+from agent import Agent
+from kernel import Kernel
+import codec
+import thread
+
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+MAGIC = "PYSMATRC"
+VERSION = 1
+
+TICK = "K"
+SEND = "S"
+BROADCAST = "B"
+JOIN = "J"
+LEAVE = "Q"
+LAUNCH = "L"
+KILL = "X"
+KINDS = {TICK: "tick", SEND: "send", BROADCAST: "broadcast", JOIN: "join", LEAVE: "leave", LAUNCH: "launch", KILL: "kill"}
+""" Names of the record kinds. The values of the records are: the tick number (tick), the message (send, broadcast), the agent ID, role and group (join, leave), the agent IDs, class paths ("module.Class"), name and parent ID (launch), and the agent IDs (kill). """
+
+def readTrace(path):
+    """ Reads the records of a trace file.
+    @param path: Path of the trace file.
+    @type path: C{str}
+    @return: An iterator over the records, in writing order. Each one is a couple which contains a kind (see C{L{KINDS}}) and a value.
+    @rtype: iterator
+    @raise TraceError: if the file is not a valid trace, or when the iteration reaches a truncated record.
+    """
+    file = open(path, "rb")
+    size = len(MAGIC) + 2
+    header = file.read(size)
+    if header[:len(MAGIC)] != MAGIC:
+        file.close()
+        raise TraceError("Not a trace file: %s" %path)
+    if ord(header[len(MAGIC)]) != VERSION or ord(header[len(MAGIC)+1]) != codec.VERSION:
+        file.close()
+        raise TraceError("Unsupported trace version: %s" %path)
+    file.seek(0, 2)
+    if mmap != None and file.tell() > size:
+        data = mmap.mmap(file.fileno(), file.tell(), access=mmap.ACCESS_READ)
+    else:
+        file.seek(0)
+        data = file.read()
+    file.close()
+    return _records(data, size, path)
+
+def _records(data, offset, path):
+    """ Iterates over the records of a trace, from a given position. """
+    end = len(data)
+    decode = codec.decode
+    while offset < end:
+        kind = data[offset]
+        try:
+            value, offset = decode(data, offset + 1)
+        except Exception:
+            raise TraceError("Truncated trace at byte %d: %s" %(offset, path))
+        yield kind, value
+    if mmap != None and isinstance(data, mmap.mmap):
+        data.close()
+
+class Tracer(object):
+    """ It records what happens in a kernel in a trace file, when it is set as the C{tracer} of the kernel. The records are encoded at once, since the messages may be changed or recycled once delivered, then written by batches. The tracer can be used from several threads.
+    @ivar path: Path of the trace file.
+    @type path: C{str}
+    @ivar bufferSize: Number of records written together.
+    @type bufferSize: C{int}
+    @ivar records: Number of records since the tracer was created.
+    @type records: C{int}
+    @ivar ticks: Number of ticks recorded.
+    @type ticks: C{int}
+    @ivar __file: The trace file, C{None} once closed.
+    @type __file: C{file}
+    @ivar __parts: Encoded records which are not written yet.
+    @type __parts: C{list<str>}
+    @ivar __pending: Number of records in C{__parts}.
+    @type __pending: C{int}
+    @ivar __lock: Lock which protects C{__parts}.
+    @type __lock: C{thread.LockType}
+    """
+    def __init__(self, path, bufferSize=4096):
+        """ Tracer constructor. Creates the trace file.
+        @param path: Path of the trace file, replaced if it already exists.
+        @type path: C{str}
+        @param bufferSize: Number of records written together.
+        @type bufferSize: C{int}
+        """
+        self.path = path
+        self.bufferSize = bufferSize
+        self.records = 0
+        self.ticks = 0
+        self.__file = open(path, "wb")
+        self.__file.write(MAGIC + chr(VERSION) + chr(codec.VERSION))
+        self.__parts = []
+        self.__pending = 0
+        self.__lock = thread.allocate_lock()
+    
+    def tick(self):
+        """ Records the beginning of a tick. Called by the schedulers. """
+        self.ticks = self.ticks + 1
+        self.__record(TICK, self.ticks)
+    
+    def send(self, message):
+        """ Records a message delivered to an agent. Called by the kernel.
+        @param message: The message.
+        @type message: C{L{Message}}
+        """
+        self.__record(SEND, message)
+    
+    def broadcast(self, message):
+        """ Records a message delivered to the agents of one or several roles, or to the subscribers of a topic. Called by the kernel.
+        @param message: The message.
+        @type message: C{L{Message}}
+        """
+        self.__record(BROADCAST, message)
+    
+    def join(self, agentId, role, group):
+        """ Records an agent which has joined a role. Called by the kernel.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        @param role: The role.
+        @type role: C{str}
+        @param group: Group of the role.
+        @type group: C{str}
+        """
+        self.__record(JOIN, (agentId, role, group))
+    
+    def leave(self, agentId, role, group):
+        """ Records an agent which has left a role. Called by the kernel.
+        @param agentId: ID of the agent.
+        @type agentId: C{int}
+        @param role: The role.
+        @type role: C{str}
+        @param group: Group of the role.
+        @type group: C{str}
+        """
+        self.__record(LEAVE, (agentId, role, group))
+    
+    def launch(self, ids, agents, name, parentId):
+        """ Records launched agents, before their C{born} method is called. Called by the kernel.
+        @param ids: IDs of the agents.
+        @type ids: C{list<int>}
+        @param agents: The agents.
+        @type agents: C{list<L{Agent}>}
+        @param name: Name of the agents.
+        @type name: C{str}
+        @param parentId: ID of their parent agent, C{None} if they have none.
+        @type parentId: C{int}
+        """
+        classes = ["%s.%s" %(agent.__class__.__module__, agent.__class__.__name__) for agent in agents]
+        self.__record(LAUNCH, (list(ids), classes, name, parentId))
+    
+    def kill(self, ids):
+        """ Records killed agents. Called by the kernel.
+        @param ids: IDs of the agents.
+        @type ids: C{list<int>}
+        """
+        self.__record(KILL, list(ids))
+    
+    def __record(self, kind, value):
+        """ Encodes a record, and writes the batch if it is full.
+        @param kind: Kind of the record.
+        @type kind: C{str}
+        @param value: Value of the record.
+        """
+        self.__lock.acquire()
+        try:
+            if self.__file == None:
+                return
+            parts = self.__parts
+            parts.append(kind)
+            codec.encode(value, parts)
+            self.records = self.records + 1
+            self.__pending = self.__pending + 1
+            if self.__pending >= self.bufferSize:
+                self.__write()
+        finally:
+            self.__lock.release()
+    
+    def __write(self):
+        """ Writes the pending records. Called with the lock held. """
+        self.__file.write("".join(self.__parts))
+        self.__parts = []
+        self.__pending = 0
+    
+    def flush(self):
+        """ Writes the pending records and flushes the file. """
+        self.__lock.acquire()
+        try:
+            if self.__file != None:
+                self.__write()
+                self.__file.flush()
+        finally:
+            self.__lock.release()
+    
+    def close(self):
+        """ Writes the pending records and closes the file. Next records are ignored. """
+        self.__lock.acquire()
+        try:
+            if self.__file != None:
+                self.__write()
+                self.__file.close()
+                self.__file = None
+        finally:
+            self.__lock.release()
+
+class ReplayAgent(Agent):
+    """ Agent which stands for a traced agent during a replay. It only counts the messages it receives.
+    @ivar className: Class path ("module.Class") of the traced agent.
+    @type className: C{str}
+    @ivar received: Number of messages received.
+    @type received: C{int}
+    """
+    def __init__(self, className):
+        """ Replay agent constructor.
+        @param className: Class path of the traced agent.
+        @type className: C{str}
+        """
+        Agent.__init__(self)
+        self.className = className
+        self.received = 0
+    
+    def receiveMessage(self, message):
+        self.received = self.received + 1
+
+class Replayer(object):
+    """ It re-feeds a trace into a kernel: the traced agents are launched in the same order, join and leave the same roles, and the messages are sent again in the recorded order, without running the agents. The IDs of the replayed agents are mapped from the traced ones, so the kernel does not need to be fresh.
+    @ivar path: Path of the trace file.
+    @type path: C{str}
+    @ivar kernel: Kernel where the trace is replayed.
+    @type kernel: C{L{Kernel}}
+    @ivar factory: Function which creates the agent standing for a traced agent, from the class path of the traced agent.
+    @type factory: C{callable}
+    @ivar counts: Number of records replayed by kind (see C{L{KINDS}}).
+    @type counts: C{dict<str, int>}
+    @ivar ids: Replayed agent IDs by traced agent ID.
+    @type ids: C{dict<int, int>}
+    """
+    def __init__(self, path, kernel=None, factory=ReplayAgent):
+        """ Replayer constructor.
+        @param path: Path of the trace file.
+        @type path: C{str}
+        @param kernel: Kernel where the trace is replayed (if C{None}, a new kernel is created).
+        @type kernel: C{L{Kernel}}
+        @param factory: Function which creates the agent standing for a traced agent, from its class path (by default, a C{L{ReplayAgent}}).
+        @type factory: C{callable}
+        """
+        if kernel == None:
+            kernel = Kernel()
+        self.path = path
+        self.kernel = kernel
+        self.factory = factory
+        self.counts = dict.fromkeys(KINDS.keys(), 0)
+        self.ids = {}
+    
+    def run(self, ticks=None, onTick=None):
+        """ Replays the trace.
+        @param ticks: Number of ticks after which the replay stops (if C{None}, the whole trace is replayed).
+        @type ticks: C{int}
+        @param onTick: Function called at each tick boundary with the tick number, e.g. to check the state of the agents.
+        @type onTick: C{callable}
+        @return: The number of records replayed.
+        @rtype: C{int}
+        @raise TraceError: if the trace is not valid.
+        """
+        kernel, ids, counts = self.kernel, self.ids, self.counts
+        replayed = 0
+        for kind, value in readTrace(self.path):
+            if kind == SEND or kind == BROADCAST:
+                value.sender = ids.get(value.sender, value.sender)
+                if kind == SEND:
+                    value.receiver = ids.get(value.receiver, -1)
+                    kernel.sendMessage(value)
+                else:
+                    kernel.sendBroadcastMessage(value)
+            elif kind == TICK:
+                if ticks != None and value > ticks:
+                    break
+                if onTick != None:
+                    onTick(value)
+            elif kind == JOIN or kind == LEAVE:
+                agentId, role, group = value
+                if agentId in ids:
+                    if kind == JOIN:
+                        kernel.requestRole(ids[agentId], role, group)
+                    else:
+                        kernel.leaveRole(ids[agentId], role, group)
+            elif kind == LAUNCH:
+                traced, classes, name, parent = value
+                agents = [self.factory(className) for className in classes]
+                replayedIds = kernel.addAgents(agents, name, kernel.getAgent(ids.get(parent, -1)))
+                for i in range(len(traced)):
+                    ids[traced[i]] = replayedIds[i]
+            elif kind == KILL:
+                kernel.removeAgents([ids.pop(id) for id in value if id in ids])
+            else:
+                raise TraceError("Unknown record kind %r: %s" %(kind, self.path))
+            counts[kind] = counts[kind] + 1
+            replayed = replayed + 1
+        return replayed
+
+class TraceError(Exception):
+    """ Error raised when a trace file cannot be read. """
+    pass
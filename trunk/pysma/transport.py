@@ -0,0 +1,265 @@
+"""
+Local transport of messages between processes, and proxy agents whose real agent runs in another process.
+
+A C{L{Transport}} carries batches of values encoded with C{L{codec}} over a stream socket: the values put in a batch are sent together in one frame. A C{L{ProxyAgent}} is launched in the kernel in place of an agent, which runs in a child process forked at launching: at each activation, the proxy sends the messages it has received to the agent in one frame, then the agent lives, and the operations it has done on its kernel (sending messages, changing roles, waking up) come back in one frame and are performed by the proxy.
+
+    >>> kernel.addAgent(ProxyAgent(MyAgent()))
+
+The child process is forked, so the proxies need C{os.fork} and C{socket.socketpair} (Unix). The messages and their contents must be encodable by C{L{codec}}; the values which have no tag of their own are pickled, so only agents of the same program must be connected.
+@author: Damien Boucard
+@version: 0.3
+"""
+from agent import Agent
+import codec
+import os, socket, struct, traceback
+
+class Transport(object):
+    """ It is a connection which carries batches of values over a stream socket, like an end of C{socket.socketpair()}. Each frame is a 4-byte big-endian length followed by the list of the values of a batch, encoded with C{L{codec.dumps}}.
+    @ivar socket: The connected socket.
+    @type socket: C{socket.socket}
+    @ivar __batch: Values put since the last frame was sent.
+    @type __batch: C{list}
+    @ivar __buffer: Received data which has not been decoded yet.
+    @type __buffer: C{str}
+    """
+    def __init__(self, sock):
+        """ Transport constructor.
+        @param sock: A connected stream socket.
+        @type sock: C{socket.socket}
+        """
+        self.socket = sock
+        self.__batch = []
+        self.__buffer = ""
+    
+    def put(self, value):
+        """ Adds a value to the batch, which is sent by the next C{L{flush}}.
+        @param value: A value encodable by C{L{codec}}.
+        """
+        self.__batch.append(value)
+    
+    def flush(self):
+        """ Sends the values of the batch in one frame, if any.
+        @raise CodecError: if a value cannot be encoded.
+        """
+        if self.__batch:
+            data = codec.dumps(self.__batch)
+            self.__batch = []
+            self.socket.sendall(struct.pack(">I", len(data)) + data)
+    
+    def send(self, value):
+        """ Sends a value, with the values put before it in the batch.
+        @param value: A value encodable by C{L{codec}}.
+        """
+        self.put(value)
+        self.flush()
+    
+    def receive(self):
+        """ Waits for the next frame.
+        @return: The values of the frame, in sending order.
+        @rtype: C{list}
+        @raise TransportError: if the connection has been closed by the other end.
+        @raise CodecError: if the frame cannot be decoded.
+        """
+        header = self.__read(4)
+        return codec.loads(self.__read(struct.unpack(">I", header)[0]))
+    
+    def __read(self, size):
+        """ Reads data from the socket.
+        @param size: Number of bytes to read.
+        @type size: C{int}
+        @return: The data.
+        @rtype: C{str}
+        @raise TransportError: if the connection is closed before.
+        """
+        while len(self.__buffer) < size:
+            data = self.socket.recv(max(65536, size - len(self.__buffer)))
+            if not data:
+                raise TransportError("Connection closed")
+            self.__buffer = self.__buffer + data
+        data = self.__buffer[:size]
+        self.__buffer = self.__buffer[size:]
+        return data
+    
+    def close(self):
+        """ Closes the connection. """
+        self.socket.close()
+
+def pair():
+    """ Creates two connected transports.
+    @return: The two ends.
+    @rtype: C{(L{Transport}, L{Transport})}
+    """
+    first, second = socket.socketpair()
+    return Transport(first), Transport(second)
+
+class RemoteKernel(object):
+    """ It stands for the kernel of an agent running in another process than its proxy. The operations the agent does on its kernel are recorded, then sent to the proxy, which performs them in the real kernel.
+    @cvar OPERATIONS: Kernel methods which can be called by the agent. They return nothing.
+    @type OPERATIONS: C{tuple<str>}
+    @cvar metrics: The agent cannot be measured in its process: always C{None}, like the C{metrics} of a kernel without instrumentation.
+    @type metrics: C{L{Metrics}}
+    @cvar tracer: The agent cannot be traced in its process: always C{None}, like the C{tracer} of a kernel without tracer.
+    @type tracer: C{L{Tracer}}
+    @ivar agentId: ID of the proxy in the real kernel, which is the ID of the agent.
+    @type agentId: C{int}
+    @ivar operations: Operations recorded since the last activation. List of couples which contain a method name and its arguments.
+    @type operations: C{list<(str, tuple)>}
+    """
+    OPERATIONS = ("sendMessage", "sendNamedMessage", "sendBroadcastMessage", "sendMulticastMessage", "publish",
+                  "requestRole", "leaveRole", "subscribe", "unsubscribe", "wake", "touch")
+    metrics = None
+    tracer = None
+    
+    def __init__(self, agentId):
+        """ Remote kernel constructor.
+        @param agentId: ID of the proxy in the real kernel.
+        @type agentId: C{int}
+        """
+        self.agentId = agentId
+        self.operations = []
+    
+    def getAgentId(self, agent):
+        """ Gets the ID of the agent, which is the ID of its proxy.
+        @param agent: The agent.
+        @type agent: C{L{Agent}}
+        @return: The ID.
+        @rtype: C{int}
+        """
+        return self.agentId
+    
+    def __getattr__(self, name):
+        if name not in self.OPERATIONS:
+            raise AttributeError("%s is not available to a remote agent" %name)
+        operations = self.operations
+        def record(*arg):
+            operations.append((name, arg))
+        return record
+
+def serveAgent(transport, agent):
+    """ Runs an agent for its proxy, until the proxy kills it or closes the connection. Called in the child process.
+
+    The commands of the proxy are tuples: ("born", agent ID), ("live", received messages) and ("die",). The reply to each one is ("done", operations, returned value), or ("error", traceback) if the agent has raised an error (then the operations it has done during the command are dropped). A command received before "born" is rejected with an error reply, since the agent has no kernel yet.
+    @param transport: Connection to the proxy.
+    @type transport: C{L{Transport}}
+    @param agent: The agent.
+    @type agent: C{L{Agent}}
+    """
+    kernel = None
+    while True:
+        try:
+            commands = transport.receive()
+        except TransportError:
+            return
+        for command in commands:
+            if kernel == None and command[0] != "born":
+                transport.send(("error", "Command %r received before born" %(command[0],)))
+                continue
+            try:
+                if command[0] == "born":
+                    kernel = RemoteKernel(command[1])
+                    agent.kernel = kernel
+                    result = agent.born()
+                elif command[0] == "live":
+                    for message in command[1]:
+                        agent.receiveMessage(message)
+                    result = agent.live()
+                else:
+                    result = agent.die()
+                transport.send(("done", kernel.operations, result))
+            except Exception:
+                transport.send(("error", traceback.format_exc()))
+            if kernel != None:
+                kernel.operations = []
+            if command[0] == "die":
+                return
+
+class ProxyAgent(Agent):
+    """ It is an agent of the kernel whose real agent runs in a child process, forked when the proxy is launched. Each activation of the proxy is a round trip: the messages received by the proxy are sent to the agent in one frame, the agent lives, then the operations it has done on its kernel come back in one frame and are performed by the proxy, in order. The agent has the ID of its proxy.
+    
+    The agent only gets a C{L{RemoteKernel}}: it can send messages, change its roles and wake up, but it cannot read the kernel. The proxy cannot be saved in a checkpoint.
+    @ivar agent: The agent, until the proxy is launched (then it only lives in the child process).
+    @type agent: C{L{Agent}}
+    @ivar pid: Process ID of the child process, C{None} while it is not running.
+    @type pid: C{int}
+    @ivar __transport: Connection to the child process.
+    @type __transport: C{L{Transport}}
+    """
+    def __init__(self, agent):
+        """ Proxy agent constructor.
+        @param agent: The agent to run in a child process.
+        @type agent: C{L{Agent}}
+        @raise RuntimeError: if processes cannot be forked on this platform.
+        """
+        Agent.__init__(self)
+        if not hasattr(os, "fork") or not hasattr(socket, "socketpair"):
+            raise RuntimeError("Proxy agents need os.fork and socket.socketpair")
+        self.agent = agent
+        self.pid = None
+        self.__transport = None
+    
+    def born(self):
+        """ Forks the child process, then runs the C{born} method of the agent. """
+        parentEnd, childEnd = socket.socketpair()
+        pid = os.fork()
+        if pid == 0:
+            parentEnd.close()
+            status = 0
+            try:
+                try:
+                    serveAgent(Transport(childEnd), self.agent)
+                except:
+                    traceback.print_exc()
+                    status = 1
+            finally:
+                os._exit(status)
+        childEnd.close()
+        self.pid = pid
+        self.agent = None
+        self.__transport = Transport(parentEnd)
+        self.__call(("born", self.id))
+    
+    def live(self):
+        """ Sends the received messages to the agent and runs its C{live} method.
+        @return: The value returned by the C{live} method of the agent.
+        @raise RemoteAgentError: if the agent has raised an error.
+        """
+        return self.__call(("live", self.drainMessages()))
+    
+    def die(self):
+        """ Runs the C{die} method of the agent, then waits for the end of the child process. """
+        if self.__transport == None:
+            return
+        try:
+            self.__call(("die",))
+        finally:
+            self.__transport.close()
+            self.__transport = None
+            os.waitpid(self.pid, 0)
+            self.pid = None
+    
+    def __call(self, command):
+        """ Sends a command to the agent, then performs the operations it has done.
+        @param command: The command.
+        @type command: C{tuple}
+        @return: The value returned by the agent.
+        @raise RemoteAgentError: if the agent has raised an error.
+        """
+        self.__transport.send(command)
+        try:
+            reply = self.__transport.receive()[0]
+        except TransportError:
+            raise RemoteAgentError("The process of agent #%s has ended" %self.id)
+        if reply[0] == "error":
+            raise RemoteAgentError(reply[1])
+        kernel = self.kernel
+        for name, arg in reply[1]:
+            getattr(kernel, name)(*arg)
+        return reply[2]
+
+class TransportError(Exception):
+    """ Error raised when a connection has been closed by the other end. """
+    pass
+
+class RemoteAgentError(Exception):
+    """ Error raised by a proxy when its agent has raised an error, or when its process has ended. Its message is the traceback of the agent. """
+    pass
@@ -2,18 +2,54 @@
 @author: Damien Boucard
 @version: 0.3
 """
+from indexedSet import IndexedSet
+
 class WhitePages(object):
     """ It is a system which references all agent ids.
-    @ivar __directory: Dictionnary which references agents and their ID.
-    @type __directory: C{dict<int, dict<str, any>>}
+    
+    The agents are stored in a list indexed by their ID, so getting an agent is an index operation. The IDs of the killed agents are never reused (the kernel never gives the same ID twice, and a message sent to a killed agent must not reach a newer one): their slot stays C{None}, which costs one reference per ID affected since the creation of the kernel. The names and the parents are only stored when they are given.
+    
+    A kernel which allocates strided IDs (see C{L{ShardKernel}}) only registers the IDs whose remainder by the stride is its offset: the list is indexed by the local ID, C{id / stride}, so it does not grow with the IDs of the other kernels.
+    @cvar defaultName: Name of the agents launched without name, which is not stored.
+    @type defaultName: C{str}
+    @ivar stride: Step between the IDs of the registered agents (Read only).
+    @type stride: C{int}
+    @ivar offset: Remainder of the IDs of the registered agents by C{stride} (Read only).
+    @type offset: C{int}
+    @ivar agents: Table of the agents indexed by their local ID, C{id / stride} (their ID if the stride is 1), with C{None} for the IDs which are not affected or whose agent has been killed. It grows in place and is never replaced, so a reference to it can be kept (Read only).
+    @type agents: C{list<L{Agent}>}
     @ivar __reverse: A reverse directory in order to retrieve an ID with an agent object.
     @type __reverse: C{dict<L{Agent}, int>}
+    @ivar __names: Names of the agents which have not the default name. Dictionnary of agent IDs which point to their name.
+    @type __names: C{dict<int, str>}
+    @ivar __parents: Parents of the agents which have one. Dictionnary of agent IDs which point to the agent which launched them.
+    @type __parents: C{dict<int, L{Agent}>}
+    @ivar __named: Index of the agents by name (except the default one). Dictionnary of names which point to the IDs of the agents, in registering order.
+    @type __named: C{dict<str, L{IndexedSet}<int>>}
+    @ivar __namedCopies: Immutable copies of the entries of C{__named}, made at the first read after a change of the name.
+    @type __namedCopies: C{dict<str, tuple<int>>}
+    @ivar __children: Index of the agents by parent. Dictionnary of registered agent IDs which point to the IDs of the agents they have launched, in registering order.
+    @type __children: C{dict<int, L{IndexedSet}<int>>}
     """
-    def __init__(self):
-        """ White page constructor """
-        self.__directory = {}
+    defaultName = "unamed"
+    
+    def __init__(self, stride=1, offset=0):
+        """ White page constructor
+        @param stride: Step between the IDs of the registered agents.
+        @type stride: C{int}
+        @param offset: Remainder of the IDs of the registered agents by C{stride}.
+        @type offset: C{int}
+        """
+        self.stride = stride
+        self.offset = offset
+        self.agents = []
         self.__reverse = {}
-        
+        self.__names = {}
+        self.__parents = {}
+        self.__named = {}
+        self.__namedCopies = {}
+        self.__children = {}
+    
     def register(self, id, agent, name, parent):
         """ Registers a new agent in the directory.
         @param id: ID of the agent, affected by the kernel.
@@ -24,26 +60,63 @@ class WhitePages(object):
         @type name: C{str}
         @param parent: Agent which launched the agent.
         @type parent: C{L{Agent}}
+        @raise ValueError: if the remainder of the ID by the stride is not the offset.
         """
-        if id not in self.__directory:
-            dico = {"agent": agent}
-            if name!=None:
-                dico["name"] = name
-            if parent!=None:
-                dico["parent"] = parent
-            self.__directory[id] = dico
-            self.__reverse[agent] = id
-            
+        index, rest = divmod(id, self.stride)
+        if rest != self.offset:
+            raise ValueError("Agent ID %s is not allocated by this kernel" %id)
+        agents = self.agents
+        if index >= len(agents):
+            agents.extend([None] * (index + 1 - len(agents)))
+        elif agents[index] != None:
+            return
+        agents[index] = agent
+        self.__reverse[agent] = id
+        if name != self.defaultName:
+            self.__names[id] = name
+            named = self.__named.get(name)
+            if named == None:
+                self.__named[name] = IndexedSet((id,))
+            else:
+                named.add(id)
+            self.__namedCopies.pop(name, None)
+        if parent != None:
+            self.__parents[id] = parent
+            parentId = self.__reverse.get(parent)
+            if parentId != None:
+                children = self.__children.get(parentId)
+                if children == None:
+                    self.__children[parentId] = IndexedSet((id,))
+                else:
+                    children.add(id)
+    
     def unregister(self, agentId):
         """ Unregisters an agent from the directory.
         @param agentId: ID of the agent.
         @type agentId: C{int}
         """
-        if agentId in self.__directory:
-            agent = self.__directory[agentId]["agent"]
-            del self.__directory[agentId]
-            del self.__reverse[agent]
-                
+        agent = self.getAgent(agentId)
+        if agent == None:
+            return
+        self.agents[agentId // self.stride] = None
+        del self.__reverse[agent]
+        if agentId in self.__names:
+            name = self.__names.pop(agentId)
+            named = self.__named[name]
+            named.discard(agentId)
+            if not named:
+                del self.__named[name]
+            self.__namedCopies.pop(name, None)
+        if agentId in self.__parents:
+            parentId = self.__reverse.get(self.__parents.pop(agentId))
+            children = self.__children.get(parentId)
+            if children != None:
+                children.discard(agentId)
+                if not children:
+                    del self.__children[parentId]
+        if agentId in self.__children:
+            del self.__children[agentId]
+    
     def getAgent(self, id):
         """ Gets the agent corresponding to the given ID.
         @param id: ID of the wanted agent.
@@ -51,8 +124,14 @@ class WhitePages(object):
         @return: The corresponding agent or C{None} if the ID does not exist in the kernel, or if corresponding agent has been killed.
         @rtype: C{L{Agent}}
         """
-        return self.__directory.get(id, {"agent":None})["agent"]
-        
+        try:
+            index, rest = divmod(id, self.stride)
+            if index >= 0 and rest == self.offset:
+                return self.agents[index]
+        except (IndexError, TypeError):
+            pass
+        return None
+    
     def getId(self, agent):
         """ Gets the ID of a given agent.
         @param agent: Agent which ID is wanted.
@@ -61,3 +140,52 @@ class WhitePages(object):
         @rtype: C{int}
         """
         return self.__reverse.get(agent, None)
+    
+    def getName(self, id):
+        """ Gets the name of the agent corresponding to the given ID.
+        @param id: ID of the agent.
+        @type id: C{int}
+        @return: The name or C{None} if the agent has no name, or if the ID does not exist.
+        @rtype: C{str}
+        """
+        if id in self.__names:
+            return self.__names[id]
+        if self.getAgent(id) != None:
+            return self.defaultName
+        return None
+    
+    def getParent(self, id):
+        """ Gets the parent of the agent corresponding to the given ID.
+        @param id: ID of the agent.
+        @type id: C{int}
+        @return: The agent which launched it or C{None} if the agent has no parent, or if the ID does not exist.
+        @rtype: C{L{Agent}}
+        """
+        return self.__parents.get(id)
+    
+    def getAgentsNamed(self, name):
+        """ Gets the agents which have a given name.
+        @param name: Name of the agents.
+        @type name: C{str}
+        @return: Their IDs, in registering order (empty for the default name, which is not indexed). The same tuple is returned until an agent with this name is registered or unregistered.
+        @rtype: C{tuple<int>}
+        """
+        copy = self.__namedCopies.get(name)
+        if copy == None:
+            named = self.__named.get(name)
+            if named == None:
+                return ()
+            copy = self.__namedCopies[name] = named.toTuple()
+        return copy
+    
+    def getChildren(self, id):
+        """ Gets the agents launched by the agent corresponding to the given ID.
+        @param id: ID of the parent agent.
+        @type id: C{int}
+        @return: The IDs of the children which are still registered, in registering order.
+        @rtype: C{list<int>}
+        """
+        children = self.__children.get(id)
+        if children == None:
+            return []
+        return list(children.toTuple())